@@ -2,6 +2,7 @@ import os
 import sys
 import json
 import subprocess
+import threading
 import multiprocessing
 import psutil
 import OpenImageIO as oiio
@@ -9,18 +10,47 @@ import OpenImageIO as oiio
 # import OpenEXR
 # import Imath
 import time
+from collections import deque
 # Remplacer PySide2 par PySide6
 from PySide6.QtWidgets import QComboBox, QGridLayout, QSizePolicy
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel, QPushButton, QFileDialog,
-    QLineEdit, QTextEdit, QHBoxLayout, QListWidget, QListWidgetItem, QCheckBox,
+    QLineEdit, QPlainTextEdit, QHBoxLayout, QListWidget, QListWidgetItem, QCheckBox,
     QProgressBar, QFrame, QGroupBox, QSplitter, QToolButton, QMessageBox, QScrollArea,
     QSlider, QTabWidget, QMenu
 )
-from PySide6.QtCore import Qt, QSettings, QPropertyAnimation, QSize, QEvent, QTimer
+from PySide6.QtCore import Qt, QSettings, QPropertyAnimation, QSize, QEvent, QTimer, QObject, QThread, Signal
 from PySide6.QtGui import QIcon, QKeyEvent, QFontDatabase, QFont
 from ExrMerge import merge_final_exrs
 from Integrator_Denoizer import run_integrator_generate
+from Pipeline import Pipeline, PipelineError, pipeline_command, pipeline_arguments
+from Scheduler import ResourceScheduler, machine_capacity, job_kind, job_demand, DEFAULT_DISK_MB_S
+from JobQueue import JobQueue, ensure_daemon, describe_job
+from DenoiseCache import DEFAULT_CACHE_SIZE_GB, default_cache_dir
+from ExrIO import PIXEL_TYPES
+from FramePool import PauseGate
+
+# Fenêtre de log: les messages sont mis en tampon et affichés en un seul ajout au plus
+# toutes les LOG_FLUSH_INTERVAL secondes. Le widget ne garde que les LOG_MAX_LINES
+# dernières lignes; l'historique complet est écrit dans un fichier (LOG_SPOOL_KEEP derniers gardés)
+LOG_FLUSH_INTERVAL = 0.05
+LOG_MAX_LINES = 5000
+LOG_SPOOL_KEEP = 20
+
+
+def format_elapsed(elapsed_time):
+    """Durée lisible pour les messages de fin de traitement"""
+    if elapsed_time < 60:
+        return f"{int(elapsed_time)} seconds"
+    elif elapsed_time < 3600:
+        return f"{int(elapsed_time/60)} minutes {int(elapsed_time%60)} seconds"
+    return f"{int(elapsed_time/3600)} hours {int((elapsed_time%3600)/60)} minutes"
+
+
+def log_spool_dir():
+    """Dossier des fichiers de log complets (LOCALAPPDATA sous Windows, ~/.cache ailleurs)"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "DenoiZer", "logs")
 
 class CollapsibleSection(QWidget):
     """Collapsible section widget with arrow button to show/hide content"""
@@ -167,16 +197,46 @@ class LogWindow(QWidget):
         """)
         self.stop_btn.clicked.connect(self.request_stop)
         
+        # Pause / reprise du traitement (le pipeline attend sans consommer l'interface)
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #3c3c3c;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                padding: 8px 16px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #4a4a4a;
+            }
+        """)
+        self.pause_btn.clicked.connect(self.request_pause)
+        
         stop_layout = QHBoxLayout()
         stop_layout.addStretch()
+        stop_layout.addWidget(self.pause_btn)
         stop_layout.addWidget(self.stop_btn)
         stop_layout.addStretch()
         layout.addLayout(stop_layout)
         
-        # Log output
-        self.log_output = QTextEdit()
+        # Log output (texte brut: ajout en bloc et nombre de lignes borné)
+        self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
+        self.log_output.setMaximumBlockCount(LOG_MAX_LINES)
         layout.addWidget(self.log_output)
+
+        # Messages en attente d'affichage (anneau: au-delà de LOG_MAX_LINES, les plus anciens
+        # ne sont plus affichés mais restent dans le fichier de log)
+        self.log_buffer = deque(maxlen=LOG_MAX_LINES)
+        self.last_log_flush = 0.0
+        self.log_flush_timer = QTimer(self)
+        self.log_flush_timer.setSingleShot(True)
+        self.log_flush_timer.setInterval(int(LOG_FLUSH_INTERVAL * 1000))
+        self.log_flush_timer.timeout.connect(self.flush_log)
+        self.spool_file = None
+        self.spool_path = None
         
         # Style
         self.setStyleSheet("""
@@ -184,7 +244,7 @@ class LogWindow(QWidget):
                 background-color: #1e1e1e;
                 color: #e0e0e0;
             }
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 background-color: #2d2d2d;
                 border: 1px solid #3c3c3c;
                 border-radius: 4px;
@@ -225,19 +285,74 @@ class LogWindow(QWidget):
             if self.parent():
                 self.parent().process_stop_requested()
         
+    def request_pause(self):
+        """Pause ou reprise demandée depuis la fenêtre de log"""
+        if self.parent():
+            self.parent().toggle_pause()
+
+    def set_paused(self, paused):
+        self.pause_btn.setText("Resume" if paused else "Pause")
+
     def append_log(self, message):
-        self.log_output.append(message)
+        """Ajouter un message: écrit dans le fichier de log, affiché au prochain rafraîchissement"""
+        message = str(message)
+        self.spool(message)
+        self.log_buffer.append(message)
+        if time.monotonic() - self.last_log_flush >= LOG_FLUSH_INTERVAL:
+            self.flush_log()
+        elif not self.log_flush_timer.isActive():
+            # Afficher les derniers messages même si plus rien n'arrive
+            self.log_flush_timer.start()
+
+    def flush_log(self):
+        """Afficher les messages en attente en un seul ajout"""
+        self.log_flush_timer.stop()
+        self.last_log_flush = time.monotonic()
+        if self.spool_file:
+            try:
+                self.spool_file.flush()
+            except:
+                pass
+        if not self.log_buffer:
+            return
+        text = "\n".join(self.log_buffer)
+        self.log_buffer.clear()
+        self.log_output.appendPlainText(text)
         # Auto-scroll to bottom
         self.log_output.verticalScrollBar().setValue(
             self.log_output.verticalScrollBar().maximum()
         )
-        # Traiter les événements pour maintenir l'interface réactive
-        QApplication.processEvents()
+
+    def spool(self, message):
+        """Écrire le message dans le fichier de log complet (ouvert au premier message)"""
+        if self.spool_file is None:
+            self.open_spool()
+        if self.spool_file:
+            try:
+                self.spool_file.write(message + "\n")
+            except:
+                pass
+
+    def open_spool(self):
+        self.spool_file = False  # Pas de nouvel essai si l'ouverture échoue
+        folder = log_spool_dir()
+        try:
+            os.makedirs(folder, exist_ok=True)
+            # Ne garder que les derniers fichiers de log
+            old_logs = sorted(f for f in os.listdir(folder) if f.startswith("denoizer_") and f.endswith(".log"))
+            for name in old_logs[:max(0, len(old_logs) - LOG_SPOOL_KEEP + 1)]:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass  # Encore ouvert par une autre instance
+            self.spool_path = os.path.join(folder, f"denoizer_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{id(self):x}.log")
+            self.spool_file = open(self.spool_path, "w", encoding="utf-8")
+        except OSError:
+            return
+        self.log_buffer.append(f"📄 Full log: {self.spool_path}")
         
     def set_progress(self, value):
         self.progress.setValue(value)
-        # Traiter les événements pour maintenir l'interface réactive
-        QApplication.processEvents()
         
     def set_overall_progress(self, value):
         # Cette méthode est maintenue pour compatibilité mais redirige vers set_progress
@@ -245,17 +360,15 @@ class LogWindow(QWidget):
         
     def set_status(self, message):
         self.status_label.setText(message)
-        # Traiter les événements pour maintenir l'interface réactive
-        QApplication.processEvents()
         
     def set_estimated_time(self, time_str):
         self.time_label.setText(f"{time_str}")
-        # Traiter les événements pour maintenir l'interface réactive
-        QApplication.processEvents()
         
     def reset_controls(self):
         """Reset control buttons to initial state"""
         self.stop_btn.setEnabled(True)
+        self.pause_btn.setEnabled(True)
+        self.set_paused(False)
         
     def showEvent(self, event):
         """Appelé lorsque la fenêtre est affichée"""
@@ -270,6 +383,44 @@ class LogWindow(QWidget):
         # Reset controls when shown
         self.reset_controls()
 
+class PipelineWorker(QObject):
+    """Exécute un traitement (pipeline, fusion seule, intégrateurs seuls) dans un QThread
+
+    `job(worker)` tourne hors du thread de l'interface: ses logs, statuts et progressions
+    passent par les signaux du worker (connexions en file vers la fenêtre de log),
+    jamais par QApplication.processEvents. `done(résultat, exception)` est émis à la fin."""
+    log = Signal(str)
+    status = Signal(str)
+    progress = Signal(int)
+    overall = Signal(int)
+    eta = Signal(str)
+    error = Signal(str, str)
+    done = Signal(object, object)
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def callbacks(self):
+        """Callbacks de Pipeline reliés aux signaux"""
+        return dict(
+            log_callback=lambda message: self.log.emit(str(message)),
+            status_callback=lambda text: self.status.emit(str(text)),
+            progress_callback=lambda percent: self.progress.emit(int(percent)),
+            overall_progress_callback=lambda percent: self.overall.emit(int(percent)),
+            eta_callback=lambda text: self.eta.emit(str(text)),
+            error_callback=lambda title, message: self.error.emit(str(title), str(message))
+        )
+
+    def run(self):
+        try:
+            result = self.job(self)
+        except Exception as e:
+            self.done.emit(None, e)
+            return
+        self.done.emit(result, None)
+
+
 class DenoizerTab(QWidget):
     def __init__(self, parent=None, tab_name="Untitled", config=None, settings=None):
         super().__init__(parent)
@@ -296,8 +447,12 @@ class DenoizerTab(QWidget):
         self.processing = False
         self.stop_requested = False
         self.pause_requested = False
+        self.pause_gate = PauseGate()  # Pause partagée: pipeline, workers de fusion et denoise_batch
         self.process = None
         self.process_check_timer = None  # Ajouter cette ligne ici
+        self.worker = None  # Traitement en cours dans un QThread (PipelineWorker)
+        self.worker_thread = None
+        self.pipeline = None
         
         # S'assurer que use_gpu_checkbox est initialisé à False par défaut
         if not hasattr(self, 'use_gpu_checkbox'):
@@ -575,6 +730,25 @@ class DenoizerTab(QWidget):
         compression_layout.addWidget(self.compression_menu)
         dirs_layout.addLayout(compression_layout)
         
+        # Pixel Type (politique de type de pixel des EXR écrits)
+        pixel_type_layout = QHBoxLayout()
+        pixel_type_layout.addWidget(QLabel("Pixel Type:"))
+        self.pixel_type_menu = QComboBox()
+        self.pixel_type_menu.addItems(PIXEL_TYPES)
+        self.selected_pixel_type = self.config.get("PIXEL_TYPE", "FLOAT")
+        if self.selected_pixel_type not in PIXEL_TYPES:
+            self.selected_pixel_type = "FLOAT"
+        self.pixel_type_menu.setCurrentText(self.selected_pixel_type)
+        self.pixel_type_menu.setToolTip(
+            "FLOAT: every channel written as 32-bit float\n"
+            "HALF: half for beauty and light groups, float for depth/position/IDs\n"
+            "PRESERVE: keep the pixel type of each source channel"
+        )
+        self.pixel_type_menu.currentIndexChanged.connect(self.update_pixel_type)
+        self.pixel_type_menu.setStyleSheet(self.compression_menu.styleSheet())
+        pixel_type_layout.addWidget(self.pixel_type_menu)
+        dirs_layout.addLayout(pixel_type_layout)
+        
         # Mode buttons layout (CrossFrame, Integrator, Shadow)
         modes_layout = QHBoxLayout()
         modes_layout.setSpacing(8)  # Espace entre les boutons
@@ -973,6 +1147,12 @@ class DenoizerTab(QWidget):
 
         self.build_beauty_action = run_menu.addAction("BUILD BEAUTY")
         self.build_integrator_action = run_menu.addAction("BUILD INTEGRATOR")
+        run_menu.addSeparator()
+        # File de jobs persistante: exécutée par le démon, même après la fermeture de l'interface
+        self.send_to_queue_action = run_menu.addAction("SEND TO JOB QUEUE")
+        self.show_queue_action = run_menu.addAction("JOB QUEUE STATUS")
+        self.send_to_queue_action.triggered.connect(self.send_to_queue)
+        self.show_queue_action.triggered.connect(self.show_job_queue)
 
         # Connecter les actions pour changer le mode du bouton
         self.denoize_action.triggered.connect(lambda: self.change_button_mode("DENOIZE"))
@@ -1089,6 +1269,15 @@ class DenoizerTab(QWidget):
         # Log the change
         self.log_window.append_log(f"🔧 Compression mode set to: {self.selected_compression}")
 
+    def update_pixel_type(self):
+        """Update the pixel type policy used for written EXRs"""
+        self.selected_pixel_type = self.pixel_type_menu.currentText()
+        self.config["PIXEL_TYPE"] = self.selected_pixel_type
+        self.save_config()
+        
+        # Log the change
+        self.log_window.append_log(f"🎚️ Pixel type set to: {self.selected_pixel_type}")
+
     def run_only_integrator(self):
         """Run only the integrator separation process"""
         # Reset control flags
@@ -1113,6 +1302,12 @@ class DenoizerTab(QWidget):
                                "Please select at least one AOV in the Integrator Separator list.")
             return
         
+        # Get frames
+        frames = sorted([f for f in os.listdir(input_path) if f.endswith(".exr")])
+        if not frames:
+            QMessageBox.critical(self, "No EXR Files", f"No .exr files found in input folder.")
+            return
+        
         # Start processing
         self.log_window.show()
         self.log_window.raise_()  # Forcer la fenêtre au premier plan
@@ -1120,28 +1315,24 @@ class DenoizerTab(QWidget):
         self.log_window.set_status("3: REBUILD INTEGRATOR - Starting process...")
         self.set_processing_state(True)
         
-        # Forcer la mise à jour de l'interface
-        QApplication.processEvents()
+        integrator_dir = os.path.join(output_path, "INTEGRATOR")
+        compression_mode = self.selected_compression
+        compression_level = self.compression_level if self.selected_compression in ["DWAA", "DWAB"] else None
+        pixel_type = self.selected_pixel_type
+        backend = self.config.get("MERGE_BACKEND", "AUTO")
         
-        try:
+        def job(worker):
             # Create integrator directory
-            integrator_dir = os.path.join(output_path, "INTEGRATOR")
             os.makedirs(integrator_dir, exist_ok=True)
             
-            # Get frames
-            frames = sorted([f for f in os.listdir(input_path) if f.endswith(".exr")])
-            if not frames:
-                QMessageBox.critical(self, "No EXR Files", f"No .exr files found in input folder.")
-                return
-                
-            # Check for early stop
-            if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped during preparation.")
-                return
-                
             # Handle pause if requested
             self.check_pause()
             
+            # Check for early stop
+            if self.stop_requested:
+                worker.log.emit("🛑 Process stopped during preparation.")
+                return False
+            
             # Create progress callback
             def progress_callback(progress_percent):
                 # Check for stop request
@@ -1151,20 +1342,15 @@ class DenoizerTab(QWidget):
                 # Handle pause if requested
                 self.check_pause()
                 
-                self.log_window.set_progress(int(progress_percent))
-                # Forcer la mise à jour de l'interface
-                QApplication.processEvents()
+                worker.progress.emit(int(progress_percent))
                 return False  # Signal to continue processing
                 
-            # Create a log callback that forces UI updates
             def log_callback(message):
                 # Check for stop request
                 if self.stop_requested:
                     return True  # Signal to stop processing
                     
-                self.log_window.append_log(message)
-                # Forcer la mise à jour de l'interface
-                QApplication.processEvents()
+                worker.log.emit(str(message))
                 return False  # Signal to continue processing
             
             start_time = time.time()
@@ -1174,40 +1360,29 @@ class DenoizerTab(QWidget):
                 input_folder=input_path,
                 output_folder=integrator_dir,
                 selected_integrators=selected_integrators,
-                compression_mode=self.selected_compression,
-                compression_level=self.compression_level if self.selected_compression in ["DWAA", "DWAB"] else None,
+                compression_mode=compression_mode,
+                compression_level=compression_level,
                 log_callback=log_callback,
                 progress_callback=progress_callback,
                 stop_check=lambda: self.stop_requested,
-                use_gpu=False
+                use_gpu=False,
+                pixel_type=pixel_type,
+                backend=backend,
+                pause_gate=self.pause_gate
             )
             
             # Check if process was stopped
             if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped during integrator generation.")
-                return
-            
-            # Calculate elapsed time
-            elapsed_time = time.time() - start_time
-            if elapsed_time < 60:
-                time_str = f"{int(elapsed_time)} seconds"
-            elif elapsed_time < 3600:
-                time_str = f"{int(elapsed_time/60)} minutes {int(elapsed_time%60)} seconds"
-            else:
-                time_str = f"{int(elapsed_time/3600)} hours {int((elapsed_time%3600)/60)} minutes"
-            
-            self.log_window.append_log(f"✅ Integrator separation completed in {time_str}!")
-            self.log_window.set_status(f"Process completed in {time_str}")
-            self.log_window.set_progress(100)
-            
-            # Forcer la mise à jour de l'interface
-            QApplication.processEvents()
+                worker.log.emit("🛑 Process stopped during integrator generation.")
+                return False
             
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
-            self.log_window.append_log(f"Error: {str(e)}")
-        finally:
-            self.set_processing_state(False)
+            time_str = format_elapsed(time.time() - start_time)
+            worker.log.emit(f"✅ Integrator separation completed in {time_str}!")
+            worker.status.emit(f"Process completed in {time_str}")
+            worker.progress.emit(100)
+            return True
+        
+        self.start_worker(job)
 
     def run_only_merge(self):
         """Run only the AOV merging process"""
@@ -1242,6 +1417,16 @@ class DenoizerTab(QWidget):
             if result == QMessageBox.No:
                 return
         
+        # Get frames
+        frames = sorted([f for f in os.listdir(input_path) if f.endswith(".exr")])
+        if not frames:
+            QMessageBox.critical(self, "No EXR Files", f"No .exr files found in input folder.")
+            return
+        
+        # Validate AOVs
+        if not self.validate_aovs(input_path, selected_aovs):
+            return
+        
         # Start processing
         self.log_window.show()
         self.log_window.raise_()  # Forcer la fenêtre au premier plan
@@ -1249,35 +1434,29 @@ class DenoizerTab(QWidget):
         self.log_window.set_status("2: REBUILD BEAUTY - Starting process...")
         self.set_processing_state(True)
         
-        # Forcer la mise à jour de l'interface
-        QApplication.processEvents()
+        # Log disk space info
+        _, disk_space_msg = self.check_disk_space(output_path)
+        self.log_window.append_log(f"💾 {disk_space_msg}")
         
-        try:
+        beauty_dir = os.path.join(output_path, "BEAUTY")
+        compression_mode = self.selected_compression
+        compression_level = self.compression_level if self.selected_compression in ["DWAA", "DWAB"] else None
+        shadow_mode = self.shadow_mode
+        shadow_aovs = self.get_checked_shadow_aovs() if self.shadow_mode else []
+        pixel_type = self.selected_pixel_type
+        backend = self.config.get("MERGE_BACKEND", "AUTO")
+        
+        def job(worker):
             # Create beauty directory
-            beauty_dir = os.path.join(output_path, "BEAUTY")
             os.makedirs(beauty_dir, exist_ok=True)
             
-            # Log disk space info
-            _, disk_space_msg = self.check_disk_space(output_path)
-            self.log_window.append_log(f"💾 {disk_space_msg}")
-            
-            # Get frames
-            frames = sorted([f for f in os.listdir(input_path) if f.endswith(".exr")])
-            if not frames:
-                QMessageBox.critical(self, "No EXR Files", f"No .exr files found in input folder.")
-                return
+            # Handle pause if requested
+            self.check_pause()
             
-            # Validate AOVs
-            if not self.validate_aovs(input_path, selected_aovs):
-                return
-                
             # Check for early stop
             if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped during preparation.")
-                return
-                
-            # Handle pause if requested
-            self.check_pause()
+                worker.log.emit("🛑 Process stopped during preparation.")
+                return False
             
             # Create progress callback
             def progress_callback(progress_percent):
@@ -1288,66 +1467,50 @@ class DenoizerTab(QWidget):
                 # Handle pause if requested
                 self.check_pause()
                 
-                self.log_window.set_progress(int(progress_percent))
-                # Forcer la mise à jour de l'interface
-                QApplication.processEvents()
+                worker.progress.emit(int(progress_percent))
                 return False  # Signal to continue processing
             
-            start_time = time.time()
-            
-            # Create a log callback that forces UI updates
             def log_callback(message):
                 # Check for stop request
                 if self.stop_requested:
                     return True  # Signal to stop processing
                     
-                self.log_window.append_log(message)
-                # Forcer la mise à jour de l'interface
-                QApplication.processEvents()
+                worker.log.emit(str(message))
                 return False  # Signal to continue processing
             
+            start_time = time.time()
+            
             # Run merge
             merge_final_exrs(
                 output_folder=beauty_dir,
                 frame_list=frames,
                 input_folder=input_path,
                 selected_aovs=selected_aovs,
-                compression_mode=self.selected_compression,
-                compression_level=self.compression_level if self.selected_compression in ["DWAA", "DWAB"] else None,
+                compression_mode=compression_mode,
+                compression_level=compression_level,
                 log_callback=log_callback,
                 progress_callback=progress_callback,
-                shadow_mode=self.shadow_mode,
-                shadow_aovs=self.get_checked_shadow_aovs() if self.shadow_mode else [],
+                shadow_mode=shadow_mode,
+                shadow_aovs=shadow_aovs,
                 stop_check=lambda: self.stop_requested,
-                use_gpu=False
+                use_gpu=False,
+                pixel_type=pixel_type,
+                backend=backend,
+                pause_gate=self.pause_gate
             )
             
             # Check if process was stopped
             if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped during merging.")
-                return
-            
-            # Calculate elapsed time
-            elapsed_time = time.time() - start_time
-            if elapsed_time < 60:
-                time_str = f"{int(elapsed_time)} seconds"
-            elif elapsed_time < 3600:
-                time_str = f"{int(elapsed_time/60)} minutes {int(elapsed_time%60)} seconds"
-            else:
-                time_str = f"{int(elapsed_time/3600)} hours {int((elapsed_time%3600)/60)} minutes"
-            
-            self.log_window.append_log(f"✅ AOV merging completed in {time_str}!")
-            self.log_window.set_status(f"Process completed in {time_str}")
-            self.log_window.set_progress(100)
-            
-            # Forcer la mise à jour de l'interface
-            QApplication.processEvents()
+                worker.log.emit("🛑 Process stopped during merging.")
+                return False
             
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
-            self.log_window.append_log(f"Error: {str(e)}")
-        finally:
-            self.set_processing_state(False)
+            time_str = format_elapsed(time.time() - start_time)
+            worker.log.emit(f"✅ AOV merging completed in {time_str}!")
+            worker.status.emit(f"Process completed in {time_str}")
+            worker.progress.emit(100)
+            return True
+        
+        self.start_worker(job)
 
     def select_input_folder(self):
         # Utilisation de la fenêtre standard Windows Explorer
@@ -1762,17 +1925,50 @@ class DenoizerTab(QWidget):
         # Reset control flags
         self.stop_requested = False
         
+        selected_aovs = self.validate_run()
+        if selected_aovs is None:
+            return
+        self.start_log_window()
+        
+        # Le pipeline (débruitage, fusion, intégrateurs) est partagé avec la ligne de commande.
+        # Il tourne dans un QThread: les réglages sont lus ici, dans le thread de l'interface
+        settings = self.pipeline_settings(selected_aovs)
+        
+        def job(worker):
+            self.pipeline = Pipeline(
+                **settings,
+                **worker.callbacks(),
+                process_callback=lambda process: setattr(self, "process", process),
+                stop_check=lambda: self.stop_requested,
+                pause_check=self.check_pause,
+                pause_gate=self.pause_gate
+            )
+            try:
+                return self.pipeline.run()
+            finally:
+                self.pipeline = None
+        
+        def finished(result, error):
+            # Si nous sommes en mode batch, notifier le parent que le traitement est terminé
+            if batch_mode and hasattr(self, 'batch_finished_callback') and hasattr(self, 'batch_tab_index'):
+                # Vérifier si le traitement s'est terminé avec succès (sans stop_requested)
+                self.batch_finished_callback(self.batch_tab_index, error is None and not self.stop_requested)
+        
+        self.start_worker(job, finished)
+            
+    def validate_run(self):
+        """Vérifier dossiers, espace disque, RenderMan et AOVs. Retourne les AOVs cochés, ou None"""
         # Validate inputs
         input_path = self.input_path.text()
         output_path = self.output_path.text()
         
         if not input_path or not os.path.isdir(input_path):
             QMessageBox.critical(self, "Invalid Input Path", "Please select a valid input folder.")
-            return
+            return None
         
         if not output_path or not os.path.isdir(output_path):
             QMessageBox.critical(self, "Invalid Output Path", "Please select a valid output folder.")
-            return
+            return None
         
         # Check disk space
         disk_space_ok, disk_space_msg = self.check_disk_space(output_path)
@@ -1781,836 +1977,288 @@ class DenoizerTab(QWidget):
                                     f"{disk_space_msg}\n\nContinue anyway?",
                                     QMessageBox.Yes | QMessageBox.No)
             if result == QMessageBox.No:
-                return
+                return None
         
         # Validate RenderMan
         if not self.validate_renderman():
-            return
+            return None
         
         # Get selected AOVs and validate
         selected_aovs = self.get_checked_aovs()
         if not selected_aovs:
             QMessageBox.critical(self, "No AOVs Selected", "Please select at least one AOV to denoise.")
-            return
+            return None
         
         if not self.validate_aovs(input_path, selected_aovs):
-            return
-        
-        # Start denoising
+            return None
+        return selected_aovs
+
+    def start_log_window(self):
+        """Afficher la fenêtre de log et passer l'onglet en traitement"""
         self.log_window.show()
         self.log_window.raise_()  # Forcer la fenêtre au premier plan
         self.log_window.activateWindow()  # Activer la fenêtre
         self.log_window.set_status("1: DENOISING RENDERMAN - Starting process...")
         self.set_processing_state(True)
         
+        # Log disk space info
+        _, disk_space_msg = self.check_disk_space(self.output_path.text())
+        self.log_window.append_log(f"💾 {disk_space_msg}")
+
+    def pipeline_settings(self, selected_aovs):
+        """Paramètres de Pipeline de cet onglet (sans les callbacks)"""
+        compression_level = self.compression_level if self.selected_compression in ["DWAA", "DWAB"] else None
+        shadow_aovs = self.get_checked_shadow_aovs() if self.shadow_mode else []
+        if self.shadow_mode:
+            # En mode shadow, on sélectionne tous les AOVs pour le denoising
+            selected_aovs = self.all_aovs.copy() if hasattr(self, 'all_aovs') else []
+        return dict(
+            input_path=self.input_path.text(),
+            output_path=self.output_path.text(),
+            renderman_path=self.config.get("RENDERMAN_PROSERVER"),
+            selected_aovs=selected_aovs,
+            light_groups=self.get_light_groups_config(),
+            shadow_mode=self.shadow_mode,
+            shadow_aovs=shadow_aovs,
+            crossframe=self.crossframe_mode_button.isChecked(),
+            compression_mode=self.selected_compression,
+            compression_level=compression_level,
+            pixel_type=self.selected_pixel_type,
+            backend=self.config.get("MERGE_BACKEND", "AUTO"),
+            selected_integrators=self.get_checked_integrators() if self.integrator_mode_button.isChecked() else [],
+            pipelined_merge=self.config.get("PIPELINED_MERGE", True),
+            integrator_during_denoise=self.config.get("INTEGRATOR_DURING_DENOISE", False),
+            integrator_cpu_budget=self.config.get("INTEGRATOR_CPU_BUDGET", 0.25),
+            combined_pass=self.config.get("COMBINED_FRAME_PASS", True),
+            denoise_shards=self.config.get("DENOISE_SHARDS", 1),
+            resume=self.config.get("RESUME_RUNS", True),
+            denoise_cache_dir=(self.config.get("DENOISE_CACHE_DIR") or default_cache_dir()) if self.config.get("DENOISE_CACHE_SIZE_GB", DEFAULT_CACHE_SIZE_GB) > 0 else None,
+            denoise_cache_size_gb=self.config.get("DENOISE_CACHE_SIZE_GB", DEFAULT_CACHE_SIZE_GB)
+        )
+
+    # --- Traitement dans un QThread (onglet seul) ------------------------------
+
+    def start_worker(self, job, finished=None):
+        """Lancer `job(worker)` dans un QThread; `finished(résultat, exception)` est appelé dans le thread de l'interface"""
+        self.worker_finished_callback = finished
+        self.worker_thread = QThread(self)
+        self.worker = PipelineWorker(job)
+        self.worker.moveToThread(self.worker_thread)
+        self.worker.log.connect(self.log_window.append_log)
+        self.worker.status.connect(self.log_window.set_status)
+        self.worker.progress.connect(self.log_window.set_progress)
+        self.worker.overall.connect(self.log_window.set_overall_progress)
+        self.worker.eta.connect(self.log_window.set_estimated_time)
+        self.worker.error.connect(self.show_worker_error)
+        self.worker.done.connect(self.worker_done)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker_thread.start()
+
+    def show_worker_error(self, title, message):
+        QMessageBox.critical(self, title, message)
+
+    def worker_done(self, result, error):
+        """Fin du traitement du QThread: libérer le thread et remettre l'onglet au repos"""
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.worker.deleteLater()
+        self.worker_thread.deleteLater()
+        self.worker = None
+        self.worker_thread = None
+        self.process = None
+        self.set_processing_state(False)
+        if isinstance(error, PipelineError):
+            self.log_window.append_log(f"❌ {str(error)}")
+        elif error is not None:
+            QMessageBox.critical(self, "Error", str(error))
+            self.log_window.append_log(f"Error: {str(error)}")
+        if self.worker_finished_callback:
+            callback, self.worker_finished_callback = self.worker_finished_callback, None
+            callback(result, error)
+
+    def worker_running(self):
+        return self.worker_thread is not None
+
+    def wait_for_worker(self):
+        """Fermeture de l'application: arrêter le traitement en cours et attendre la fin du thread"""
+        if self.worker_running():
+            self.stop_requested = True
+            self.pause_gate.resume()
+            if self.pipeline:
+                self.pipeline.stop_shards()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        elif self.batch_job_running():
+            self.stop_batch_job()
+
+    # --- DENOIZE ALL: onglet exécuté dans son propre process ------------------
+
+    def start_batch_job(self, demand):
+        """Lancer le pipeline de cet onglet dans un process, avec les ressources accordées par l'ordonnanceur
+
+        Retourne False si la validation échoue. `batch_finished_callback` est appelé à la fin du process."""
+        self.stop_requested = False
+        selected_aovs = self.validate_run()
+        if selected_aovs is None:
+            return False
+        self.start_log_window()
+
+        settings = self.pipeline_settings(selected_aovs)
+        settings["max_cores"] = demand["cores"]
+        # Part de la RAM disponible accordée à denoise_batch (mémoire réservée au job)
+        available_gb = psutil.virtual_memory().available / (1024 ** 3)
+        settings["memory_fraction"] = round(min(0.75, demand["memory_gb"] / max(available_gb, 1.0)), 3)
+        command = pipeline_command() + pipeline_arguments(settings.pop("input_path"), settings.pop("output_path"), settings) + ["--ui-stream"]
+        self.log_window.append_log(f"🗂️ Scheduled with {demand['cores']} cores, {demand['memory_gb']:.1f}GB RAM, {demand['disk_mb_s']:.0f}MB/s disk")
+
+        # Sortie du process lue par un thread, appliquée à la fenêtre de log par un timer (jamais bloquant)
+        self.batch_lines = deque()
+        creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        universal_newlines=True, bufsize=1, creationflags=creationflags)
+        self.batch_reader = threading.Thread(target=self.read_batch_output, args=(self.process, self.batch_lines), daemon=True)
+        self.batch_reader.start()
+        self.batch_timer = QTimer(self)
+        self.batch_timer.timeout.connect(self.poll_batch_job)
+        self.batch_timer.start(int(LOG_FLUSH_INTERVAL * 1000))
+        return True
+
+    def read_batch_output(self, process, lines):
+        for line in process.stdout:
+            lines.append(line)
+
+    def poll_batch_job(self):
+        """Appliquer les lignes reçues du process (log, statut, progression) et détecter sa fin"""
+        handlers = {
+            "log": self.log_window.append_log,
+            "status": self.log_window.set_status,
+            "progress": self.log_window.set_progress,
+            "overall": self.log_window.set_overall_progress,
+            "eta": self.log_window.set_estimated_time,
+            "error": lambda value: QMessageBox.critical(self, value[0], value[1])
+        }
+        while self.batch_lines:
+            line = self.batch_lines.popleft().strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+                handler = handlers.get(message.get("type"))
+            except ValueError:
+                # Ligne hors protocole (trace d'erreur Python, ...)
+                self.log_window.append_log(line)
+                continue
+            if handler:
+                handler(message.get("value"))
+
+        if self.process is None or self.process.poll() is None or self.batch_reader.is_alive():
+            return
+        self.batch_timer.stop()
+        returncode = self.process.returncode
+        self.process = None
+        self.set_processing_state(False)
+        if returncode != 0 and not self.stop_requested:
+            self.log_window.append_log(f"❌ Pipeline process exited with code {returncode}")
+        if hasattr(self, 'batch_finished_callback') and hasattr(self, 'batch_tab_index'):
+            self.batch_finished_callback(self.batch_tab_index, returncode == 0 and not self.stop_requested)
+
+    def batch_job_running(self):
+        return getattr(self, 'batch_timer', None) is not None and self.batch_timer.isActive()
+
+    def stop_batch_job(self):
+        """Arrêt propre: le process du pipeline termine son denoise_batch et ses pools"""
+        self.send_batch_command("stop")
+
+    def send_batch_command(self, command):
+        """Commande pour le process du pipeline (lue par watch_commands): stop, pause, resume"""
         try:
-            # Setup phases and progress distribution
-            phases = {
-                "preparation": {"weight": 5, "start": 0, "end": 5},
-                "denoising": {"weight": 50, "start": 5, "end": 55},
-                "merging": {"weight": 30, "start": 55, "end": 85},
-                "integrators": {"weight": 15, "start": 85, "end": 100}
-            }
-            
-            # Définir les étapes globales et leur progression
-            global_phases = {
-                "preparation": 1,         # 1% quand config.json est créé
-                "denoising_albedo": 15,   # 15% quand l'étape albedo est terminée
-                "denoising_subsurface": 25, # 25% quand l'étape subsurface est terminée
-                "denoising_diffuse": 35,  # 35% quand l'étape diffuse est terminée
-                "denoising_done": 50,     # 50% quand le débruitage est terminé
-                "merging_done": 75,       # 75% quand la fusion est terminée
-                "integrators_done": 100   # 100% quand tout est terminé
-            }
-            
-            frames = sorted([f for f in os.listdir(input_path) if f.endswith(".exr")])
-            if not frames:
-                self.log_window.append_log("❌ No .exr files found in the input folder.")
-                return
+            self.process.stdin.write(command + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError, AttributeError):
+            pass
 
-            # Phase: preparation (5%)
-            self.log_window.set_status("1: DENOISING RENDERMAN - Preparing configuration...")
-            self.log_window.set_overall_progress(0)  # Initialiser la barre globale à 0%
-            
-            # Forcer la mise à jour de l'interface
-            QApplication.processEvents()
-            
-            # Check for early stop
-            if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped during preparation.")
-                return
-            
-            # Log disk space info
-            _, disk_space_msg = self.check_disk_space(output_path)
-            self.log_window.append_log(f"💾 {disk_space_msg}")
-            
-            # Create output subdirectories
-            beauty_dir = os.path.join(output_path, "BEAUTY")
-            temp_dir = os.path.join(output_path, "temp_denoised")
-            
-            # Create directories
-            os.makedirs(beauty_dir, exist_ok=True)
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            self.log_window.append_log(f"✅ Created output directory: BEAUTY")
-            
-            # Create integrator directory only if enabled
-            integrator_dir = None
-            if self.integrator_mode_button.isChecked():
-                integrator_dir = os.path.join(output_path, "INTEGRATOR")
-                os.makedirs(integrator_dir, exist_ok=True)
-                self.log_window.append_log(f"✅ Created output directory: INTEGRATOR")
-            else:
-                self.log_window.append_log(f"ℹ️ Build Integrator disabled - INTEGRATOR directory not created")
-            
-            # Get light groups configuration
-            light_groups_config = self.get_light_groups_config()
-            prefix = light_groups_config["prefix"]
-            
-            # En mode shadow, on traite différemment
-            if self.shadow_mode:
-                # En mode shadow, on sélectionne tous les AOVs pour le denoising
-                selected_aovs = self.all_aovs.copy() if hasattr(self, 'all_aovs') else []
-                self.log_window.append_log(f"🔍 Shadow Mode: Processing all {len(selected_aovs)} AOVs")
-                # S'assurer que les AOVs des shadows sont bien dans la liste
-                shadow_aovs = self.get_checked_shadow_aovs()
-                for shadow_aov in shadow_aovs:
-                    if shadow_aov not in selected_aovs:
-                        selected_aovs.append(shadow_aov)
-                        self.log_window.append_log(f"➕ Added shadow AOV '{shadow_aov}' to processing list")
-            else:
-                # Mode normal: utiliser les AOVs sélectionnés par l'utilisateur
-                selected_aovs = self.get_checked_aovs()
-                if not selected_aovs:
-                    QMessageBox.critical(self, "No AOVs Selected", "Please select at least one AOV to denoise.")
-                    return
-            
-            # Automatically add light group AOVs to selection
-            selected_aovs.extend(light_groups_config["diffuse"])
-            selected_aovs.extend(light_groups_config["specular"])
-            
-            # Find RenderMan path
-            renderman_path = self.config.get("RENDERMAN_PROSERVER")
-            self.log_window.append_log(f"🛠️ Using RenderMan: {renderman_path}")
-            
-            # Check for early stop
-            if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped during preparation.")
-                return
-                
-            # Handle pause if requested
-            self.check_pause()
-            
-            # Prepare denoise configuration
-            # Choisir les fichiers de paramètres selon l'état du CrossFrame
-            if self.crossframe_mode_button.isChecked():
-                # CrossFrame activé : utiliser les paramètres optimisés pour le débruitage temporel
-                param = os.path.join(renderman_path, "lib", "denoise", "20970-renderman.param").replace("\\", "/")
-                topo = os.path.join(renderman_path, "lib", "denoise", "full_w7_4sv2_sym_gen2.topo").replace("\\", "/")
-                self.log_window.append_log("🔧 Using CrossFrame optimized parameters: 20970-renderman.param & full_w7_4sv2_sym_gen2.topo")
-            else:
-                # CrossFrame désactivé : utiliser les paramètres standard
-                param = os.path.join(renderman_path, "lib", "denoise", "20973-renderman.param").replace("\\", "/")
-                topo = os.path.join(renderman_path, "lib", "denoise", "full_w1_5s_sym_gen2.topo").replace("\\", "/")
-                self.log_window.append_log("🔧 Using standard parameters: 20973-renderman.param & full_w1_5s_sym_gen2.topo")
-
-            config = {
-                "primary": [os.path.join(input_path, f).replace("\\", "/") for f in frames],
-                "aux": {
-                    "diffuse": [],
-                    "specular": [],
-                    "albedo": [{"paths": [os.path.join(input_path, f).replace("\\", "/") for f in frames], "layers": ["albedo"]}],
-                    "Ci": [{"paths": [os.path.join(input_path, f).replace("\\", "/") for f in frames], "layers": ["Ci"]}],
-                    "subsurface": [{"paths": [os.path.join(input_path, f).replace("\\", "/") for f in frames], "layers": ["subsurface"]}]
-                },
-                "config": {
-                    "passes": selected_aovs,
-                    "topology": topo,
-                    "parameters": param,
-                    "output-dir": temp_dir.replace("\\", "/"),
-                    "flow": self.crossframe_mode_button.isChecked(),  # CrossFrame flow
-                    "debug": False,
-                    "asymmetry": 0.0
-                }
-            }
-            
-            # Log whether CrossFrame is enabled
-            if self.crossframe_mode_button.isChecked():
-                self.log_window.append_log("✅ CrossFrame denoising enabled - Better temporal coherence between frames")
-            else:
-                self.log_window.append_log("ℹ️ CrossFrame denoising disabled - Each frame processed independently")
+    def kill_batch_job(self):
+        """Arrêt d'urgence: tuer le process du pipeline et ses enfants (seulement ceux de cet onglet)"""
+        try:
+            parent = psutil.Process(self.process.pid)
+            for child in parent.children(recursive=True) + [parent]:
+                try:
+                    child.kill()
+                except psutil.Error:
+                    pass
+        except (psutil.Error, AttributeError):
+            pass
 
-            # Add light groups to appropriate categories
-            for aov in selected_aovs:
-                if aov in light_groups_config["diffuse"]:
-                    config["aux"]["diffuse"].append({
-                        "paths": config["primary"],
-                        "layers": [aov]
-                    })
-                elif aov in light_groups_config["specular"]:
-                    config["aux"]["specular"].append({
-                        "paths": config["primary"],
-                        "layers": [aov]
-                    })
-                # Add subsurface to diffuse category if found in selected AOVs
-                elif aov == "subsurface":
-                    config["aux"]["diffuse"].append({
-                        "paths": config["primary"],
-                        "layers": ["subsurface"]
-                    })
-            
-            # Add shadows to diffuse category if enabled
-            if self.shadow_mode:
-                shadow_aovs = self.get_checked_shadow_aovs()
-                for shadow_aov in shadow_aovs:
-                    if shadow_aov in selected_aovs:
-                        config["aux"]["diffuse"].append({
-                            "paths": config["primary"],
-                            "layers": [shadow_aov]
-                        })
-                        self.log_window.append_log(f"✅ Added shadow AOV '{shadow_aov}' to diffuse category for denoising")
-            
-            # Write config file
-            config_path = os.path.join(output_path, "config.json")
-            with open(config_path, "w") as f:
-                json.dump(config, f, indent=4)
+    # --- File de jobs persistante ---------------------------------------------
 
-            self.log_window.append_log(f"✅ Configuration file written to: {config_path}")
-            self.log_window.set_progress(phases["preparation"]["end"])
-            self.log_window.set_overall_progress(global_phases["preparation"])  # 1% quand config.json est créé
-            
-            # Forcer la mise à jour de l'interface
-            QApplication.processEvents()
-            
-            # Check for early stop
-            if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped after configuration.")
-                return
-                
-            # Handle pause if requested
-            self.check_pause()
-            
-            # Phase: denoising (50%)
-            self.log_window.set_status("1: DENOISING RENDERMAN - Running RenderMan Denoiser...")
-            
-            # Estimate total time based on frame count
-            # Empirical formula: ~10 seconds per frame for denoising, ~3 seconds for merging, ~2 seconds for integrators
-            # Multiplier par 3 pour les étapes albedo, diffuse, specular
-            frame_count = len(frames)
-            total_steps = frame_count * 3  # 3 étapes par frame: albedo, diffuse, specular
-            estimated_denoise_time = frame_count * 10 * 3  # Ajusté pour les 3 étapes
-            estimated_merge_time = frame_count * 3
-            estimated_integrator_time = frame_count * 2
-            
-            # Adjust time if integrator is disabled
-            if not self.integrator_mode_button.isChecked():
-                total_estimated_time = estimated_denoise_time + estimated_merge_time
-            else:
-                total_estimated_time = estimated_denoise_time + estimated_merge_time + estimated_integrator_time
-            
-            # Format estimated time
-            if total_estimated_time < 60:
-                time_str = f"{int(total_estimated_time)} seconds"
-            elif total_estimated_time < 3600:
-                time_str = f"{int(total_estimated_time/60)} minutes {int(total_estimated_time%60)} seconds"
-            else:
-                time_str = f"{int(total_estimated_time/3600)} hours {int((total_estimated_time%3600)/60)} minutes"
-            
-            self.log_window.set_estimated_time(time_str)
-            
-            # Forcer la mise à jour de l'interface
-            QApplication.processEvents()
-            
-            # Run denoiser
-            denoise_exe = os.path.join(renderman_path, "bin", "denoise_batch.exe")
-            
-            # Construire la commande avec le flag -f si CrossFrame est activé
-            command = [denoise_exe]
-            
-            # Ajouter les flags appropriés
-            if self.crossframe_mode_button.isChecked():
-                command.extend(["-cf", "-f"])
-            
-            # Optimisations de performance pour denoise_batch
-            # Note: L'argument -t pour les threads n'est pas supporté par denoise_batch
-            # RenderMan gère automatiquement les threads selon les ressources disponibles
-            cpu_count = multiprocessing.cpu_count()
-            self.log_window.append_log(f"💻 System has {cpu_count} CPU cores available for RenderMan")
-            
-            # Supprimer le système de tuiles pour un traitement plus fluide
-            # RenderMan traitera l'image entière d'un coup pour de meilleures performances
-            self.log_window.append_log("🔧 Processing full image without tiling for optimal performance")
-            
-            # Optimisations supplémentaires supportées par RenderMan
-            # Activer le mode verbose pour un meilleur suivi du progrès
-            command.extend(["-v"])
-            
-            # Ajouter le fichier de configuration JSON (toujours nécessaire)
-            command.extend(["-j", config_path])
-            
-            # Message de log approprié
-            log_message = f"🚀 Starting denoiser"
-            if self.crossframe_mode_button.isChecked():
-                log_message += " with CrossFrame"
-            log_message += " using CPU"
-                
-            log_message += f": \"{denoise_exe}\""
-            
-            if self.crossframe_mode_button.isChecked():
-                log_message += " -cf -f"
-                
-            log_message += f" -j \"{config_path}\""
-            
-            self.log_window.append_log(log_message)
-            
-            # Informations supplémentaires sur le mode utilisé et les optimisations
-            self.log_window.append_log("ℹ️ CPU mode: Using all available CPU cores for denoising")
-            self.log_window.append_log(f"⚡ Performance optimizations: Full image processing, high priority process, verbose output")
-            
-            # Afficher la commande complète pour debug
-            command_str = " ".join([f'"{arg}"' if " " in arg else arg for arg in command])
-            self.log_window.append_log(f"🔧 Full command: {command_str}")
-            
-            # Optimiser l'environnement système pour de meilleures performances
-            env = os.environ.copy()
-            
-            # Variables d'environnement RenderMan pour optimiser les performances
-            env['RMANTREE'] = renderman_path
-            env['RMAN_THREADS'] = str(cpu_count)  # Utiliser tous les cœurs
-            env['RMAN_DENOISE_THREADS'] = str(cpu_count)
-            
-            # Optimiser la mémoire pour RenderMan
+    def send_to_queue(self):
+        """Déposer les réglages de cet onglet dans la file de jobs et démarrer le démon si besoin"""
+        selected_aovs = self.validate_run()
+        if selected_aovs is None:
+            return
+        settings = self.pipeline_settings(selected_aovs)
+        input_path = settings.pop("input_path")
+        output_path = settings.pop("output_path")
+        queue_dir = self.config.get("JOB_QUEUE_DIR") or None
+        try:
+            queue = JobQueue(queue_dir)
             try:
-                memory_gb = psutil.virtual_memory().available / (1024**3)
-                # Allouer jusqu'à 75% de la RAM disponible pour RenderMan
-                memory_mb = int(memory_gb * 0.75 * 1024)
-                env['RMAN_MEMORY_LIMIT'] = str(memory_mb)
-                self.log_window.append_log(f"💾 Allocated {memory_mb}MB RAM for RenderMan denoising")
-            except:
-                pass
-            
-            # Démarrer le processus avec priorité haute pour de meilleures performances
-            if os.name == 'nt':  # Windows
-                # Utiliser HIGH_PRIORITY_CLASS sur Windows
-                import subprocess
-                self.process = subprocess.Popen(
-                    command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    bufsize=1,
-                    env=env,
-                    creationflags=subprocess.HIGH_PRIORITY_CLASS
-                )
-            else:  # Unix-like
-                self.process = subprocess.Popen(
-                    command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    bufsize=1,
-                    env=env,
-                    preexec_fn=lambda: os.nice(-10)  # Priorité haute
-                )
-            
-            # Monitor denoiser output
-            total_frames = len(frames)
-            denoising_start_time = time.time()
-            last_frame_time = None
-            error_message = None
-            
-            # CPU mode - no GPU monitoring needed
-            
-            # Variables pour suivre les étapes du débruitage
-            current_stage = ""
-            aov_counters = {"albedo": 0, "diffuse": 0, "specular": 0, "subsurface": 0, "light_groups": 0}
-            aov_totals = {"albedo": 0, "diffuse": 0, "specular": 0, "subsurface": 0, "light_groups": 0}
-            
-            # Ajouter un set pour éviter les doublons de logs
-            processed_entries = set()
-            
-            # Calculer les totaux estimés pour chaque type d'AOV
-            prefix = self.light_group_prefix.text().upper()
-            for aov in selected_aovs:
-                if "albedo" in aov.lower():
-                    aov_totals["albedo"] += len(frames)
-                elif "diffuse" in aov.lower():
-                    if prefix in aov:
-                        aov_totals["light_groups"] += len(frames)
-                    else:
-                        aov_totals["diffuse"] += len(frames)
-                elif "specular" in aov.lower():
-                    if prefix in aov:
-                        aov_totals["light_groups"] += len(frames)
-                    else:
-                        aov_totals["specular"] += len(frames)
-                elif "subsurface" in aov.lower():
-                    aov_totals["subsurface"] += len(frames)
-                else:
-                    # Par défaut, considérer comme diffuse
-                    aov_totals["diffuse"] += len(frames)
-            
-            for line in iter(self.process.stdout.readline, ''):
-                line_text = line.strip()
-                if line_text:
-                    # Check for stop request
-                    if self.stop_requested:
-                        self.log_window.append_log("🛑 Stop requested during denoising. Terminating...")
-                        try:
-                            self.process.terminate()
-                        except:
-                            pass
-                        return
-                        
-                    # Handle pause if requested
-                    self.check_pause()
-                    
-                    # Check for error messages
-                    if "ERROR" in line_text.upper():
-                        error_message = line_text
-                        self.log_window.append_log(line_text)
-                        # Special error handling for missing AOVs
-                        if "aov" in line_text.lower() and "not found" in line_text.lower():
-                            missing_aov = line_text.split("'")[1] if "'" in line_text else "unknown"
-                            QMessageBox.critical(self, "Missing AOV", 
-                                                f"RenderMan denoiser error: AOV '{missing_aov}' not found.\n\n"
-                                                f"Please check that all required AOVs are present in your EXR files.")
-                
-                    # Detect denoising stage changes
-                    if "Processing albedo" in line_text:
-                        current_stage = "albedo"
-                        self.log_window.set_status("1: DENOISING RENDERMAN - ALBEDO")
-                        self.log_window.append_log("\n🔄 Starting ALBEDO denoising")
-                        # Mettre à jour la barre de progression globale
-                        self.log_window.set_overall_progress(5)  # 5% quand commence l'étape albedo
-                        # Forcer la mise à jour de l'interface
-                        QApplication.processEvents()
-                    elif "Processing diffuse" in line_text:
-                        current_stage = "diffuse"
-                        self.log_window.set_status("1: DENOISING RENDERMAN - ALBEDO / DIFFUSE")
-                        self.log_window.append_log("\n🔄 Starting DIFFUSE denoising")
-                        # Mettre à jour la barre de progression globale
-                        self.log_window.set_overall_progress(global_phases["denoising_albedo"])  # 15% quand termine l'étape albedo
-                        # Forcer la mise à jour de l'interface
-                        QApplication.processEvents()
-                    elif "Processing specular" in line_text:
-                        current_stage = "specular"
-                        self.log_window.set_status("1: DENOISING RENDERMAN - ALBEDO / DIFFUSE / SPECULAR")
-                        self.log_window.append_log("\n🔄 Starting SPECULAR denoising")
-                        # Mettre à jour la barre de progression globale
-                        self.log_window.set_overall_progress(global_phases["denoising_diffuse"])  # 35% quand termine l'étape diffuse
-                        # Forcer la mise à jour de l'interface
-                        QApplication.processEvents()
-                    elif "Processing subsurface" in line_text:
-                        current_stage = "subsurface"
-                        self.log_window.set_status("1: DENOISING RENDERMAN - ALBEDO / DIFFUSE / SUBSURFACE")
-                        self.log_window.append_log("\n🔄 Starting SUBSURFACE denoising")
-                        # Mettre à jour la barre de progression globale
-                        self.log_window.set_overall_progress(global_phases["denoising_subsurface"])  # 25% quand commence l'étape subsurface
-                        # Forcer la mise à jour de l'interface
-                        QApplication.processEvents()
-                
-                    # Détecter les lignes indiquant l'application du débruitage à un fichier spécifique
-                    if "Applying Denoiser:" in line_text:
-                        # Afficher la ligne originale telle quelle
-                        self.log_window.append_log(line_text)
-                        
-                        # Ne compter que si c'est un fichier de sortie dans temp_denoised (résultat final)
-                        if "temp_denoised" in line_text and ">" in line_text:
-                            # Extraire le nom du fichier et la couche (AOV)
-                            parts = line_text.split("|")
-                            if len(parts) >= 2:
-                                # Extraire le fichier de sortie (après le >)
-                                output_part = parts[0].strip()
-                                layer_info = parts[1].strip()
-                                layer_name = layer_info.split(":")[1].strip() if ":" in layer_info else "unknown"
-                                
-                                # Extraire le nom du fichier de sortie
-                                if ">" in output_part:
-                                    output_path = output_part.split(">")[1].strip()
-                                    file_name = os.path.basename(output_path) if output_path else "unknown"
-                                else:
-                                    continue  # Pas un fichier de sortie, ignorer
-                                
-                                # Créer une clé unique pour éviter les doublons (fichier + layer)
-                                unique_key = f"{file_name}|{layer_name}"
-                                
-                                # Vérifier si cette entrée a déjà été traitée
-                                if unique_key in processed_entries:
-                                    continue  # Ignorer les doublons
-                                
-                                # Ajouter à la liste des entrées traitées
-                                processed_entries.add(unique_key)
-                                
-                                # Incrémenter le compteur approprié
-                                if current_stage == "albedo" or "albedo" in layer_name.lower():
-                                    aov_counters["albedo"] += 1
-                                    progress_text = f"{aov_counters['albedo']}/{aov_totals['albedo']} albedo"
-                                elif current_stage == "diffuse" or "diffuse" in layer_name.lower():
-                                    # Vérifier si c'est un light group
-                                    if prefix in layer_name:
-                                        aov_counters["light_groups"] += 1
-                                        progress_text = f"{aov_counters['diffuse']}/{aov_totals['diffuse']} diffuse, {aov_counters['light_groups']}/{aov_totals['light_groups']} light groups"
-                                    else:
-                                        aov_counters["diffuse"] += 1
-                                        progress_text = f"{aov_counters['diffuse']}/{aov_totals['diffuse']} diffuse"
-                                elif current_stage == "specular" or "specular" in layer_name.lower():
-                                    # Vérifier si c'est un light group
-                                    if prefix in layer_name:
-                                        aov_counters["light_groups"] += 1
-                                        progress_text = f"{aov_counters['specular']}/{aov_totals['specular']} specular, {aov_counters['light_groups']}/{aov_totals['light_groups']} light groups"
-                                    else:
-                                        aov_counters["specular"] += 1
-                                        progress_text = f"{aov_counters['specular']}/{aov_totals['specular']} specular"
-                                elif current_stage == "subsurface" or "subsurface" in layer_name.lower():
-                                    aov_counters["subsurface"] += 1
-                                    progress_text = f"{aov_counters['subsurface']}/{aov_totals['subsurface']} subsurface"
-                                else:
-                                    # Si on ne peut pas déterminer le type, ne pas compter
-                                    continue
-                                
-                                # Afficher le progrès seulement après avoir compté
-                                self.log_window.append_log(f"🔄 {progress_text}: {file_name} | layer: {layer_name}")
-                                
-                                # Calculer la progression globale
-                                total_aovs = sum(aov_totals.values())
-                                processed_aovs = sum(aov_counters.values())
-                                
-                                if total_aovs > 0:
-                                    denoise_progress = phases["denoising"]["start"] + (
-                                        (processed_aovs / total_aovs) * 
-                                        (phases["denoising"]["end"] - phases["denoising"]["start"])
-                                    )
-                                    self.log_window.set_progress(int(denoise_progress))
-                                
-                                # Mettre à jour le statut avec l'étape actuelle et le progrès
-                                stages_status = ""
-                                if aov_counters["albedo"] > 0:
-                                    stages_status += "ALBEDO"
-                                if aov_counters["diffuse"] > 0:
-                                    stages_status += " / DIFFUSE"
-                                if aov_counters["subsurface"] > 0:
-                                    stages_status += " / SUBSURFACE"    
-                                if aov_counters["specular"] > 0:
-                                    stages_status += " / SPECULAR"
-                                if aov_counters["light_groups"] > 0:
-                                    stages_status += " / LIGHT GROUPS"
-                                    
-                                # S'assurer qu'il y a au moins une étape affichée
-                                if not stages_status:
-                                    stages_status = current_stage.upper()
-                                    
-                                self.log_window.set_status(f"1: DENOISING RENDERMAN - {stages_status} - {progress_text}")
-                                
-                                # Calculer et mettre à jour le temps estimé
-                                current_time = time.time()
-                                if last_frame_time is not None and processed_aovs > 0:
-                                    time_per_aov = (current_time - denoising_start_time) / processed_aovs
-                                    remaining_aovs = total_aovs - processed_aovs
-                                    
-                                    # Calcul du temps restant pour le débruitage
-                                    remaining_time = time_per_aov * remaining_aovs
-                                    
-                                    # Format time for display
-                                    if remaining_time < 60:
-                                        time_str = f"{int(remaining_time)} seconds"
-                                    elif remaining_time < 3600:
-                                        time_str = f"{int(remaining_time/60)} minutes {int(remaining_time%60)} seconds"
-                                    else:
-                                        time_str = f"{int(remaining_time/3600)} hours {int((remaining_time%3600)/60)} minutes"
-                                    
-                                    self.log_window.set_estimated_time(time_str)
-                                
-                                last_frame_time = current_time
-                        else:
-                            # Si le format ne correspond pas, afficher la ligne telle quelle
-                            self.log_window.append_log(line_text)
-                    else:
-                        # Afficher les autres lignes sans modification
-                        self.log_window.append_log(line_text)
-                        
-                        # Forcer la mise à jour de l'interface
-                        QApplication.processEvents()
-            
-            self.process.wait()
-            
-            if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped after denoising.")
-                self.process = None
-                return
-                
-            returncode = self.process.returncode
-            self.process = None
-            
-            if returncode != 0:
-                error_msg = error_message or f"RenderMan denoiser failed with code: {returncode}"
-                QMessageBox.critical(self, "Denoiser Error", error_msg)
-                raise Exception(error_msg)
-            
-            self.log_window.append_log("✅ Denoising completed")
-            self.log_window.set_progress(phases["denoising"]["end"])
-            self.log_window.set_overall_progress(global_phases["denoising_done"])  # 50% quand le débruitage est terminé
-            
-            # Forcer la mise à jour de l'interface
-            QApplication.processEvents()
-            
-            # Handle pause if requested
-            self.check_pause()
-            
-            # Phase: merging (30%)
-            self.log_window.set_status("2: REBUILD BEAUTY - Merging AOVs...")
-            self.log_window.append_log("\n🔄 2: REBUILD BEAUTY - Starting AOVs merging...")
-            
-            # Forcer la mise à jour de l'interface
-            QApplication.processEvents()
-            
-            # Calculate actual denoise time
-            actual_denoise_time = time.time() - denoising_start_time
-            
-            # Create a progress callback to update the main progress bar
-            def merge_progress_callback(progress_percent):
-                # Check for stop request
-                if self.stop_requested:
-                    return True  # Signal to stop processing
-                    
-                # Handle pause if requested
-                self.check_pause()
-                
-                # Map 0-100% of merge to the merge phase range
-                merge_range = phases["merging"]["end"] - phases["merging"]["start"]
-                overall_progress = phases["merging"]["start"] + (progress_percent / 100 * merge_range)
-                self.log_window.set_progress(int(overall_progress))
-                
-                # Mettre à jour la barre de progression globale (entre 50% et 75%)
-                global_merge_progress = global_phases["denoising_done"] + (
-                    (progress_percent / 100) * 
-                    (global_phases["merging_done"] - global_phases["denoising_done"])
-                )
-                self.log_window.set_overall_progress(int(global_merge_progress))
-                
-                # Forcer la mise à jour de l'interface
-                QApplication.processEvents()
-                
-                return False  # Signal to continue processing
-            
-            # Create a log callback that also updates the time estimate
-            merge_start_time = time.time()
-            def merge_log_callback(message):
-                # Check for stop request
-                if self.stop_requested:
-                    return True  # Signal to stop processing
-                    
-                self.log_window.append_log(message)
-                
-                # Forcer la mise à jour de l'interface
-                QApplication.processEvents()
-                
-                # Update time estimate if it's a progress update
-                if "⏳ Progress:" in message:
-                    elapsed_merge_time = time.time() - merge_start_time
-                    if elapsed_merge_time > 0:
-                        # Extract progress from message
-                        parts = message.split()
-                        if len(parts) >= 3:
-                            progress_parts = parts[2].split('/')
-                            if len(progress_parts) == 2:
-                                try:
-                                    current = int(progress_parts[0])
-                                    total = int(progress_parts[1])
-                                    if current > 0:
-                                        percentage_done = current / total
-                                        estimated_total_merge_time = elapsed_merge_time / percentage_done
-                                        remaining_merge_time = estimated_total_merge_time - elapsed_merge_time
-                                        
-                                        # Update integrator estimate
-                                        if self.enable_integrator_checkbox.isChecked():
-                                            integrator_estimate = (estimated_total_merge_time / total_frames) * total_frames * 0.7
-                                            remaining_total = remaining_merge_time + integrator_estimate
-                                        else:
-                                            remaining_total = remaining_merge_time
-                                        
-                                        # Format time for display
-                                        if remaining_total < 60:
-                                            time_str = f"{int(remaining_total)} seconds"
-                                        elif remaining_total < 3600:
-                                            time_str = f"{int(remaining_total/60)} minutes {int(remaining_total%60)} seconds"
-                                        else:
-                                            time_str = f"{int(remaining_total/3600)} hours {int((remaining_total%3600)/60)} minutes"
-                                        
-                                        self.log_window.set_estimated_time(time_str)
-                                except:
-                                    pass
-                return False  # Signal to continue processing
+                job_id = queue.submit(input_path, output_path, settings)
+            finally:
+                queue.close()
+            started = ensure_daemon(queue_dir)
+        except Exception as e:
+            QMessageBox.critical(self, "Job Queue", f"Could not queue the job:\n{str(e)}")
+            return
+        self.log_window.append_log(f"🗂️ Job {job_id} queued: {os.path.basename(os.path.normpath(input_path))}")
+        if started:
+            self.log_window.append_log("🚀 Job daemon started in the background")
 
-            merge_final_exrs(
-                output_folder=beauty_dir,
-                frame_list=frames,
-                input_folder=input_path,
-                selected_aovs=selected_aovs,
-                compression_mode=self.selected_compression,
-                compression_level=self.compression_level if self.selected_compression in ["DWAA", "DWAB"] else None,
-                log_callback=merge_log_callback,
-                progress_callback=merge_progress_callback,
-                temp_folder=temp_dir,
-                shadow_mode=self.shadow_mode,
-                shadow_aovs=self.get_checked_shadow_aovs() if self.shadow_mode else [],
-                stop_check=lambda: self.stop_requested,
-                use_gpu=False
-            )
-            
-            if self.stop_requested:
-                self.log_window.append_log("🛑 Process stopped after merging.")
-                return
-                
-            # Handle pause if requested
-            self.check_pause()
-            
-            # If integrator is disabled, skip to cleanup
-            if not self.integrator_mode_button.isChecked():
-                self.log_window.set_progress(100)
-                self.log_window.set_overall_progress(100)  # 100% quand tout est terminé sans intégrateur
-            else:
-                self.log_window.set_progress(phases["merging"]["end"])
-                self.log_window.set_overall_progress(global_phases["merging_done"])  # 75% quand la fusion est terminée
-                
-                # Phase: integrators (15%)
-                self.log_window.set_status("3: REBUILD INTEGRATOR - Separating integrators...")
-                self.log_window.append_log("\n🔄 3: REBUILD INTEGRATOR - Starting integrator separation...")
-                
-                # Forcer la mise à jour de l'interface
-                QApplication.processEvents()
-                
-                # Create a progress callback for integrator phase
-                def integrator_progress_callback(progress_percent):
-                    # Check for stop request
-                    if self.stop_requested:
-                        return True  # Signal to stop processing
-                        
-                    # Handle pause if requested
-                    self.check_pause()
-                    
-                    # Map 0-100% of integrator to the integrator phase range
-                    integrator_range = phases["integrators"]["end"] - phases["integrators"]["start"]
-                    overall_progress = phases["integrators"]["start"] + (progress_percent / 100 * integrator_range)
-                    self.log_window.set_progress(int(overall_progress))
-                    
-                    # Mettre à jour la barre de progression globale (entre 75% et 100%)
-                    global_integrator_progress = global_phases["merging_done"] + (
-                        (progress_percent / 100) * 
-                        (global_phases["integrators_done"] - global_phases["merging_done"])
-                    )
-                    self.log_window.set_overall_progress(int(global_integrator_progress))
-                    
-                    # Forcer la mise à jour de l'interface
-                    QApplication.processEvents()
-                    
-                    return False  # Signal to continue processing
-                
-                # Create a log callback that also updates the time estimate
-                integrator_start_time = time.time()
-                def integrator_log_callback(message):
-                    # Check for stop request
-                    if self.stop_requested:
-                        return True  # Signal to stop processing
-                        
-                    self.log_window.append_log(message)
-                    
-                    # Forcer la mise à jour de l'interface
-                    QApplication.processEvents()
-                    
-                    # Update time estimate if it's a progress update
-                    if "⏳ Progress:" in message:
-                        elapsed_integrator_time = time.time() - integrator_start_time
-                        if elapsed_integrator_time > 0:
-                            # Extract progress from message
-                            parts = message.split()
-                            if len(parts) >= 3:
-                                progress_parts = parts[2].split('/')
-                                if len(progress_parts) == 2:
-                                    try:
-                                        current = int(progress_parts[0])
-                                        total = int(progress_parts[1])
-                                        if current > 0:
-                                            percentage_done = current / total
-                                            estimated_total_integrator_time = elapsed_integrator_time / percentage_done
-                                            remaining_integrator_time = estimated_total_integrator_time - elapsed_integrator_time
-                                            
-                                            # Format time for display
-                                            if remaining_integrator_time < 60:
-                                                time_str = f"{int(remaining_integrator_time)} seconds"
-                                            elif remaining_integrator_time < 3600:
-                                                time_str = f"{int(remaining_integrator_time/60)} minutes {int(remaining_integrator_time%60)} seconds"
-                                            else:
-                                                time_str = f"{int(remaining_integrator_time/3600)} hours {int((remaining_integrator_time%3600)/60)} minutes"
-                                            
-                                            self.log_window.set_estimated_time(time_str)
-                                    except:
-                                        pass
-                    return False  # Signal to continue processing
-                
-                selected_integrators = self.get_checked_integrators()
-                run_integrator_generate(
-                    input_folder=input_path,
-                    output_folder=integrator_dir,  # Use INTEGRATOR subdirectory
-                    selected_integrators=selected_integrators,
-                    compression_mode=self.selected_compression,
-                    compression_level=self.compression_level if self.selected_compression in ["DWAA", "DWAB"] else None,
-                    log_callback=integrator_log_callback,
-                    progress_callback=integrator_progress_callback,
-                    stop_check=lambda: self.stop_requested,
-                    use_gpu=False
-                )
-                
-                if self.stop_requested:
-                    self.log_window.append_log("🛑 Process stopped after integrator generation.")
-                    return
-                
-                self.log_window.set_progress(100)
-                self.log_window.set_overall_progress(100)  # 100% quand tout est terminé
-            
-            # Cleanup: Delete temp_denoised folder
-            self.log_window.append_log("🧹 Cleaning up temporary files...")
+    def show_job_queue(self):
+        """Afficher l'état des jobs de la file (lu dans la base du démon)"""
+        try:
+            queue = JobQueue(self.config.get("JOB_QUEUE_DIR") or None)
             try:
-                import shutil
-                shutil.rmtree(temp_dir)
-                self.log_window.append_log(f"✅ Removed temporary directory: {temp_dir}")
-            except Exception as e:
-                self.log_window.append_log(f"⚠️ Warning: Could not remove temporary directory: {str(e)}")
-            
-            # Calculate actual total time
-            total_process_time = time.time() - denoising_start_time
-            if total_process_time < 60:
-                total_time_str = f"{int(total_process_time)} seconds"
-            elif total_process_time < 3600:
-                total_time_str = f"{int(total_process_time/60)} minutes {int(total_process_time%60)} seconds"
-            else:
-                total_time_str = f"{int(total_process_time/3600)} hours {int((total_process_time%3600)/60)} minutes"
-                
-            self.log_window.set_status(f"Process completed in {total_time_str}")
-            self.log_window.append_log(f"✅ Process completed in {total_time_str}!")
-            
-            # Forcer la mise à jour de l'interface
-            QApplication.processEvents()
-            
-            # Si nous sommes en mode batch, notifier le parent que le traitement est terminé
-            if batch_mode and hasattr(self, 'batch_finished_callback') and hasattr(self, 'batch_tab_index'):
-                # Vérifier si le traitement s'est terminé avec succès (sans stop_requested)
-                success = not self.stop_requested
-                self.batch_finished_callback(self.batch_tab_index, success)
-            
+                jobs = queue.jobs()
+                daemon_alive = queue.daemon_alive()
+            finally:
+                queue.close()
         except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
-            self.log_window.append_log(f"Error: {str(e)}")
-        finally:
-            self.process = None
-            self.set_processing_state(False)
-            
+            QMessageBox.critical(self, "Job Queue", f"Could not read the job queue:\n{str(e)}")
+            return
+        active = [job for job in jobs if job["state"] in ("queued", "running", "cancelling")]
+        finished = [job for job in jobs if job not in active][-10:]
+        lines = [describe_job(job) for job in active + finished] or ["No jobs"]
+        lines.append("")
+        lines.append("Daemon running" if daemon_alive else "Daemon stopped")
+        QMessageBox.information(self, "Job Queue", "\n".join(lines))
+
     def check_pause(self):
-        """Check if process should be paused and wait if needed"""
+        """Bloquer le thread du traitement tant qu'une pause est demandée (réveillé par la reprise ou l'arrêt)"""
         while self.pause_requested and not self.stop_requested:
-            # Keep UI responsive while paused
-            QApplication.processEvents()
-            time.sleep(0.1)  # Small sleep to avoid high CPU usage
+            self.pause_gate.wait()
+
+    def toggle_pause(self):
+        """Pause / reprise demandée depuis la fenêtre de log"""
+        if not self.processing:
+            return
+        self.set_paused(not self.pause_requested)
+        if self.pause_requested:
+            self.log_window.append_log("⏸️ Paused - workers stop after their current frame")
+            self.log_window.set_status("Paused")
+        else:
+            self.log_window.append_log("▶️ Resumed")
+
+    def set_paused(self, paused):
+        self.pause_requested = paused
+        if paused:
+            self.pause_gate.pause()
+        else:
+            self.pause_gate.resume()
+        # DENOIZE ALL: le process du pipeline applique lui-même la pause
+        if self.batch_job_running():
+            self.send_batch_command("pause" if paused else "resume")
+        self.log_window.set_paused(paused)
 
     def set_processing_state(self, is_processing):
         """Update UI state during processing"""
@@ -2623,6 +2271,10 @@ class DenoizerTab(QWidget):
         
         # Show emergency stop button when processing
         if is_processing:
+            # Chaque traitement démarre sans pause, boutons de la fenêtre de log actifs
+            self.set_paused(False)
+            self.log_window.reset_controls()
+            
             # Afficher le bouton dans son conteneur dédié
             self.emergency_stop_btn.setVisible(True)
             self.emergency_container.setVisible(True)
@@ -2654,19 +2306,12 @@ class DenoizerTab(QWidget):
         else:
             # Mettre à jour le titre de la fenêtre de log pour indiquer que le traitement est en cours
             self.log_window.setWindowTitle("DenoiZer - Processing")
-            
-        # Forcer une mise à jour complète de l'interface
-        QApplication.processEvents()
         
     def check_process_state(self):
         """Periodically check process state and update the interface"""
-        # If the process is stopped, update the interface
-        if self.processing and self.process is None:
-            # Forcer l'actualisation de l'interface
-            QApplication.processEvents()
-            
         # Si un sous-processus existe, vérifier s'il est toujours en cours
-        if self.process and hasattr(self.process, 'poll'):
+        # (process DENOIZE ALL: suivi par poll_batch_job, QThread: fin signalée par worker_done)
+        if self.process and hasattr(self.process, 'poll') and not self.batch_job_running() and not self.worker_running():
             returncode = self.process.poll()
             if returncode is not None:  # Le processus est terminé
                 # Afficher le résultat dans les logs si ce n'est pas déjà fait
@@ -3049,8 +2694,19 @@ class DenoizerTab(QWidget):
     def process_stop_requested(self):
         """Handle stop request from log window"""
         self.stop_requested = True
+        self.pause_gate.resume()  # Un traitement en pause doit pouvoir s'arrêter
         self.log_window.append_log("🛑 Process will terminate after current operation")
         
+        # DENOIZE ALL: ne pas toucher aux denoise_batch des autres onglets
+        if self.batch_job_running():
+            self.stop_batch_job()
+            return
+        
+        # QThread: le pipeline voit stop_requested, termine denoise_batch et ses pools, puis worker_done remet l'onglet au repos
+        if self.worker_running():
+            self.log_window.set_status("Stopping...")
+            return
+        
         # Terminate the process if it exists
         if self.process and hasattr(self.process, 'poll') and self.process.poll() is None:
             try:
@@ -3154,8 +2810,29 @@ class DenoizerTab(QWidget):
     def emergency_stop(self):
         """Handle emergency stop request - force kill the process"""
         self.stop_requested = True
+        self.pause_gate.resume()
         self.log_window.append_log("🛑 EMERGENCY STOP REQUESTED")
         
+        # DENOIZE ALL: tuer seulement le process de cet onglet (la fin est détectée par poll_batch_job)
+        if self.batch_job_running():
+            self.kill_batch_job()
+            self.log_window.append_log("✅ Emergency stop successful - pipeline process killed")
+            return
+        
+        # QThread: tuer les denoise_batch de cet onglet tout de suite, le thread sort à la prochaine vérification
+        if self.worker_running():
+            pipeline = self.pipeline
+            if pipeline:
+                for shard in pipeline.shards:
+                    if shard.process and shard.process.poll() is None:
+                        try:
+                            shard.process.kill()
+                        except:
+                            pass
+            self.log_window.append_log("✅ Emergency stop: denoiser killed, waiting for the current frames to finish")
+            self.log_window.set_status("Stopping...")
+            return
+        
         # Try to stop the process more aggressively
         emergency_successful = False
         
@@ -3431,8 +3108,9 @@ class DenoiZer(QWidget):
         # Variable pour suivre les tâches en cours d'exécution
         self.running_tasks = 0
         
-        # Définir le nombre maximum de tâches parallèles (séquentiel pour l'instant)
-        self.max_parallel_tasks = 1
+        # Nombre maximum de tâches parallèles (0: limité seulement par les ressources de la machine)
+        self.max_parallel_tasks = self.config.get("MAX_PARALLEL_JOBS", 0)
+        self.scheduler = None
 
         # Définir le fond de la fenêtre principale en noir
         self.setStyleSheet("""
@@ -3511,7 +3189,7 @@ class DenoiZer(QWidget):
 
     
     def run_all_tabs(self):
-        """Exécuter tous les onglets l'un après l'autre"""
+        """Exécuter tous les onglets, en parallèle tant que les ressources de la machine le permettent"""
         # Vérifier s'il y a des onglets à traiter
         tab_count = self.tab_widget.count() - 1  # Ne pas compter l'onglet "+"
         if tab_count <= 0:
@@ -3555,6 +3233,16 @@ class DenoiZer(QWidget):
         # Réinitialiser le compteur de tâches en cours
         self.running_tasks = 0
         
+        # Besoins de chaque onglet: un plan à débruiter est lourd, un plan déjà débruité (reprise) léger
+        capacity = machine_capacity(self.config.get("DISK_BANDWIDTH_MB_S", DEFAULT_DISK_MB_S))
+        self.scheduler = ResourceScheduler(capacity, self.max_parallel_tasks)
+        for i in self.tab_queue:
+            tab = self.tab_widget.widget(i)
+            if not tab:
+                continue
+            input_path, output_path = tab.input_path.text(), tab.output_path.text()
+            self.scheduler.add(i, job_demand(job_kind(input_path, output_path), input_path, capacity))
+        
         # Lancer les premières tâches en parallèle
         QTimer.singleShot(500, self.process_next_tab)
         
@@ -3574,17 +3262,19 @@ class DenoiZer(QWidget):
                 QMessageBox.information(self, "Batch Complete", "All denoising tasks have been completed!")
             return
         
-        # Traitement séquentiel - une tâche à la fois
-        if self.running_tasks >= 1:
-            return
-        
-        # Récupérer le prochain onglet à traiter
-        tab_index = self.tab_queue[0]  # Garder dans la file pour l'instant
+        # Onglets admis par l'ordonnanceur: autant que les cœurs, la mémoire et le disque libres le permettent
+        for tab_index, demand in self.scheduler.admit():
+            self.start_tab(tab_index, demand)
+
+    def start_tab(self, tab_index, demand):
+        """Démarrer le process d'un onglet admis par l'ordonnanceur"""
+        if tab_index in self.tab_queue:
+            self.tab_queue.remove(tab_index)
         tab = self.tab_widget.widget(tab_index)
         
         if not tab:
-            # Si l'onglet n'existe pas, le retirer et passer au suivant
-            self.tab_queue.pop(0)
+            # Si l'onglet n'existe pas, rendre ses ressources et passer au suivant
+            self.scheduler.release(tab_index)
             QTimer.singleShot(100, self.process_next_tab)
             return
         
@@ -3601,28 +3291,21 @@ class DenoiZer(QWidget):
         # Augmenter le compteur de tâches en cours
         self.running_tasks += 1
         
-        # Force l'interface à se mettre à jour
-        QApplication.processEvents()
-        
         # Configurer un callback pour quand le traitement est terminé
         tab.batch_finished_callback = self.tab_process_finished
         tab.batch_tab_index = tab_index
         tab.batch_tab_name = clean_name
         
-        # Retirer l'onglet de la file
-        self.tab_queue.pop(0)
-        
-        # Démarrer le traitement de cet onglet
-        # Utiliser un timer pour s'assurer que l'UI est mise à jour avant de commencer
-        QTimer.singleShot(500, lambda: tab.run_denoise(batch_mode=True))
-        
-        # Traitement séquentiel - pas de parallélisme
-        # Le prochain onglet sera traité quand celui-ci sera terminé
+        # Démarrer le pipeline de cet onglet dans son propre process (l'interface reste libre)
+        if not tab.start_batch_job(demand):
+            self.tab_process_finished(tab_index, False)
 
     def tab_process_finished(self, tab_index, success=True):
         """Callback appelé quand un onglet a terminé son traitement"""
         # Récupérer l'onglet
         tab = self.tab_widget.widget(tab_index)
+        if self.scheduler is not None:
+            self.scheduler.release(tab_index)
         if not tab:
             # Si l'onglet n'existe plus, passer au suivant
             self.running_tasks -= 1
@@ -3637,11 +3320,8 @@ class DenoiZer(QWidget):
         # Diminuer le compteur de tâches en cours
         self.running_tasks -= 1
         
-        # S'assurer que l'interface est mise à jour
-        QApplication.processEvents()
-        
-        # Lancer le prochain onglet si possible
-        if self.tab_queue and self.running_tasks < self.max_parallel_tasks:
+        # Des ressources se sont libérées: admettre les onglets suivants
+        if self.tab_queue:
             QTimer.singleShot(500, self.process_next_tab)
         elif not self.tab_queue and self.running_tasks == 0:
             # Si tous les onglets ont été traités
@@ -3743,6 +3423,9 @@ class DenoiZer(QWidget):
             
             # Récupérer le widget de l'onglet et le supprimer
             tab_widget = self.tab_widget.widget(index)
+            if getattr(tab_widget, 'processing', False):
+                QMessageBox.information(self, "Information", "Stop the process running in this tab before closing it.")
+                return
             self.tab_widget.removeTab(index)
             
             # Renuméroter les onglets restants
@@ -3806,6 +3489,14 @@ class DenoiZer(QWidget):
                 else:
                     tab.run_btn.setText("DENOIZE")
 
+    def closeEvent(self, event):
+        """Fermeture: arrêter proprement les traitements des onglets (QThread ou process)"""
+        for i in range(self.tab_widget.count() - 1):
+            tab = self.tab_widget.widget(i)
+            if hasattr(tab, 'wait_for_worker'):
+                tab.wait_for_worker()
+        super().closeEvent(event)
+
 def main():
     """Point d'entrée principal de l'application"""
     app = QApplication([])
@@ -3834,4 +3525,22 @@ def main():
     return app.exec()
 
 if __name__ == "__main__":
+    # Nécessaire pour les workers process du merge dans l'exécutable Windows
+    multiprocessing.freeze_support()
+    # DenoiZer.exe --pipeline ...: pipeline en ligne de commande (onglets DENOIZE ALL lancés en process)
+    if len(sys.argv) > 1 and sys.argv[1] == "--pipeline":
+        from Pipeline import main as pipeline_main
+        sys.exit(pipeline_main(sys.argv[2:]))
+    # DenoiZer.exe --jobs ...: file de jobs (démon lancé par SEND TO JOB QUEUE)
+    if len(sys.argv) > 1 and sys.argv[1] == "--jobs":
+        from JobQueue import main as jobs_main
+        sys.exit(jobs_main(sys.argv[2:]))
+    # DenoiZer.exe --fake-denoiser ...: faux denoise_batch (option --fake-denoiser du pipeline)
+    if len(sys.argv) > 1 and sys.argv[1] == "--fake-denoiser":
+        from FakeDenoiser import main as fake_denoiser_main
+        sys.exit(fake_denoiser_main(sys.argv[2:]))
+    # DenoiZer.exe --benchmark ...: mesure des moteurs de fusion sur une séquence synthétique
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        from ExrBenchmark import main as benchmark_main
+        sys.exit(benchmark_main(sys.argv[2:]))
     sys.exit(main())
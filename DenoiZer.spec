@@ -5,7 +5,7 @@ a = Analysis(
     ['DenoiZer.py'],
     pathex=[],
     binaries=[],
-    datas=[('DenoiZer_icon.png', '.'), ('DenoiZer_icon.ico', '.'), ('ExrMerge.py', '.'), ('Integrator_Denoizer.py', '.'), ('fonts\\\\CutePixel.ttf', 'fonts'), ('fonts\\\\Minecrafter.Alt.ttf', 'fonts')],
+    datas=[('DenoiZer_icon.png', '.'), ('DenoiZer_icon.ico', '.'), ('ExrMerge.py', '.'), ('Integrator_Denoizer.py', '.'), ('ExrIO.py', '.'), ('FramePool.py', '.'), ('Pipeline.py', '.'), ('FarmQueue.py', '.'), ('RunManifest.py', '.'), ('DenoiseCache.py', '.'), ('PerfReport.py', '.'), ('Scheduler.py', '.'), ('JobQueue.py', '.'), ('ExrBenchmark.py', '.'), ('FakeDenoiser.py', '.'), ('fonts\\\\CutePixel.ttf', 'fonts'), ('fonts\\\\Minecrafter.Alt.ttf', 'fonts')],
     hiddenimports=['numpy', 'numpy.core', 'numpy.core._methods', 'numpy.lib.format'],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Cache persistant des sorties de denoise_batch, partagé entre les runs (et les dossiers de sortie).
+# Une entrée contient les fichiers débruités d'une frame (principal + aux-*), sous une clé qui
+# résume tout ce dont le débruitage dépend:
+#   - contenu de l'EXR d'entrée (et de ses voisines CrossFrame)
+#   - passes débruitées et répartition des couches aux
+#   - contenu des fichiers .param / .topo, CrossFrame
+#   - version de RenderMan (dossier + denoise_batch)
+# Changer seulement les options de fusion (compression, AOVs gardés, ...) réutilise donc le cache.
+# La taille est bornée: les entrées les moins récemment utilisées sont supprimées en premier.
+
+INDEX_NAME = "index.json"
+INDEX_LOCK_NAME = "index.lock"
+ENTRIES_FOLDER = "entries"
+INDEX_VERSION = 1
+
+# Le cache est partagé par plusieurs process (onglets de DENOIZE ALL, démon de jobs, workers
+# de ferme): chaque modification relit l'index et l'écrit sous un fichier verrou.
+# Un verrou plus vieux que INDEX_LOCK_TIMEOUT secondes vient d'un process mort et est repris.
+INDEX_LOCK_TIMEOUT = 30.0
+INDEX_LOCK_POLL = 0.05
+
+# Dossiers d'entrées absents de l'index gardés ce délai (secondes) avant d'être supprimés:
+# un autre process peut être en train de les écrire ou de les ajouter à l'index
+ORPHAN_GRACE = 3600
+
+DEFAULT_CACHE_SIZE_GB = 20
+
+# Lecture des fichiers à hacher par blocs
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def default_cache_dir():
+    """Dossier du cache par défaut (LOCALAPPDATA sous Windows, ~/.cache ailleurs)"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "DenoiZer", "denoise_cache")
+
+
+def file_hash(path):
+    """Empreinte du contenu d'un fichier (None s'il n'existe pas)"""
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def renderman_version(renderman_path, denoiser):
+    """Version de RenderMan: nom du dossier Pro Server + taille/date de denoise_batch"""
+    version = [os.path.basename(os.path.normpath(renderman_path))]
+    try:
+        stat = os.stat(denoiser)
+        version += [stat.st_size, int(stat.st_mtime)]
+    except OSError:
+        pass
+    return version
+
+
+class DenoiseCache:
+    """Cache LRU des fichiers débruités par frame, borné en taille"""
+
+    def __init__(self, cache_dir, max_size_gb=DEFAULT_CACHE_SIZE_GB, log_callback=None):
+        self.cache_dir = cache_dir
+        self.entries_dir = os.path.join(cache_dir, ENTRIES_FOLDER)
+        self.index_path = os.path.join(cache_dir, INDEX_NAME)
+        self.lock_path = os.path.join(cache_dir, INDEX_LOCK_NAME)
+        self.max_size = int(max_size_gb * 1024 ** 3)
+        self.log_callback = log_callback
+        self.lock = threading.Lock()
+        os.makedirs(self.entries_dir, exist_ok=True)
+        self.index = self.load()
+        # Changements de ce process reportés dans l'index partagé à la fermeture
+        self.used = {}  # clé -> dernière utilisation
+        self.new_hashes = {}  # chemin -> [taille, date, empreinte]
+        # Copies vers le cache en tâche de fond (la fusion ne les attend pas)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.hits = 0
+        self.stored = 0
+
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION:
+                return index
+        except:
+            pass
+        return {"version": INDEX_VERSION, "entries": {}, "hashes": {}}
+
+    def save(self, index):
+        temp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(index, f, indent=1)
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def acquire_index_lock(self):
+        """Prendre le fichier verrou de l'index (création exclusive, verrou périmé repris)"""
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > INDEX_LOCK_TIMEOUT:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                time.sleep(INDEX_LOCK_POLL)
+
+    def release_index_lock(self):
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+    def update_index(self, change):
+        """Relire l'index partagé, appliquer `change(index)` et l'écrire, sous le fichier verrou
+
+        Les entrées ajoutées entre-temps par les autres process sont ainsi conservées."""
+        with self.lock:
+            self.acquire_index_lock()
+            try:
+                index = self.load()
+                result = change(index)
+                self.save(index)
+                self.index = index
+            finally:
+                self.release_index_lock()
+        return result
+
+    def input_hash(self, path):
+        """Empreinte du contenu d'un EXR d'entrée, mémorisée par (chemin, taille, date) pour ne pas le relire"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        known = self.new_hashes.get(path) or self.index["hashes"].get(path)
+        if known and known[:2] == stamp:
+            return known[2]
+        digest = file_hash(path)
+        with self.lock:
+            self.new_hashes[path] = stamp + [digest]
+        return digest
+
+    def key(self, input_hashes, settings):
+        """Clé d'une frame: empreintes de ses entrées (frame + voisines) et réglages du débruitage"""
+        if not input_hashes or None in input_hashes:
+            return None
+        encoded = json.dumps([input_hashes, settings], sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha1(encoded).hexdigest()
+
+    def restore(self, key, frame, folders, denoised_folder):
+        """Copier une entrée du cache dans temp_denoised. Retourne False si absente ou incomplète"""
+        if not key:
+            return False
+        with self.lock:
+            entry = self.index["entries"].get(key)
+        if not entry:
+            return False
+        entry_dir = os.path.join(self.entries_dir, key)
+        sources = [os.path.join(entry_dir, folder, frame) for folder in folders]
+        if not all(os.path.exists(source) for source in sources):
+            self.discard(key)
+            return False
+        try:
+            for folder, source in zip(folders, sources):
+                target_dir = os.path.join(denoised_folder, folder)
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.copyfile(source, os.path.join(target_dir, frame))
+        except OSError:
+            # Entrée supprimée par un autre process pendant la copie: la frame sera débruitée
+            return False
+        with self.lock:
+            self.used[key] = time.time()
+        self.hits += 1
+        return True
+
+    def store(self, key, frame, folders, denoised_folder):
+        """Ajouter au cache (en tâche de fond) les fichiers débruités d'une frame"""
+        if key:
+            self.executor.submit(self.store_entry, key, frame, list(folders), denoised_folder)
+
+    def store_entry(self, key, frame, folders, denoised_folder):
+        entry_dir = os.path.join(self.entries_dir, key)
+        temp_dir = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        try:
+            for folder in folders:
+                source = os.path.join(denoised_folder, folder, frame)
+                target_dir = os.path.join(temp_dir, folder)
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.copyfile(source, os.path.join(target_dir, frame))
+                size += os.path.getsize(source)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temp_dir, entry_dir)
+        except OSError as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            self.log(f"⚠️ Could not cache denoised {frame}: {str(e)}")
+            return
+
+        def add(index):
+            index["entries"][key] = {"frame": frame, "size": size, "last_used": time.time()}
+
+        self.update_index(add)
+        self.stored += 1
+
+    def discard(self, key):
+        self.update_index(lambda index: index["entries"].pop(key, None))
+        shutil.rmtree(os.path.join(self.entries_dir, key), ignore_errors=True)
+
+    def remove_orphans(self, index):
+        """Supprimer les dossiers d'entrées absents de l'index (index écrasé, copie interrompue)"""
+        removed = 0
+        now = time.time()
+        try:
+            names = os.listdir(self.entries_dir)
+        except OSError:
+            return 0
+        for name in names:
+            if name in index["entries"]:
+                continue
+            path = os.path.join(self.entries_dir, name)
+            try:
+                if now - os.path.getmtime(path) < ORPHAN_GRACE:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def evict(self, index):
+        """Supprimer les entrées les moins récemment utilisées jusqu'à repasser sous la taille maximale"""
+        orphans = self.remove_orphans(index)
+        entries = sorted(index["entries"].items(), key=lambda item: item[1].get("last_used", 0))
+        total = sum(entry.get("size", 0) for _, entry in entries)
+        evicted = 0
+        for key, entry in entries:
+            if total <= self.max_size:
+                break
+            del index["entries"][key]
+            shutil.rmtree(os.path.join(self.entries_dir, key), ignore_errors=True)
+            total -= entry.get("size", 0)
+            evicted += 1
+        if evicted:
+            self.log(f"🗄️ Denoise cache: evicted {evicted} least recently used frames")
+        if orphans:
+            self.log(f"🗄️ Denoise cache: removed {orphans} entries missing from the index")
+
+    def close(self):
+        """Attendre les copies en cours, reporter les utilisations dans l'index et appliquer la limite de taille"""
+        self.executor.shutdown(wait=True)
+
+        def merge(index):
+            for key, last_used in self.used.items():
+                if key in index["entries"]:
+                    index["entries"][key]["last_used"] = max(last_used, index["entries"][key].get("last_used", 0))
+            index["hashes"].update(self.new_hashes)
+            # Oublier les empreintes des fichiers d'entrée disparus
+            index["hashes"] = {path: value for path, value in index["hashes"].items() if os.path.exists(path)}
+            self.evict(index)
+
+        self.update_index(merge)
+        self.used = {}
+        self.new_hashes = {}
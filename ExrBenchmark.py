@@ -0,0 +1,336 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import psutil
+import OpenImageIO as oiio
+from ExrIO import write_pixels, PIXEL_TYPES
+from FramePool import BACKENDS
+from ExrMerge import MergeSession
+from Integrator_Denoizer import IntegratorSession
+from PerfReport import PerfReport
+
+# Banc d'essai de la fusion (MergeSession) et de la séparation des intégrateurs (IntegratorSession),
+# sans RenderMan: une séquence EXR synthétique et un temp_denoised factice sont générés, puis
+# chaque moteur est mesuré pour plusieurs backends / nombres de workers / compressions.
+# Chaque mesure tourne dans un processus à part (pics de mémoire indépendants).
+# Les données sont générées avec une graine fixe: deux runs avec les mêmes options lisent les mêmes pixels.
+
+ENGINES = ["merge", "integrator"]
+BENCHMARK_COMPRESSIONS = ["DWAB", "ZIP", "PIZ"]
+
+# Intervalle d'échantillonnage de la mémoire (RSS du processus de mesure et de ses workers)
+RSS_SAMPLE_INTERVAL = 0.05
+
+# AOVs toujours présents dans la séquence synthétique (RGB), en plus des light groups et AOVs supplémentaires
+BASE_AOVS = ["Ci", "albedo", "diffuse", "specular", "subsurface"]
+DATA_AOVS = ["P"]  # AOVs non débruités (copiés depuis l'entrée)
+INTEGRATORS = ["diffuse", "specular", "subsurface", "Z"]
+
+
+def parse_resolution(value):
+    """"1920x1080" -> (1920, 1080)"""
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def split_list(value):
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def sequence_layout(light_groups=4, extra_aovs=0):
+    """AOVs de la séquence synthétique: light groups répartis entre diffuse et specular"""
+    diffuse_lgt = [f"LGT_diffuse{index}" for index in range(light_groups - light_groups // 2)]
+    specular_lgt = [f"LGT_specular{index}" for index in range(light_groups // 2)]
+    extra = [f"extra{index}" for index in range(extra_aovs)]
+    return {
+        "aovs": BASE_AOVS + extra,
+        "diffuse_lgt": diffuse_lgt,
+        "specular_lgt": specular_lgt,
+        "data_aovs": DATA_AOVS,
+        # AOVs passés à la fusion (comme Pipeline.resolve_aovs: sélection + light groups)
+        "selected_aovs": BASE_AOVS + extra + ["Z"] + DATA_AOVS + diffuse_lgt + specular_lgt
+    }
+
+
+def synthetic_layer(rng, base, shape):
+    """Image lisse (dégradés + motifs) avec un peu de bruit: plus proche d'un rendu qu'un bruit pur"""
+    height, width = shape
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    layer = base + 0.5 * np.sin(x / (width / 7.0) + base) * np.cos(y / (height / 5.0))
+    layer += rng.normal(0.0, 0.05, size=shape).astype(np.float32)
+    return np.abs(layer).astype(np.float32)
+
+
+def write_exr_file(path, channels, pixels, pixel_type, compression):
+    spec = oiio.ImageSpec(pixels.shape[1], pixels.shape[0], len(channels), oiio.HALF if pixel_type == "HALF" else oiio.FLOAT)
+    spec.channelnames = tuple(channels)
+    spec.attribute("compression", compression.lower())
+    if compression in ("DWAA", "DWAB"):
+        spec.attribute("openexr:dwaCompressionLevel", 45.0)
+    success, error = write_pixels(path, spec, np.ascontiguousarray(pixels))
+    if not success:
+        raise IOError(f"Could not write {path}: {error}")
+
+
+def synthesize_sequence(folder, frames=8, resolution=(1920, 1080), light_groups=4, extra_aovs=0,
+                        pixel_type="HALF", compression="DWAB", seed=0, log_callback=None):
+    """Créer `folder`/input (séquence EXR) et `folder`/temp_denoised (sorties de denoise_batch factices)
+
+    Retourne la disposition de la séquence (voir sequence_layout) et la liste des frames."""
+    layout = sequence_layout(light_groups, extra_aovs)
+    input_dir = os.path.join(folder, "input")
+    denoised_dir = os.path.join(folder, "temp_denoised")
+    aux_layers = {
+        "aux-albedo": ["albedo"],
+        "aux-diffuse": layout["diffuse_lgt"],
+        "aux-specular": layout["specular_lgt"],
+        "aux-subsurface": ["subsurface"]
+    }
+    for path in [input_dir, denoised_dir] + [os.path.join(denoised_dir, aux) for aux, layers in aux_layers.items() if layers]:
+        os.makedirs(path, exist_ok=True)
+
+    rgb = layout["aovs"] + layout["diffuse_lgt"] + layout["specular_lgt"] + layout["data_aovs"]
+    channels = ["R", "G", "B", "A", "Z"] + [f"{aov}.{c}" for aov in rgb for c in "RGB"]
+    shape = (resolution[1], resolution[0])
+    rng = np.random.default_rng(seed)
+    frame_names = []
+    for index in range(frames):
+        frame = f"bench.{1001 + index:04d}.exr"
+        frame_names.append(frame)
+        if log_callback:
+            log_callback(f"🧪 Synthesizing {frame} ({len(channels)} channels, {resolution[0]}x{resolution[1]} {pixel_type} {compression})")
+        pixels = np.empty(shape + (len(channels),), dtype=np.float32)
+        for slot in range(len(channels)):
+            pixels[:, :, slot] = synthetic_layer(rng, 0.1 + 0.01 * slot + 0.02 * index, shape)
+        pixels[:, :, 3] = 1.0
+        write_exr_file(os.path.join(input_dir, frame), channels, pixels, pixel_type, compression)
+
+        # Sorties débruitées: fichier principal (RGBA + Ci, diffuse, specular) puis un fichier par catégorie aux
+        position = {name: slot for slot, name in enumerate(channels)}
+        main_channels = ["R", "G", "B", "A"] + [f"{aov}.{c}" for aov in ("Ci", "diffuse", "specular") for c in "RGB"]
+        denoised = pixels[:, :, [position[ch] for ch in main_channels]] * 0.98
+        write_exr_file(os.path.join(denoised_dir, frame), main_channels, denoised, "HALF", "ZIP")
+        for aux, layers in aux_layers.items():
+            if not layers:
+                continue
+            aux_channels = [f"{layer}.{c}" for layer in layers for c in "RGB"]
+            denoised = pixels[:, :, [position[ch] for ch in aux_channels]] * 0.98
+            write_exr_file(os.path.join(denoised_dir, aux, frame), aux_channels, denoised, "HALF", "ZIP")
+    return layout, frame_names
+
+
+def run_engine(engine, folder, layout, frames, backend, workers, compression, pixel_type, results):
+    """Exécuter un moteur sur la séquence synthétique (dans le processus de mesure)"""
+    report = PerfReport()
+    output_dir = os.path.join(folder, f"out_{engine}")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    start = time.time()
+    if engine == "merge":
+        session = MergeSession(output_dir, os.path.join(folder, "input"), layout["selected_aovs"], compression, len(frames),
+                               compression_level=45.0, temp_folder=os.path.join(folder, "temp_denoised"),
+                               pixel_type=pixel_type, backend=backend, workers=workers, event_callback=report.add_event)
+        try:
+            for frame in frames:
+                session.submit(frame)
+            session.finish()
+        finally:
+            session.close()
+    else:
+        session = IntegratorSession(os.path.join(folder, "input"), output_dir, INTEGRATORS, compression,
+                                    compression_level=45.0, pixel_type=pixel_type, backend=backend, workers=workers,
+                                    high_priority=False, frame_list=frames, event_callback=report.add_event)
+        try:
+            session.start()
+            session.finish()
+        finally:
+            session.close()
+    elapsed = time.time() - start
+    phase = report.summary()["phases"].get(engine, {})
+    results.put({
+        "elapsed": elapsed,
+        "frames": phase.get("frames", 0),
+        "failed": phase.get("failed", 0),
+        "frames_per_s": phase.get("frames", 0) / elapsed if elapsed > 0 else 0.0,
+        "read_mb_per_s": phase.get("mb_read", 0.0) / elapsed if elapsed > 0 else 0.0,
+        "write_mb_per_s": phase.get("mb_written", 0.0) / elapsed if elapsed > 0 else 0.0,
+        "worker_utilisation": phase.get("worker_utilisation", 0.0),
+        "frame_p50": phase.get("stages", {}).get("total", {}).get("p50", 0.0),
+        "frame_p95": phase.get("stages", {}).get("total", {}).get("p95", 0.0)
+    })
+
+
+def process_tree_rss(process):
+    """RSS du processus et de ses enfants (workers process), en octets"""
+    try:
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    except psutil.Error:
+        return 0
+
+
+def measure_case(engine, folder, layout, frames, backend, workers, compression, pixel_type):
+    """Mesurer un cas dans un processus neuf; retourne ses résultats avec le pic de RSS"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    child = context.Process(target=run_engine, args=(engine, folder, layout, frames, backend, workers, compression, pixel_type, results))
+    child.start()
+    peak = 0
+    process = psutil.Process(child.pid)
+    while child.is_alive():
+        peak = max(peak, process_tree_rss(process))
+        child.join(RSS_SAMPLE_INTERVAL)
+    try:
+        result = results.get(timeout=5)
+    except Exception:
+        result = {"error": f"benchmark process exited with code {child.exitcode}"}
+    result["peak_rss_mb"] = peak / (1024 * 1024)
+    return result
+
+
+def run_benchmark(work_dir, frames=8, resolution=(1920, 1080), light_groups=4, extra_aovs=0, pixel_types=("HALF",),
+                  compressions=("DWAB",), engines=ENGINES, backends=("THREAD", "PROCESS"), worker_counts=(None,),
+                  repeat=1, seed=0, log_callback=None):
+    """Générer les séquences et mesurer chaque combinaison. Retourne la liste des résultats"""
+    log = log_callback or (lambda message: None)
+    results = []
+    for pixel_type in pixel_types:
+        for compression in compressions:
+            folder = os.path.join(work_dir, f"{pixel_type.lower()}_{compression.lower()}")
+            layout, frame_names = synthesize_sequence(folder, frames, resolution, light_groups, extra_aovs,
+                                                      pixel_type, compression, seed, log_callback=log)
+            for engine in engines:
+                for backend in backends:
+                    for workers in worker_counts:
+                        for run in range(repeat):
+                            case = {
+                                "engine": engine, "backend": backend, "workers": workers or "auto",
+                                "pixel_type": pixel_type, "compression": compression, "run": run + 1,
+                                "frames_total": frames, "resolution": f"{resolution[0]}x{resolution[1]}",
+                                "channels": 5 + 3 * (len(layout["aovs"]) + len(layout["diffuse_lgt"]) + len(layout["specular_lgt"]) + len(layout["data_aovs"]))
+                            }
+                            case.update(measure_case(engine, folder, layout, frame_names, backend, workers, compression, pixel_type))
+                            results.append(case)
+                            log(format_result(case))
+    return results
+
+
+def case_key(case):
+    return (case["engine"], case["backend"], str(case["workers"]), case["pixel_type"], case["compression"])
+
+
+def format_result(case):
+    if "error" in case:
+        return f"❌ {case['engine']:<10} {case['backend']:<7} workers={case['workers']:<4} {case['pixel_type']} {case['compression']}: {case['error']}"
+    return (f"📊 {case['engine']:<10} {case['backend']:<7} workers={str(case['workers']):<4} {case['pixel_type']:<5} {case['compression']:<4} "
+            f"{case['frames_per_s']:7.2f} frames/s  read {case['read_mb_per_s']:8.1f}MB/s  write {case['write_mb_per_s']:8.1f}MB/s  "
+            f"peak RSS {case['peak_rss_mb']:7.0f}MB  utilisation {case['worker_utilisation'] * 100:3.0f}%")
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Cas plus lents que la référence au-delà de `tolerance` (fraction de frames/s perdue)"""
+    reference = {}
+    for case in baseline:
+        if "frames_per_s" in case:
+            reference.setdefault(case_key(case), []).append(case["frames_per_s"])
+    measured = {}
+    for case in results:
+        if "frames_per_s" in case:
+            measured.setdefault(case_key(case), []).append(case["frames_per_s"])
+    regressions = []
+    for key, values in measured.items():
+        if key not in reference:
+            continue
+        before = max(reference[key])
+        after = max(values)
+        if before > 0 and after < before * (1 - tolerance):
+            regressions.append((key, before, after))
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="denoizer-bench", description="Benchmark the DenoiZer merge and integrator engines on a synthetic EXR sequence (no RenderMan needed)")
+    parser.add_argument("--work-dir", help="Folder for the synthetic sequences (default: a temporary folder, removed afterwards)")
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--resolution", default="1920x1080", help="WIDTHxHEIGHT")
+    parser.add_argument("--light-groups", type=int, default=4, help="Light group AOVs (split between diffuse and specular)")
+    parser.add_argument("--extra-aovs", type=int, default=0, help="Additional RGB AOVs to raise the channel count")
+    parser.add_argument("--pixel-types", default="HALF", help="Comma-separated pixel types for the input files and outputs (HALF, FLOAT)")
+    parser.add_argument("--compressions", default="DWAB", help="Comma-separated compressions (DWAB, ZIP, PIZ...)")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Comma-separated engines: merge, integrator")
+    parser.add_argument("--backends", default="THREAD,PROCESS", help="Comma-separated backends: " + ", ".join(BACKENDS))
+    parser.add_argument("--workers", default="", help="Comma-separated worker counts (default: the engine's own choice)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per combination (the best is compared with the baseline)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Previous --json results to compare frames/s against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed frames/s loss against the baseline before failing (fraction)")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic sequences")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    pixel_types = [value.upper() for value in split_list(args.pixel_types)]
+    for pixel_type in pixel_types:
+        if pixel_type not in PIXEL_TYPES or pixel_type == "PRESERVE":
+            print(f"❌ Unsupported pixel type for synthetic files: {pixel_type}", file=sys.stderr)
+            return 2
+    backends = [value.upper() for value in split_list(args.backends)]
+    for backend in backends:
+        if backend not in BACKENDS:
+            print(f"❌ Unknown backend: {backend}", file=sys.stderr)
+            return 2
+    engines = split_list(args.engines)
+    for engine in engines:
+        if engine not in ENGINES:
+            print(f"❌ Unknown engine: {engine}", file=sys.stderr)
+            return 2
+    worker_counts = [int(value) for value in split_list(args.workers)] or [None]
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="denoizer_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    print(f"🧪 DenoiZer benchmark in {work_dir} (CPU: {multiprocessing.cpu_count()} cores, "
+          f"{psutil.virtual_memory().total / (1024 ** 3):.1f}GB RAM)", flush=True)
+    try:
+        results = run_benchmark(work_dir, args.frames, parse_resolution(args.resolution), args.light_groups, args.extra_aovs,
+                                pixel_types, [value.upper() for value in split_list(args.compressions)], engines, backends,
+                                worker_counts, max(1, args.repeat), args.seed, log_callback=lambda message: print(message, flush=True))
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+    failed = [case for case in results if "error" in case or case.get("failed")]
+    if failed:
+        print(f"❌ {len(failed)} benchmark cases failed", file=sys.stderr)
+        return 1
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for key, before, after in regressions:
+            print(f"⚠️ Regression {'/'.join(key)}: {before:.2f} -> {after:.2f} frames/s", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"✅ No regression beyond {args.tolerance * 100:.0f}% against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
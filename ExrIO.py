@@ -0,0 +1,288 @@
+import os
+import threading
+import OpenImageIO as oiio
+import numpy as np
+
+# Écart maximal (en canaux) entre deux plages pour qu'elles soient lues en une seule fois.
+# Chaque appel à read_image décompresse tous les blocs du fichier (DWAB/ZIP compressent
+# tous les canaux ensemble), donc lire quelques canaux inutiles coûte moins cher
+# qu'une décompression supplémentaire.
+RANGE_MERGE_GAP = 8
+
+# Nombre de plans de canaux gardés en mémoire par processus (une séquence n'en utilise
+# normalement qu'un seul; quelques-uns de plus si des frames ont un en-tête différent)
+CHANNEL_PLAN_CACHE_SIZE = 32
+
+# Hauteur des bandes écrites entre deux vérifications d'annulation. Les EXR sont écrits
+# en scanlines: 256 est un multiple de la hauteur des blocs de compression (256 lignes en
+# DWAB, 32 en DWAA/PIZ, 16 en ZIP), chaque bande ne contient donc que des blocs complets
+WRITE_BAND_ROWS = 256
+
+
+class FrameCancelled(Exception):
+    """Frame abandonnée par l'annulation de son pool (aucun fichier partiel n'est laissé)"""
+
+
+def check_cancelled(cancel_event, frame=""):
+    """Point de contrôle d'une frame: lève FrameCancelled si le pool a été annulé"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise FrameCancelled(f"{frame} cancelled")
+
+
+# Politiques de type de pixel pour les EXR écrits:
+#   FLOAT    - tous les canaux en float 32 bits (comportement historique)
+#   HALF     - half pour la beauty et les light groups, float pour les AOVs de données
+#   PRESERVE - chaque canal garde le type du fichier source
+PIXEL_TYPES = ["FLOAT", "HALF", "PRESERVE"]
+
+# AOVs de données qui perdent en précision en half (profondeur, position, IDs)
+FLOAT_PRECISION_AOVS = {"z", "depth", "zfiltered", "p", "pref", "pworld", "position", "worldposition", "id", "objectid"}
+
+
+def is_float_precision_channel(channel):
+    """Vrai si le canal doit rester en float en mode HALF (profondeur, position, cryptomatte, IDs)"""
+    base = channel.split('.')[0].lstrip('_').lower()
+    return base in FLOAT_PRECISION_AOVS or base.startswith("crypto")
+
+
+def channel_format(pixel_type, channel, source_format):
+    """Type de sortie d'un canal selon la politique de type de pixel"""
+    if pixel_type == "PRESERVE":
+        return source_format
+    if pixel_type == "HALF" and not is_float_precision_channel(channel):
+        return oiio.TypeHalf
+    return oiio.TypeFloat
+
+
+def buffer_dtype(channel_formats):
+    """dtype du buffer de la frame: half seulement si tous les canaux de sortie sont en half"""
+    if channel_formats and all(fmt == oiio.TypeHalf for fmt in channel_formats):
+        return np.float16
+    return np.float32
+
+
+def apply_channel_formats(spec, channel_formats):
+    """Appliquer des types par canal à une spécification de sortie"""
+    if not channel_formats:
+        return
+    spec.set_format(oiio.TypeHalf if buffer_dtype(channel_formats) == np.float16 else oiio.TypeFloat)
+    if len(set(str(fmt) for fmt in channel_formats)) > 1:
+        spec.channelformats = tuple(channel_formats)
+
+
+def write_pixels(path, spec, pixels, cancel_event=None):
+    """Écrire le buffer HxWxC tel quel avec ImageOutput (conversion par canal faite par OpenImageIO)
+
+    Le fichier est écrit à côté (<path>.tmp) puis renommé: une écriture interrompue ou en échec
+    ne laisse jamais de fichier partiel à `path`. Avec `cancel_event`, l'image est écrite par
+    bandes de WRITE_BAND_ROWS lignes et l'annulation est vérifiée entre deux bandes (FrameCancelled)."""
+    # Le format est choisi d'après le vrai nom, le fichier temporaire n'a pas l'extension .exr
+    out = oiio.ImageOutput.create(path)
+    if not out:
+        return False, oiio.geterror()
+    temp_path = f"{path}.tmp"
+    completed = False
+    try:
+        if not out.open(temp_path, spec):
+            return False, out.geterror()
+        if cancel_event is None:
+            if not out.write_image(pixels):
+                return False, out.geterror()
+        else:
+            height = spec.height
+            for ybegin in range(0, height, WRITE_BAND_ROWS):
+                check_cancelled(cancel_event, os.path.basename(path))
+                yend = min(ybegin + WRITE_BAND_ROWS, height)
+                if spec.tile_width:
+                    written = out.write_tiles(spec.x, spec.x + spec.width, spec.y + ybegin, spec.y + yend, 0, 1, pixels[ybegin:yend])
+                else:
+                    written = out.write_scanlines(spec.y + ybegin, spec.y + yend, 0, pixels[ybegin:yend])
+                if not written:
+                    return False, out.geterror()
+        completed = True
+    finally:
+        out.close()
+        if not completed:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+    try:
+        os.replace(temp_path, path)
+    except OSError as e:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False, str(e)
+    return True, ""
+
+
+def pixel_format_for(dtype):
+    """Type OpenImageIO correspondant au dtype numpy d'un buffer de sortie"""
+    return oiio.HALF if np.dtype(dtype) == np.float16 else oiio.FLOAT
+
+
+def select_channel_indices(channelnames, channels_to_extract, exclude=()):
+    """Indices des canaux dont le nom complet ou le nom de base (avant le '.') est demandé"""
+    wanted = set(channels_to_extract)
+    indices = []
+    for idx, ch in enumerate(channelnames):
+        if ch in exclude:
+            continue
+        if ch in wanted or ch.split('.')[0] in wanted:
+            indices.append(idx)
+    return indices
+
+
+def channel_ranges(indices, max_gap=RANGE_MERGE_GAP):
+    """Regrouper des indices de canaux en plages [début, fin) à lire en un seul appel"""
+    ranges = []
+    for idx in sorted(indices):
+        if ranges and idx - ranges[-1][1] <= max_gap:
+            ranges[-1][1] = idx + 1
+        else:
+            ranges.append([idx, idx + 1])
+    return [(begin, end) for begin, end in ranges]
+
+
+class ExrSource:
+    """Fichier EXR ouvert une seule fois: l'en-tête est lu à l'ouverture, les pixels
+    sont décodés uniquement pour les plages de canaux demandées"""
+
+    def __init__(self, path):
+        self.path = path
+        self.input = oiio.ImageInput.open(path)
+        if not self.input:
+            raise IOError(f"Error reading file {path}: {oiio.geterror()}")
+        self.spec = self.input.spec()
+        self.size = (self.spec.width, self.spec.height)
+        self.channelnames = tuple(self.spec.channelnames)
+        # Type de chaque canal dans le fichier (channelformats est vide si tous ont le même type)
+        self.channel_formats = tuple(self.spec.channelformats) or (self.spec.format,) * len(self.channelnames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.input:
+            self.input.close()
+            self.input = None
+
+    def read_range(self, chbegin, chend, pixel_format=oiio.FLOAT):
+        """Décoder les canaux [chbegin, chend) et retourner un tableau HxWxN"""
+        pixels = self.input.read_image(0, 0, chbegin, chend, pixel_format)
+        if pixels is None:
+            raise IOError(f"Error reading channels {chbegin}-{chend} of {self.path}: {self.input.geterror()}")
+        return pixels
+
+    def read_into(self, indices, out, slots):
+        """Décoder les canaux `indices` directement dans out[:, :, slots]
+
+        `indices` et `slots` sont parallèles: le canal indices[i] du fichier va dans
+        la tranche slots[i] du tableau de sortie. Retourne le nombre d'octets décodés."""
+        return self.read_into_many([(indices, out, slots)])
+
+    def read_into_many(self, targets, cancel_event=None):
+        """Décoder une seule fois les canaux de plusieurs sorties: `targets` est une liste de
+        (indices, out, slots). Un canal demandé par deux sorties n'est décodé qu'une fois.
+        Avec `cancel_event`, l'annulation est vérifiée avant chaque plage (FrameCancelled)."""
+        targets = [(dict(zip(indices, slots)), out) for indices, out, slots in targets if len(indices)]
+        if not targets:
+            return 0
+        # Décoder en half seulement si toutes les sorties sont en half
+        dtype = np.float16 if all(out.dtype == np.float16 for _, out in targets) else np.float32
+        wanted = set()
+        for slot_of, _ in targets:
+            wanted.update(slot_of)
+        bytes_read = 0
+        for begin, end in channel_ranges(wanted):
+            check_cancelled(cancel_event, os.path.basename(self.path))
+            pixels = self.read_range(begin, end, pixel_format_for(dtype))
+            bytes_read += pixels.nbytes
+            for slot_of, out in targets:
+                src = [i - begin for i in range(begin, end) if i in slot_of]
+                if not src:
+                    continue
+                dst = [slot_of[i + begin] for i in src]
+                if dst == list(range(dst[0], dst[0] + len(dst))) and src == list(range(src[0], src[0] + len(src))):
+                    # Plage contiguë des deux côtés: une seule copie par tranche
+                    out[:, :, dst[0]:dst[0] + len(dst)] = pixels[:, :, src[0]:src[0] + len(src)]
+                else:
+                    out[:, :, dst] = pixels[:, :, src]
+        return bytes_read
+
+
+def open_source(path):
+    """Ouvrir un fichier EXR s'il existe, sinon retourner None"""
+    if not os.path.exists(path):
+        return None
+    return ExrSource(path)
+
+
+def header_fingerprint(source):
+    """Empreinte de l'en-tête d'une source: deux frames de même empreinte ont la même disposition de canaux"""
+    return (source.size, source.channelnames, tuple(str(fmt) for fmt in source.channel_formats))
+
+
+class ChannelPlan:
+    """Disposition des canaux de sortie d'une frame, calculée une fois par séquence
+
+    `reads[i]` donne, pour la i-ème source de la frame, les indices des canaux à décoder et
+    les tranches de destination dans le buffer de sortie. `messages` sont les logs produits
+    lors du calcul du plan ("{frame}" est remplacé par le nom de la frame à chaque réutilisation)."""
+
+    def __init__(self, channels, formats, reads, messages=()):
+        self.channels = tuple(channels)
+        self.formats = tuple(formats)
+        self.dtype = buffer_dtype(self.formats)
+        self.reads = tuple(reads)
+        self.messages = tuple(messages)
+
+    @classmethod
+    def from_layout(cls, layout, sources, pixel_type, messages=()):
+        """Construire le plan depuis {canal: (position de la source, index du canal)}, dans l'ordre d'écriture"""
+        formats = [channel_format(pixel_type, ch, sources[pos].channel_formats[idx]) for ch, (pos, idx) in layout.items()]
+        reads = []
+        for pos in range(len(sources)):
+            owned = [(idx, slot) for slot, (owner, idx) in enumerate(layout.values()) if owner == pos]
+            reads.append((tuple(i for i, _ in owned), tuple(slot for _, slot in owned)))
+        return cls(layout.keys(), formats, reads, messages)
+
+    def frame_messages(self, frame):
+        return [msg.replace("{frame}", frame) for msg in self.messages]
+
+    def allocate(self, size):
+        """Buffer HxWxC non initialisé pour une frame de taille (largeur, hauteur)"""
+        width, height = size
+        return np.empty((height, width, len(self.channels)), dtype=self.dtype)
+
+    def read(self, sources, pixels, cancel_event=None):
+        """Décoder chaque source une seule fois, directement dans le buffer de la frame"""
+        bytes_read = 0
+        for source, (indices, slots) in zip(sources, self.reads):
+            if indices:
+                bytes_read += source.read_into_many([(indices, pixels, slots)], cancel_event)
+        return bytes_read
+
+
+_channel_plans = {}
+_channel_plans_lock = threading.Lock()
+
+
+def cached_channel_plan(key, build):
+    """Plan de canaux pour `key` (empreintes des en-têtes + options), calculé par `build()` au premier appel
+
+    Les frames d'une séquence partagent le même en-tête: le plan n'est calculé qu'une fois.
+    Une frame dont l'en-tête diffère a une autre clé et obtient son propre plan."""
+    plan = _channel_plans.get(key)
+    if plan is None:
+        plan = build()
+        with _channel_plans_lock:
+            if len(_channel_plans) >= CHANNEL_PLAN_CACHE_SIZE:
+                _channel_plans.pop(next(iter(_channel_plans)))
+            _channel_plans[key] = plan
+    return plan
@@ -3,36 +3,13 @@ import os
 # import OpenEXR
 # import Imath
 import OpenImageIO as oiio
-import concurrent.futures
-from functools import partial
-import multiprocessing
 import time
 import psutil
-
-def get_optimal_thread_count():
-    """Déterminer le nombre optimal de threads pour le système actuel avec optimisations"""
-    cpu_count = multiprocessing.cpu_count()
-    physical_cores = psutil.cpu_count(logical=False)
-    if not physical_cores:
-        physical_cores = max(1, cpu_count // 2)
-    
-    # Obtenir la mémoire disponible pour ajuster le nombre de threads
-    try:
-        memory_gb = psutil.virtual_memory().available / (1024**3)
-        # Limiter les threads si la mémoire est faible (moins de 8GB disponibles)
-        if memory_gb < 8:
-            max_threads_by_memory = max(2, int(memory_gb / 2))  # 1 thread par 2GB
-        else:
-            max_threads_by_memory = physical_cores * 3
-    except:
-        max_threads_by_memory = physical_cores * 2
-    
-    # Pour les opérations I/O bound comme la fusion EXR, plus de threads peut aider
-    # mais on limite selon la mémoire disponible
-    optimal_threads = min(physical_cores * 3, cpu_count, max_threads_by_memory)
-    
-    # Minimum de 2 threads, maximum de 16 pour éviter la surcharge
-    return max(2, min(optimal_threads, 16))
+import numpy as np
+from FramePool import FrameScheduler, FrameEvent, FrameCancelled, STOP_POLL_INTERVAL, check_cancelled, file_size, format_frame_list
+from Integrator_Denoizer import integrator_plan, write_integrator_frame
+from ExrIO import (ExrSource, open_source, select_channel_indices, buffer_dtype, apply_channel_formats,
+                   write_pixels, header_fingerprint, ChannelPlan, cached_channel_plan)
 
 def set_high_priority():
     """Increase process priority to maximize CPU usage"""
@@ -84,94 +61,56 @@ def get_compression_settings(compression_mode, compression_level=None):
     return compression, compression_level
 
 def extract_channels(input_exr, channels_to_extract):
-    """Extraction optimisée des canaux d'un fichier EXR avec OpenImageIO et optimisations de performance"""
+    """Extraction optimisée des canaux d'un fichier EXR: une seule ouverture, décodage des seules plages de canaux demandées"""
     try:
-        # Ouvrir le fichier EXR avec optimisations
-        buf = oiio.ImageBuf(input_exr)
-        if buf.has_error:
-            print(f"Error reading file {input_exr}: {buf.geterror()}")
-            return {}, (0, 0)
-            
-        spec = buf.spec()
-        width, height = spec.width, spec.height
-        size = (width, height)
-        channels = spec.channelnames
-        
-        data = {}
-        import numpy as np
-        
-        # Optimisation: créer une liste des indices de canaux à extraire en une seule passe
-        channels_to_extract_indices = []
-        channels_to_extract_names = []
-        
-        for ch in channels:
-            base = ch.split('.')[0]
-            if base in channels_to_extract or ch in channels_to_extract:
-                try:
-                    ch_idx = channels.index(ch)
-                    channels_to_extract_indices.append(ch_idx)
-                    channels_to_extract_names.append(ch)
-                except ValueError:
-                    continue
-        
-        # Extraire tous les canaux demandés en une seule opération si possible
-        if channels_to_extract_indices:
-            try:
-                # Optimisation: extraire plusieurs canaux en une seule opération
-                if len(channels_to_extract_indices) > 1:
-                    # Extraire tous les canaux d'un coup
-                    multi_channel_buf = oiio.ImageBufAlgo.channels(buf, tuple(channels_to_extract_indices))
-                    if multi_channel_buf and not multi_channel_buf.has_error:
-                        # Obtenir toutes les données de pixels en une fois
-                        all_pixels = multi_channel_buf.get_pixels(oiio.FLOAT)
-                        if all_pixels is not None:
-                            # Séparer les canaux
-                            for i, ch_name in enumerate(channels_to_extract_names):
-                                if all_pixels.ndim == 3 and all_pixels.shape[2] > i:
-                                    # Extraire le canal spécifique et s'assurer qu'il est contiguë
-                                    channel_data = np.ascontiguousarray(all_pixels[:, :, i])
-                                    data[ch_name] = channel_data
-                else:
-                    # Un seul canal à extraire
-                    ch_idx = channels_to_extract_indices[0]
-                    ch_name = channels_to_extract_names[0]
-                    channel_buf = oiio.ImageBufAlgo.channels(buf, (ch_idx,))
-                    if channel_buf and not channel_buf.has_error:
-                        pixels = channel_buf.get_pixels(oiio.FLOAT)
-                        if pixels is not None:
-                            # S'assurer que les données sont contiguës pour de meilleures performances
-                            if isinstance(pixels, np.ndarray) and not pixels.flags['C_CONTIGUOUS']:
-                                pixels = np.ascontiguousarray(pixels)
-                            data[ch_name] = pixels
-                            
-            except Exception as e:
-                # Fallback: extraire canal par canal si l'extraction groupée échoue
-                print(f"Group extraction failed for {input_exr}, falling back to individual extraction: {e}")
-                for ch_idx, ch_name in zip(channels_to_extract_indices, channels_to_extract_names):
-                    try:
-                        channel_buf = oiio.ImageBufAlgo.channels(buf, (ch_idx,))
-                        if channel_buf and not channel_buf.has_error:
-                            pixels = channel_buf.get_pixels(oiio.FLOAT)
-                            if pixels is not None:
-                                # S'assurer que les données sont contiguës
-                                if isinstance(pixels, np.ndarray) and not pixels.flags['C_CONTIGUOUS']:
-                                    pixels = np.ascontiguousarray(pixels)
-                                data[ch_name] = pixels
-                    except Exception as e2:
-                        print(f"Error extracting channel {ch_name}: {e2}")
-        
-        return data, size
-        
+        with ExrSource(input_exr) as source:
+            # Indices des canaux calculés une seule fois pour toutes les frames de même en-tête
+            plan_key = ("extract", header_fingerprint(source), tuple(channels_to_extract))
+            plan = cached_channel_plan(plan_key, lambda: ChannelPlan.from_layout(
+                {source.channelnames[idx]: (0, idx) for idx in select_channel_indices(source.channelnames, channels_to_extract)},
+                [source], "FLOAT"))
+            if not plan.channels:
+                return {}, source.size
+            pixels = plan.allocate(source.size)
+            plan.read([source], pixels)
+            # Les canaux retournés sont des vues sur un seul tableau, sans copie supplémentaire
+            data = {ch: pixels[:, :, slot] for slot, ch in enumerate(plan.channels)}
+            return data, source.size
     except Exception as e:
         print(f"Error processing file {input_exr}: {e}")
         return {}, (0, 0)
 
-def write_exr(path, header_channels, pixel_data, size, compression_mode="DWAB", compression_level=45.0):
-    """Écriture optimisée d'un fichier EXR avec OpenImageIO et optimisations de performance"""
+def assemble_channels(header_channels, pixel_data, size, dtype=np.float32):
+    """Regrouper un dictionnaire canal -> tableau 2D dans un seul buffer HxWxC préalloué (canaux manquants à zéro)"""
+    pixels = np.zeros((size[1], size[0], len(header_channels)), dtype=dtype)
+    for slot, ch in enumerate(header_channels):
+        if ch in pixel_data:
+            channel_data = pixel_data[ch]
+            # Si les données ont une dimension supplémentaire, la supprimer
+            if channel_data.ndim == 3 and channel_data.shape[2] == 1:
+                channel_data = channel_data[:, :, 0]
+            pixels[:, :, slot] = channel_data
+    return pixels
+
+def write_exr(path, header_channels, pixel_data, size, compression_mode="DWAB", compression_level=45.0, channel_formats=None, cancel_event=None):
+    """Écriture optimisée d'un fichier EXR avec OpenImageIO
+
+    `pixel_data` est de préférence le buffer HxWxC de la frame, déjà dans l'ordre de
+    `header_channels`: il est alors écrit tel quel, sans copie. Un dictionnaire
+    canal -> tableau 2D reste accepté et est regroupé une seule fois.
+    `channel_formats` donne le type de chaque canal dans le fichier (float par défaut).
+    `cancel_event` interrompt l'écriture entre deux bandes (FrameCancelled, pas de fichier partiel)."""
     try:
+        header_channels = list(header_channels)
+        if not isinstance(pixel_data, np.ndarray):
+            pixel_data = assemble_channels(header_channels, pixel_data, size, buffer_dtype(channel_formats))
+        elif not pixel_data.flags['C_CONTIGUOUS']:
+            pixel_data = np.ascontiguousarray(pixel_data)
+
         # Créer une nouvelle spécification d'image
         spec = oiio.ImageSpec(size[0], size[1], len(header_channels), oiio.FLOAT)
-        spec.channelnames = list(header_channels)
+        spec.channelnames = header_channels
+        apply_channel_formats(spec, channel_formats)
         
         # Configurer la compression avec optimisations
         compression_map = {
@@ -189,175 +128,209 @@ def write_exr(path, header_channels, pixel_data, size, compression_mode="DWAB",
         if compression_level is not None and compression in ["dwaa", "dwab"]:
             spec.attribute("compressionlevel", int(compression_level))
         
-        # Optimisations de performance
-        spec.tile_width = 64
-        spec.tile_height = 64
+        # Sortie en scanlines (comme l'ancien ImageBuf.write): pas d'attributs de tuiles
         spec.attribute("oiio:UnassociatedAlpha", 1)
         
         # Optimisations supplémentaires pour la vitesse d'écriture
         spec.attribute("oiio:ColorSpace", "Linear")
         spec.attribute("openexr:lineOrder", "increasingY")
         
-        # Créer le buffer d'image
-        buf = oiio.ImageBuf(spec)
-        
-        # Organiser les données des pixels dans l'ordre des canaux avec optimisations
-        all_pixels = []
-        import numpy as np
-        
-        for ch in spec.channelnames:
-            if ch in pixel_data:
-                channel_data = pixel_data[ch]
-                # Vérifier et corriger la forme des données avec optimisations
-                if isinstance(channel_data, np.ndarray):
-                    # Optimisation: s'assurer que les données sont en float32 pour de meilleures performances
-                    if channel_data.dtype != np.float32:
-                        channel_data = channel_data.astype(np.float32)
-                    
-                    # Si les données ont une dimension supplémentaire, la supprimer
-                    if channel_data.ndim == 4 and channel_data.shape[2] == 1:
-                        channel_data = channel_data.squeeze(axis=2)
-                    elif channel_data.ndim == 3 and channel_data.shape[2] == 1:
-                        channel_data = channel_data.squeeze(axis=2)
-                    
-                    # S'assurer que les données sont contiguës en mémoire pour de meilleures performances
-                    if not channel_data.flags['C_CONTIGUOUS']:
-                        channel_data = np.ascontiguousarray(channel_data)
-                        
-                all_pixels.append(channel_data)
-            else:
-                # Créer un canal vide si manquant (optimisé)
-                empty_channel = np.zeros((size[1], size[0]), dtype=np.float32, order='C')
-                all_pixels.append(empty_channel)
-
-        # Combiner tous les canaux en un seul tableau avec optimisations
-        if all_pixels:
-            # Empiler les canaux le long de la dimension des canaux
-            combined_pixels = np.stack(all_pixels, axis=-1)
-            
-            # S'assurer que le tableau final est contiguë pour de meilleures performances d'écriture
-            if not combined_pixels.flags['C_CONTIGUOUS']:
-                combined_pixels = np.ascontiguousarray(combined_pixels)
-            
-            buf.set_pixels(oiio.ROI(), combined_pixels)
-    
-        # Écrire le fichier avec gestion d'erreur améliorée
-        success = buf.write(path)
+        # Écrire directement le buffer de la frame, sans passer par un ImageBuf intermédiaire
+        success, error_msg = write_pixels(path, spec, pixel_data, cancel_event)
         if not success:
-            error_msg = buf.geterror()
             print(f"Error writing EXR file {path}: {error_msg}")
             return False
             
         return success
+    except FrameCancelled:
+        raise
     except Exception as e:
         print(f"Error writing EXR file {path}: {e}")
         return False
 
-def process_single_frame(frame, input_folder, denoised_folder, final_output_dir, selected_aovs, compression_mode, compression_level=None, log_callback=None, shadow_mode=False, shadow_aovs=None):
-    """Traitement optimisé d'une seule image"""
+def build_merge_plan(roles, sources, selected_aovs, shadow_mode=False, shadow_aovs=None, pixel_type="FLOAT"):
+    """Calculer la disposition des canaux de la BEAUTY à partir des en-têtes des sources d'une frame
+
+    `roles` donne le rôle de chaque source ("main", "aux-…", "input"). Un canal d'une source plus
+    tardive remplace celui d'une source précédente sans changer sa position; le fichier d'entrée
+    ne fournit que les canaux encore manquants."""
+    messages = []
+
+    def log_denoised_channel(ch, origin):
+        # Ajouter des logs spécifiques pour des AOVs importantes
+        if ch in ("rgb", "Ci", "diffuse", "specular"):
+            messages.append(f"✅ Denoised '{ch}' extracted from {origin}")
+        elif shadow_mode and ch in shadow_aovs:
+            messages.append(f"✅ Denoised shadow AOV '{ch}' extracted from {origin}")
+
+    # Canal de sortie -> (position de la source, index du canal dans ce fichier), dans l'ordre d'écriture
+    layout = {}
+    for pos, (role, source) in enumerate(zip(roles, sources)):
+        if role == "main":
+            # En mode shadow, ne chercher que l'alpha et les AOVs des ombres
+            if shadow_mode:
+                channels_to_extract = ["a", "A"] + (shadow_aovs if shadow_aovs else [])
+            else:
+                # Mode normal: chercher RGBA + diffuse, specular, rgb et Ci
+                channels_to_extract = ["R", "G", "B", "A", "diffuse", "specular", "rgb", "Ci"]
+
+            for idx in select_channel_indices(source.channelnames, channels_to_extract):
+                ch = source.channelnames[idx]
+                layout[ch] = (pos, idx)
+                log_denoised_channel(ch, "main denoised file")
+            messages.append(f"✅ RGBA channels extracted from main denoised file")
+
+        elif role == "input":
+            if shadow_mode:
+                # En mode shadow, chercher uniquement l'alpha et les AOVs des ombres si pas encore trouvés
+                missing_aovs = []
+                if "a" not in layout and "A" not in layout:
+                    missing_aovs.append("a")
+                    missing_aovs.append("A")
+                if shadow_aovs:
+                    for shadow_aov in shadow_aovs:
+                        if shadow_aov not in layout:
+                            missing_aovs.append(shadow_aov)
+            else:
+                # Mode normal: extraire les AOVs manquants, mais pas Ci ni rgb qui doivent venir des fichiers dénoisés
+                missing_aovs = [aov for aov in selected_aovs if aov not in layout and aov != "Ci" and aov != "rgb"]
+
+            if missing_aovs:
+                for idx in select_channel_indices(source.channelnames, missing_aovs, exclude=layout):
+                    channel = source.channelnames[idx]
+                    layout[channel] = (pos, idx)
+                    messages.append(f"✅ {channel} extracted from input file (not denoised)")
+
+        else:
+            # En mode shadow, ne chercher que les AOVs des ombres
+            if shadow_mode:
+                aovs_to_extract = shadow_aovs if shadow_aovs else []
+            else:
+                # Mode normal: créer une liste des AOVs à extraire, en excluant celles déjà trouvées
+                aovs_to_extract = [aov for aov in selected_aovs if aov not in layout]
+
+            if aovs_to_extract:
+                for idx in select_channel_indices(source.channelnames, aovs_to_extract):
+                    ch = source.channelnames[idx]
+                    layout[ch] = (pos, idx)
+                    log_denoised_channel(ch, role)
+                messages.append(f"✅ Additional AOVs extracted from {role}")
+
+    return ChannelPlan.from_layout(layout, sources, pixel_type, messages)
+
+def process_single_frame(frame, input_folder, denoised_folder, final_output_dir, selected_aovs, compression_mode, compression_level=None, log_callback=None, shadow_mode=False, shadow_aovs=None, pixel_type="FLOAT", integrator_dir=None, selected_integrators=None, cancel_event=None):
+    """Traitement optimisé d'une seule image: chaque fichier source est ouvert et décodé une seule fois
+
+    Avec `integrator_dir`, la frame INTEGRATOR est écrite dans la même passe: le fichier
+    d'entrée est décodé une seule fois pour les deux sorties.
+    `cancel_event` est vérifié avant chaque lecture de source, avant la compression et pendant
+    l'écriture: la frame est alors abandonnée par FrameCancelled, sans fichier partiel.
+    Retourne (succès, messages, statistiques: octets lus/écrits et durées par étape)."""
     messages = []
     result = False
     start_time = time.time()
+    stats = {"bytes_read": 0, "bytes_written": 0, "timings": {}, "started": start_time}
+    timings = stats["timings"]
     
     def local_log(msg):
         if log_callback:
             log_callback(msg)
         messages.append(msg)
 
-    final_channels = {}
-    size = None
+    # Sources de la frame dans l'ordre de priorité, avec leur rôle (fait partie de la clé du plan)
+    sources = []
+    roles = []
 
     # Liste des dossiers auxiliaires à traiter
     aux_folders = ["aux-albedo", "aux-diffuse", "aux-specular", "aux-subsurface"]
     
-    # 1. Traiter d'abord le fichier principal (RGBA, Ci, rgb, etc.)
-    main_exr_path = os.path.join(denoised_folder, frame)
-    if os.path.exists(main_exr_path):
-        # En mode shadow, ne chercher que l'alpha et les AOVs des ombres
-        if shadow_mode:
-            # Inclure l'alpha et les AOVs d'ombres spécifiées
-            channels_to_extract = ["a", "A"] + (shadow_aovs if shadow_aovs else [])
-            main_data, size = extract_channels(main_exr_path, channels_to_extract)
+    try:
+        # 1. Ouvrir d'abord le fichier principal (RGBA, Ci, rgb, etc.)
+        main_exr_path = os.path.join(denoised_folder, frame)
+        main_source = open_source(main_exr_path)
+        if main_source is None:
+            local_log(f"⚠️ Main file missing: {main_exr_path}")
+            return result, messages, stats
+        sources.append(main_source)
+        roles.append("main")
+        size = main_source.size
+
+        # 2. Ouvrir les fichiers auxiliaires (albedo, diffuse, specular)
+        for aux_folder in aux_folders:
+            aux_path = os.path.join(denoised_folder, aux_folder, frame)
+            try:
+                aux_source = open_source(aux_path)
+            except IOError as e:
+                local_log(f"⚠️ {e}")
+                continue
+            if aux_source is None:
+                local_log(f"⚠️ Missing file in {aux_folder}: {aux_path}")
+                continue
+            sources.append(aux_source)
+            roles.append(aux_folder)
+
+        # 3. Ouvrir le fichier d'entrée pour les AOVs manquants
+        input_exr_path = os.path.join(input_folder, frame)
+        try:
+            input_source = open_source(input_exr_path)
+        except IOError as e:
+            local_log(f"⚠️ {e}")
+            input_source = None
+        if input_source is not None:
+            sources.append(input_source)
+            roles.append("input")
         else:
-            # Mode normal: chercher RGBA + diffuse, specular, rgb et Ci
-            main_data, size = extract_channels(main_exr_path, ["R", "G", "B", "A", "diffuse", "specular", "rgb", "Ci"])
-        
-        # Ajouter les canaux trouvés au dictionnaire final
-        for ch, data in main_data.items():
-            final_channels[ch] = data
-            
-            # Ajouter des logs spécifiques pour des AOVs importantes
-            if ch == "rgb":
-                local_log(f"✅ Denoised 'rgb' extracted from main denoised file")
-            elif ch == "Ci":
-                local_log(f"✅ Denoised 'Ci' extracted from main denoised file")
-            elif ch == "diffuse":
-                local_log(f"✅ Denoised 'diffuse' extracted from main denoised file")
-            elif ch == "specular":
-                local_log(f"✅ Denoised 'specular' extracted from main denoised file")
-            elif shadow_mode and ch in shadow_aovs:
-                local_log(f"✅ Denoised shadow AOV '{ch}' extracted from main denoised file")
-                
-        local_log(f"✅ RGBA channels extracted from main denoised file")
-    else:
-        local_log(f"⚠️ Main file missing: {main_exr_path}")
-        return result, messages
+            local_log(f"⚠️ Input file missing for additional AOVs: {input_exr_path}")
 
-    # 2. Traiter les fichiers auxiliaires (albedo, diffuse, specular)
-    for aux_folder in aux_folders:
-        aux_path = os.path.join(denoised_folder, aux_folder, frame)
-        if os.path.exists(aux_path):
-            # En mode shadow, ne chercher que les AOVs des ombres
-            if shadow_mode:
-                aovs_to_extract = shadow_aovs if shadow_mode else []
+        timings["open"] = time.time() - start_time
+        plan_start = time.time()
+
+        # 4. Plan de canaux: calculé sur la première frame, réutilisé tant que les en-têtes sont identiques
+        plan_key = ("merge", tuple((role, header_fingerprint(source)) for role, source in zip(roles, sources)),
+                    tuple(selected_aovs), shadow_mode, tuple(shadow_aovs or ()), pixel_type)
+        plan = cached_channel_plan(plan_key, lambda: build_merge_plan(roles, sources, selected_aovs, shadow_mode, shadow_aovs, pixel_type))
+        for msg in plan.frame_messages(frame):
+            local_log(msg)
+
+        # 5. Décoder chaque source une seule fois, directement dans le buffer de la frame,
+        # avec le type de pixel retenu pour chaque canal de sortie
+        pixels = plan.allocate(size)
+        integrator_pixels = None
+        if integrator_dir:
+            if input_source is not None:
+                integrator = integrator_plan(input_source, selected_integrators, pixel_type)
+                for msg in integrator.frame_messages(frame):
+                    local_log(msg)
+                if integrator.channels:
+                    integrator_pixels = integrator.allocate(input_source.size)
+                else:
+                    local_log(f"⚠️ Aucun canal valide trouvé pour {frame}")
             else:
-                # Mode normal: créer une liste des AOVs à extraire, en excluant celles déjà trouvées
-                aovs_to_extract = [aov for aov in selected_aovs if aov not in final_channels]
-                
-            if aovs_to_extract:
-                aux_data, _ = extract_channels(aux_path, aovs_to_extract)
-                for ch, data in aux_data.items():
-                    final_channels[ch] = data
-                    if ch == "rgb":
-                        local_log(f"✅ Denoised 'rgb' extracted from {aux_folder}")
-                    elif ch == "Ci":
-                        local_log(f"✅ Denoised 'Ci' extracted from {aux_folder}")
-                    elif ch == "diffuse":
-                        local_log(f"✅ Denoised 'diffuse' extracted from {aux_folder}")
-                    elif ch == "specular":
-                        local_log(f"✅ Denoised 'specular' extracted from {aux_folder}")
-                    elif shadow_mode and ch in shadow_aovs:
-                        local_log(f"✅ Denoised shadow AOV '{ch}' extracted from {aux_folder}")
-                    
-                local_log(f"✅ Additional AOVs extracted from {aux_folder}")
-        else:
-            local_log(f"⚠️ Missing file in {aux_folder}: {aux_path}")
+                local_log(f"⚠️ Integrator skipped for {frame}: input file missing")
 
-    # 3. Obtenir les AOVs manquants du fichier d'entrée
-    input_exr_path = os.path.join(input_folder, frame)
-    if os.path.exists(input_exr_path):
-        if shadow_mode:
-            # En mode shadow, chercher uniquement l'alpha et les AOVs des ombres si pas encore trouvés
-            missing_aovs = []
-            if "a" not in final_channels and "A" not in final_channels:
-                missing_aovs.append("a")
-                missing_aovs.append("A")
-            if shadow_aovs:
-                for shadow_aov in shadow_aovs:
-                    if shadow_aov not in final_channels:
-                        missing_aovs.append(shadow_aov)
-        else:
-            # Mode normal: extraire les AOVs manquants, mais pas Ci ni rgb qui doivent venir des fichiers dénoisés
-            missing_aovs = [aov for aov in selected_aovs if aov not in final_channels and aov != "Ci" and aov != "rgb"]
-            
-        if missing_aovs:
-            input_data, _ = extract_channels(input_exr_path, missing_aovs)
-            for channel, data in input_data.items():
-                if channel not in final_channels:
-                    final_channels[channel] = data
-                    local_log(f"✅ {channel} extracted from input file (not denoised)")
-    else:
-        local_log(f"⚠️ Input file missing for additional AOVs: {input_exr_path}")
+        timings["plan"] = time.time() - plan_start
+
+        for role, source, (indices, slots) in zip(roles, sources, plan.reads):
+            check_cancelled(cancel_event, frame)
+            decode_start = time.time()
+            targets = [(indices, pixels, slots)]
+            if source is input_source and integrator_pixels is not None:
+                # Passe combinée: canaux BEAUTY manquants et canaux INTEGRATOR décodés ensemble
+                integrator_indices, integrator_slots = integrator.reads[0]
+                targets.append((integrator_indices, integrator_pixels, integrator_slots))
+            source.read_into_many(targets, cancel_event)
+            timings[f"decode:{role}"] = time.time() - decode_start
+    except FrameCancelled:
+        raise
+    except Exception as e:
+        local_log(f"❌ Failed to read source files for {frame}: {e}")
+        return result, messages, stats
+    finally:
+        for source in sources:
+            stats["bytes_read"] += file_size(source.path)
+            source.close()
+        timings["read"] = time.time() - start_time
+    write_start = time.time()
 
     # Écrire le fichier EXR final avec optimisations
     output_path = os.path.join(final_output_dir, frame)
@@ -365,7 +338,10 @@ def process_single_frame(frame, input_folder, denoised_folder, final_output_dir,
     # Optimiser la compression avant l'écriture
     optimized_compression, optimized_level = get_compression_settings(compression_mode, compression_level)
     
-    if write_exr(output_path, final_channels.keys(), final_channels, size, optimized_compression.upper(), optimized_level):
+    check_cancelled(cancel_event, frame)
+    written = write_exr(output_path, plan.channels, pixels, size, optimized_compression.upper(), optimized_level, plan.formats, cancel_event)
+    timings["write:beauty"] = time.time() - write_start
+    if written:
         result = True
         elapsed_time = time.time() - start_time
         
@@ -378,162 +354,346 @@ def process_single_frame(frame, input_folder, denoised_folder, final_output_dir,
     else:
         local_log(f"❌ Failed to write merged file: {output_path}")
 
-    return result, messages
+    # Passe combinée: la frame ne réussit que si la BEAUTY et l'INTEGRATOR sont écrits
+    if integrator_dir:
+        if integrator_pixels is None:
+            result = False
+        else:
+            check_cancelled(cancel_event, frame)
+            integrator_start = time.time()
+            success, integrator_path = write_integrator_frame(frame, integrator_dir, integrator, integrator_pixels, compression_mode, compression_level, cancel_event)
+            timings["write:integrator"] = time.time() - integrator_start
+            if success:
+                local_log(f"✅ Integrator généré : {integrator_path}")
+                stats["bytes_written"] += file_size(integrator_path)
+            else:
+                local_log(f"❌ Erreur lors de l'écriture: {integrator_path}")
+                result = False
 
-def merge_final_exrs(output_folder, frame_list, input_folder, selected_aovs, compression_mode, compression_level=None, log_callback=None, progress_callback=None, temp_folder=None, shadow_mode=False, shadow_aovs=None, stop_check=None, use_gpu=False):
-    """Fusionner les AOVs dénoisés avec les AOVs originaux, avec optimisations de performance"""
-    # Optimisations de performance au démarrage
-    priority_set = set_high_priority()
-    memory_optimized = optimize_memory_usage()
-    
-    # Optimiser les paramètres de compression
-    compression, compression_level = get_compression_settings(compression_mode, compression_level)
-    
-    # Configuration GPU si activée
-    gpu_acceleration = False
-    if use_gpu:
-        try:
-            # Configurer OpenImageIO pour utiliser le GPU si possible
-            oiio.attribute("gpu", 1)
-            oiio.attribute("use_gpu", True)
-            gpu_acceleration = True
-            if log_callback:
-                log_callback("🚀 GPU acceleration enabled for image processing")
-        except Exception as e:
-            if log_callback:
-                log_callback(f"⚠️ GPU acceleration requested but failed to initialize: {str(e)}")
-                log_callback("ℹ️ Falling back to CPU processing")
-    
-    if log_callback:
-        log_callback("🔄 Starting optimized merge process...")
+    stats["bytes_written"] += file_size(output_path)
+    timings["write"] = time.time() - write_start
+    timings["total"] = time.time() - start_time
+    return result, messages, stats
+
+class MergeSession:
+    """Session de fusion alimentée au fil de l'eau
+
+    Les frames sont soumises dès que leurs fichiers dénoisés sont prêts (ou toutes d'un coup),
+    fusionnées par un pool unique, et les résultats sont traités par `poll()` depuis le thread
+    appelant: la fusion peut ainsi avancer pendant que denoise_batch tourne encore."""
+
+    def __init__(self, output_folder, input_folder, selected_aovs, compression_mode, total_frames, compression_level=None, log_callback=None, progress_callback=None, temp_folder=None, shadow_mode=False, shadow_aovs=None, stop_check=None, use_gpu=False, pixel_type="FLOAT", backend="AUTO", workers=None, integrator_dir=None, selected_integrators=None, event_callback=None, pause_gate=None):
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+        # event_callback(FrameEvent): appelé pour chaque frame terminée (progression, temps restant, manifeste)
+        self.event_callback = event_callback
+        self.stop_check = stop_check
+        self.total_frames = total_frames
+        self.total_success = 0
+        self.frames_processed = 0
+        self.submitted = set()
+        # Bilan exact d'un arrêt: frames écrites, frames interrompues en cours de traitement
+        self.completed_frames = []
+        self.cancelled_frames = []
+        self.stopped = False
+        self.progress_step = max(1, total_frames // 10)  # Limiter les logs de progression
+
+        # Optimisations de performance au démarrage
+        priority_set = set_high_priority()
+        memory_optimized = optimize_memory_usage()
+
+        # Optimiser les paramètres de compression
+        compression, compression_level = get_compression_settings(compression_mode, compression_level)
+
+        # Configuration GPU si activée
+        gpu_acceleration = False
+        if use_gpu:
+            try:
+                # Configurer OpenImageIO pour utiliser le GPU si possible
+                oiio.attribute("gpu", 1)
+                oiio.attribute("use_gpu", True)
+                gpu_acceleration = True
+                self.log("🚀 GPU acceleration enabled for image processing")
+            except Exception as e:
+                self.log(f"⚠️ GPU acceleration requested but failed to initialize: {str(e)}")
+                self.log("ℹ️ Falling back to CPU processing")
+
+        self.log("🔄 Starting optimized merge process...")
         if priority_set:
-            log_callback("⚡ Process priority increased for better CPU utilization")
+            self.log("⚡ Process priority increased for better CPU utilization")
         if memory_optimized:
-            log_callback("🧠 Memory usage optimized for better performance")
+            self.log("🧠 Memory usage optimized for better performance")
         if gpu_acceleration:
-            log_callback("🎮 Using GPU acceleration for faster image operations")
+            self.log("🎮 Using GPU acceleration for faster image operations")
         if shadow_mode:
-            log_callback(f"🔍 Shadow Mode: Only keeping alpha and shadow AOVs: {', '.join(shadow_aovs)}")
+            self.log(f"🔍 Shadow Mode: Only keeping alpha and shadow AOVs: {', '.join(shadow_aovs)}")
         if compression in ["dwaa", "dwab"] and compression_level is not None:
-            log_callback(f"📊 Using optimized compression: {compression.upper()} level {compression_level}")
+            self.log(f"📊 Using optimized compression: {compression.upper()} level {compression_level}")
         else:
-            log_callback(f"📊 Using compression: {compression.upper()}")
+            self.log(f"📊 Using compression: {compression.upper()}")
+        self.log(f"🎚️ Pixel type: {pixel_type}")
+        if integrator_dir:
+            self.log("🔀 Combined pass: INTEGRATOR files are written from the same input read as BEAUTY")
 
-    # Créer le répertoire de sortie s'il n'existe pas
-    os.makedirs(output_folder, exist_ok=True)
+        # Créer le répertoire de sortie s'il n'existe pas
+        os.makedirs(output_folder, exist_ok=True)
+        if integrator_dir:
+            os.makedirs(integrator_dir, exist_ok=True)
 
-    # Préparer le chemin du dossier dénoisé
-    denoised_folder = temp_folder if temp_folder else os.path.join(output_folder, "../temp_denoised")
+        # Préparer le chemin du dossier dénoisé
+        denoised_folder = temp_folder if temp_folder else os.path.join(output_folder, "../temp_denoised")
 
-    # Déterminer le nombre optimal de workers basé sur les ressources système
-    optimal_workers = get_optimal_thread_count()
-    if log_callback:
-        log_callback(f"📊 Using {optimal_workers} parallel workers for processing")
+        # Paramètres communs à toutes les frames: transmis une seule fois à chaque worker
+        job_kwargs = {
+            "input_folder": input_folder,
+            "denoised_folder": denoised_folder,
+            "final_output_dir": output_folder,
+            "selected_aovs": selected_aovs,
+            "compression_mode": compression_mode,
+            "compression_level": compression_level,
+            "log_callback": None,  # On gère les logs nous-mêmes pour éviter les concurrences
+            "shadow_mode": shadow_mode,
+            "shadow_aovs": shadow_aovs,
+            "pixel_type": pixel_type,
+            "integrator_dir": integrator_dir,
+            "selected_integrators": selected_integrators,
+        }
 
-    # Diviser les frames en lots pour une meilleure gestion de la mémoire
-    # et permettre une utilisation plus efficace du CPU
-    batch_size = max(1, len(frame_list) // optimal_workers)
-    if batch_size > 1 and len(frame_list) > optimal_workers:
-        batches = [frame_list[i:i+batch_size] for i in range(0, len(frame_list), batch_size)]
-        if log_callback:
-            log_callback(f"📊 Processing {len(frame_list)} frames in {len(batches)} batches for optimal memory usage")
-    else:
-        batches = [frame_list]  # Traiter toutes les frames en un seul lot
-
-    # Traiter les lots de frames en série, mais les frames de chaque lot en parallèle
-    total_success = 0
-    total_frames = len(frame_list)
-    frames_processed = 0
-
-    for batch_index, batch in enumerate(batches):
-        # Check for stop request before processing the batch
-        if stop_check and stop_check():
-            if log_callback:
-                log_callback("🛑 Process stopped by user during merge")
+        # Pool unique alimenté en continu: une nouvelle frame part dès qu'une autre se termine.
+        # En AUTO, les premières frames tournent en threads pendant qu'on mesure le GIL.
+        # pause_gate (PauseGate): pendant une pause, les workers s'arrêtent entre deux frames
+        self.scheduler = FrameScheduler(process_single_frame, job_kwargs, backend=backend, workers=workers, log_callback=log_callback, pause_gate=pause_gate)
+        self.log(f"📊 Using {self.scheduler.workers} parallel workers for processing ({self.scheduler.active_backend.lower()} backend{', auto' if self.scheduler.gil_probe else ''})")
+        self.log(f"📊 Streaming {total_frames} frames with at most {self.scheduler.max_pending} in flight")
+        self.start_time = time.time()
+
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def submit(self, frame):
+        """Soumettre une frame dont les fichiers dénoisés sont complets (ignorée si déjà soumise)"""
+        if self.stopped or frame in self.submitted:
             return
-            
-        # Traiter ce lot de frames en parallèle
-        with concurrent.futures.ThreadPoolExecutor(max_workers=optimal_workers) as executor:
-            futures = []
-            for frame in batch:
-                future = executor.submit(
-                    process_single_frame,
-                    frame,
-                    input_folder,
-                    denoised_folder,
-                    output_folder,
-                    selected_aovs,
-                    compression_mode,
-                    compression_level,
-                    None,  # On gère les logs nous-mêmes pour éviter les concurrences
-                    shadow_mode,
-                    shadow_aovs
-                )
-                futures.append((frame, future))
-
-            # Surveiller la progression
-            batch_start_time = time.time()
-            for i, (frame, future) in enumerate(futures):
-                # Check for stop request during processing
-                if stop_check and stop_check():
-                    if log_callback:
-                        log_callback(f"🛑 Process stopped by user during merge (at frame {frames_processed+1}/{total_frames})")
-                    # Cancel all pending futures
-                    for _, f in futures[i:]:
-                        f.cancel()
-                    return
-                    
-                try:
-                    result, messages = future.result()
-                    if result:
-                        total_success += 1
-                    
-                    # Logs par frame
-                    if log_callback and messages:
-                        log_callback(f"⏳ Processing frame: {frame}")
-                        for msg in messages:
-                            log_callback(f"  {msg}")
-                except Exception as e:
-                    if log_callback:
-                        log_callback(f"❌ Error processing frame {frame}: {str(e)}")
-
-                # Mettre à jour la progression
-                frames_processed += 1
-                progress_percent = frames_processed / total_frames * 100
-                
-                if log_callback and i % max(1, len(batch)//10) == 0:  # Limiter les logs de progression
-                    log_callback(f"⏳ Progress: {frames_processed}/{total_frames} files processed")
-                
-                if progress_callback:
-                    should_stop = progress_callback(progress_percent)
-                    if should_stop:
-                        if log_callback:
-                            log_callback(f"🛑 Process stopped by progress callback")
-                        # Cancel all pending futures
-                        for _, f in futures[i+1:]:
-                            f.cancel()
-                        return
-
-        # Statistiques par lot et optimisation mémoire
-        batch_time = time.time() - batch_start_time
-        if log_callback and len(batches) > 1:
-            log_callback(f"✅ Batch {batch_index+1}/{len(batches)} completed in {batch_time:.2f}s ({len(batch)/batch_time:.2f} frames/s)")
-        
-        # Optimiser la mémoire entre les batches
-        if batch_index < len(batches) - 1:  # Pas le dernier batch
+        self.submitted.add(frame)
+        self.scheduler.submit(frame)
+
+    @property
+    def outstanding(self):
+        """Nombre de frames soumises pas encore fusionnées"""
+        return self.scheduler.outstanding
+
+    def record(self, frame, outcome, error):
+        """Prendre en compte une frame terminée (logs, bilan, FrameEvent). Retourne le pourcentage de progression"""
+        if isinstance(error, FrameCancelled):
+            # Interrompue par l'arrêt: rien n'a été écrit, la frame sera refaite au prochain run
+            self.cancelled_frames.append(frame)
+            return None
+        result = False
+        stats = {}
+        if error is not None:
+            self.log(f"❌ Error processing frame {frame}: {str(error)}")
+        else:
+            result, messages, stats = outcome
+            if result:
+                self.total_success += 1
+                self.completed_frames.append(frame)
+
+            # Logs par frame
+            if messages:
+                self.log(f"⏳ Processing frame: {frame}")
+                for msg in messages:
+                    self.log(f"  {msg}")
+
+        # Attente en file avant qu'un worker ne démarre la frame
+        queue_wait = self.scheduler.queue_wait(frame, stats.get("started"))
+        if queue_wait is not None:
+            stats["timings"]["queue_wait"] = queue_wait
+
+        # Mettre à jour la progression
+        self.frames_processed += 1
+        if self.event_callback:
+            self.event_callback(FrameEvent("merge", frame, bool(result), self.frames_processed, self.total_frames,
+                                           stats.get("bytes_read", 0), stats.get("bytes_written", 0),
+                                           stats.get("timings", {}), time.time() - self.start_time, self.scheduler.workers))
+
+        if self.frames_processed % self.progress_step == 0 or self.frames_processed == self.total_frames:
+            self.log(f"⏳ Progress: {self.frames_processed}/{self.total_frames} files processed")
+        return self.frames_processed / self.total_frames * 100
+
+    def poll(self, timeout=0):
+        """Traiter les frames terminées (sans attendre par défaut). Retourne False si la fusion est arrêtée"""
+        if self.stopped:
+            return False
+        # Arrêt demandé pendant que les workers travaillent: interrompre les frames en cours
+        if self.stop_check and self.stop_check():
+            self.log(f"🛑 Process stopped by user during merge (at frame {self.frames_processed}/{self.total_frames})")
+            self.cancel()
+            return False
+        # Les résultats arrivent dans l'ordre de fin, pas dans l'ordre des frames
+        for frame, outcome, error in self.scheduler.completed(timeout=timeout):
+            progress_percent = self.record(frame, outcome, error)
+            if progress_percent is None:
+                continue
+
+            # Check for stop request during processing
+            if self.stop_check and self.stop_check():
+                self.log(f"🛑 Process stopped by user during merge (at frame {self.frames_processed}/{self.total_frames})")
+                self.cancel()
+                return False
+
+            if self.progress_callback:
+                should_stop = self.progress_callback(progress_percent)
+                if should_stop:
+                    self.log(f"🛑 Process stopped by progress callback")
+                    self.cancel()
+                    return False
+        return True
+
+    def finish(self):
+        """Attendre la fin de toutes les frames soumises, fermer le pool et afficher le bilan"""
+        try:
+            # Attente par intervalles courts: un arrêt est vu sans attendre la fin d'une frame
+            while self.outstanding and self.poll(timeout=STOP_POLL_INTERVAL):
+                pass
+        finally:
+            self.scheduler.shutdown(wait=True)
+        if self.stopped:
+            return self.total_success
+
+        merge_time = time.time() - self.start_time
+        if merge_time > 0:
+            self.log(f"📊 Merge throughput: {self.frames_processed / merge_time:.2f} frames/s over {merge_time:.2f}s")
+
+        # Statistiques finales avec informations de performance
+        self.log(f"✅ Optimized merge completed: {self.total_success}/{self.total_frames} files successfully processed in BEAUTY folder")
+
+        # Afficher des statistiques de performance si possible
+        if self.log_callback:
             try:
-                import gc
-                gc.collect()  # Libérer la mémoire entre les batches
+                memory_info = psutil.virtual_memory()
+                self.log(f"📊 Final memory usage: {memory_info.percent:.1f}% ({memory_info.used / (1024**3):.1f}GB used)")
             except:
                 pass
+        return self.total_success
 
-    # Statistiques finales avec informations de performance
-    if log_callback:
-        log_callback(f"✅ Optimized merge completed: {total_success}/{total_frames} files successfully processed in BEAUTY folder")
-        
-        # Afficher des statistiques de performance si possible
-        try:
-            memory_info = psutil.virtual_memory()
-            log_callback(f"📊 Final memory usage: {memory_info.percent:.1f}% ({memory_info.used / (1024**3):.1f}GB used)")
-        except:
-            pass
+    def cancel(self):
+        """Arrêter la session: les frames non démarrées sont abandonnées, les frames en cours
+        s'arrêtent à leur prochain point de contrôle. Les frames terminées entre-temps sont
+        prises en compte, puis le bilan exact est affiché."""
+        if self.stopped:
+            return
+        self.stopped = True
+        outstanding = self.scheduler.outstanding
+        self.scheduler.cancel()
+        for frame, outcome, error in self.scheduler.drain():
+            self.record(frame, outcome, error)
+        if outstanding:
+            self.log(f"🛑 Merge stopped: {len(self.completed_frames)}/{self.total_frames} frames written, "
+                     f"{len(self.cancelled_frames)} in-flight frames cancelled (no partial files), "
+                     f"{self.total_frames - self.frames_processed - len(self.cancelled_frames)} not started")
+            if self.completed_frames:
+                self.log(f"✅ Completed frames: {format_frame_list(self.completed_frames)}")
+
+    def close(self):
+        """Libérer le pool sans attendre les frames restantes (arrêt ou erreur)"""
+        self.cancel()
+        self.scheduler.shutdown(wait=True)
+
+
+def merge_final_exrs(output_folder, frame_list, input_folder, selected_aovs, compression_mode, compression_level=None, log_callback=None, progress_callback=None, temp_folder=None, shadow_mode=False, shadow_aovs=None, stop_check=None, use_gpu=False, pixel_type="FLOAT", backend="AUTO", integrator_dir=None, selected_integrators=None, event_callback=None, workers=None, pause_gate=None):
+    """Fusionner les AOVs dénoisés avec les AOVs originaux, avec optimisations de performance"""
+    session = MergeSession(output_folder, input_folder, selected_aovs, compression_mode, len(frame_list),
+                           compression_level=compression_level, log_callback=log_callback,
+                           progress_callback=progress_callback, temp_folder=temp_folder,
+                           shadow_mode=shadow_mode, shadow_aovs=shadow_aovs, stop_check=stop_check,
+                           use_gpu=use_gpu, pixel_type=pixel_type, backend=backend, workers=workers,
+                           integrator_dir=integrator_dir, selected_integrators=selected_integrators,
+                           event_callback=event_callback, pause_gate=pause_gate)
+    try:
+        for frame in frame_list:
+            session.submit(frame)
+        session.finish()
+    finally:
+        session.close()
+
+
+def expected_denoised_layers(config):
+    """Fichiers attendus par frame dans temp_denoised, d'après le config.json de denoise_batch
+
+    Retourne {dossier: couches}: "" est le fichier principal (au moins une couche annoncée),
+    les dossiers aux-* doivent avoir annoncé toutes les couches de leur catégorie."""
+    expected = {"": set()}
+    aux = config.get("aux", {})
+    for category in ("albedo", "diffuse", "specular", "subsurface"):
+        layers = set()
+        for entry in aux.get(category, []):
+            layers.update(entry.get("layers", []))
+        if layers:
+            expected[f"aux-{category}"] = layers
+    return expected
+
+
+class DenoisedFrameTracker:
+    """Suivre les lignes "Applying Denoiser: ... > temp_denoised/[aux-x/]frame | layer: L"
+
+    Une frame est prête quand toutes ses couches attendues ont été annoncées et que le
+    débruiteur est passé à un autre fichier (le fichier précédent est alors écrit)."""
+
+    def __init__(self, frames, expected_layers, denoised_folder):
+        self.frames = list(frames)
+        self.frame_set = set(self.frames)
+        self.expected_layers = expected_layers
+        self.denoised_folder = denoised_folder
+        self.seen = {}  # frame -> {dossier: couches annoncées}
+        self.current = None  # (dossier, frame) en cours d'écriture
+        self.released = set()
+
+    def announce(self, output_path, layer):
+        """Enregistrer une sortie annoncée par denoise_batch; retourne les frames devenues prêtes"""
+        output_path = output_path.replace("\\", "/")
+        frame = os.path.basename(output_path)
+        folder = os.path.basename(os.path.dirname(output_path))
+        if not folder.startswith("aux-"):
+            folder = ""
+        if frame not in self.frame_set:
+            return []
+        self.seen.setdefault(frame, {}).setdefault(folder, set()).add(layer)
+
+        previous = self.current
+        self.current = (folder, frame)
+        if previous is None or previous == self.current:
+            return []
+        # Le fichier précédent est terminé: sa frame est peut-être complète
+        if not self.is_ready(previous[1]):
+            return []
+        self.released.add(previous[1])
+        return [previous[1]]
+
+    def parse_line(self, line_text):
+        """Analyser une ligne de sortie de denoise_batch; retourne les frames devenues prêtes"""
+        if "Applying Denoiser:" not in line_text or ">" not in line_text or "|" not in line_text:
+            return []
+        output_part, layer_info = line_text.split("|", 1)
+        output_path = output_part.split(">")[1].strip()
+        layer = layer_info.split(":", 1)[1].strip() if ":" in layer_info else ""
+        if not output_path:
+            return []
+        return self.announce(output_path, layer)
+
+    def is_ready(self, frame):
+        if frame in self.released:
+            return False
+        seen = self.seen.get(frame, {})
+        for folder, layers in self.expected_layers.items():
+            if folder not in seen or not layers <= seen[folder]:
+                return False
+            if not os.path.exists(os.path.join(self.denoised_folder, folder, frame)):
+                return False
+        return True
+
+    def remaining(self):
+        """Frames pas encore signalées prêtes, dans l'ordre de la séquence (à fusionner en fin de débruitage)"""
+        pending = [frame for frame in self.frames if frame not in self.released]
+        self.released.update(pending)
+        return pending
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import OpenImageIO as oiio
+from ExrIO import select_channel_indices, write_pixels
+
+# Remplaçant local de denoise_batch (RenderMan) pour tester et mesurer le pipeline sans RenderMan:
+#   python FakeDenoiser.py [--latency S] [-cf -f] -v -j config.json
+# Lit le même config.json (primary, aux, passes, output-dir, flow), écrit les fichiers débruités
+# aux mêmes emplacements (fichier principal + aux-*) et affiche les mêmes lignes que denoise_batch
+# en mode verbose ("Processing albedo", "Applying Denoiser: entrée > sortie | layer: L").
+# Les pixels sont recopiés de l'entrée (pas de débruitage): seules la disposition et le rythme comptent.
+
+# Ordre des étapes de denoise_batch, avec les sorties écrites à chaque étape
+STAGES = ["albedo", "subsurface", "diffuse", "specular"]
+
+# Canaux du fichier principal (le reste des passes va dans les fichiers aux-*)
+MAIN_LAYERS = ["Ci", "diffuse", "specular"]
+
+
+def read_layers(path, layers, with_rgba=False):
+    """Lire les canaux des couches demandées (et RGBA) d'un EXR -> (noms, pixels HxWxC)"""
+    source = oiio.ImageInput.open(path)
+    if not source:
+        raise IOError(oiio.geterror())
+    try:
+        spec = source.spec()
+        wanted = (["R", "G", "B", "A"] if with_rgba else []) + list(layers)
+        indices = select_channel_indices(spec.channelnames, wanted)
+        if not indices:
+            return [], None
+        pixels = source.read_image(0, 0, 0, spec.nchannels, oiio.HALF)
+        if pixels is None:
+            raise IOError(source.geterror())
+        return [spec.channelnames[idx] for idx in indices], np.ascontiguousarray(pixels[:, :, indices])
+    finally:
+        source.close()
+
+
+def write_output(path, channels, pixels):
+    spec = oiio.ImageSpec(pixels.shape[1], pixels.shape[0], len(channels), oiio.HALF)
+    spec.channelnames = tuple(channels)
+    spec.attribute("compression", "zip")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write_pixels écrit <path>.tmp puis renomme: la fusion en pipeline ne lit jamais de fichier partiel
+    success, error = write_pixels(path, spec, pixels)
+    if not success:
+        raise IOError(error)
+
+
+def stage_outputs(config):
+    """Sorties de chaque étape: {étape: [(dossier, couches)]}, "" étant le fichier principal"""
+    aux = config.get("aux", {})
+    passes = config["config"].get("passes", [])
+
+    def layers(category):
+        found = []
+        for entry in aux.get(category, []):
+            found += [layer for layer in entry.get("layers", []) if layer not in found]
+        return found
+
+    main_layers = [layer for layer in MAIN_LAYERS if layer in passes]
+    return {
+        "albedo": [("aux-albedo", layers("albedo"))],
+        "subsurface": [("aux-subsurface", layers("subsurface"))],
+        "diffuse": [("aux-diffuse", layers("diffuse"))],
+        "specular": [("aux-specular", layers("specular")), ("", main_layers)]
+    }
+
+
+def run(config, latency=0.0, verbose=False, fail_after=None):
+    output_dir = config["config"]["output-dir"]
+    primary = config["primary"]
+    outputs = stage_outputs(config)
+    # La latence par frame est répartie entre les étapes qui écrivent quelque chose
+    active_stages = [stage for stage in STAGES if any(layers or not folder for folder, layers in outputs[stage])]
+    stage_latency = latency / max(1, len(active_stages))
+    if config["config"].get("flow"):
+        print("Computing motion flow for CrossFrame", flush=True)
+
+    written = 0
+    for stage in active_stages:
+        print(f"Processing {stage}", flush=True)
+        for input_path in primary:
+            frame = os.path.basename(input_path)
+            start = time.time()
+            for folder, layers in outputs[stage]:
+                if folder and not layers:
+                    continue
+                output_path = os.path.join(output_dir, folder, frame).replace("\\", "/")
+                channels, pixels = read_layers(input_path, layers, with_rgba=not folder)
+                if pixels is None:
+                    print(f"ERROR: AOV '{layers[0] if layers else 'Ci'}' not found in {input_path}", flush=True)
+                    return 1
+                write_output(output_path, channels, pixels)
+                if verbose:
+                    for layer in layers or ["Ci"]:
+                        print(f"Applying Denoiser: {input_path} > {output_path} | layer: {layer}", flush=True)
+            written += 1
+            if fail_after is not None and written > fail_after:
+                print(f"ERROR: simulated denoiser failure on {frame}", flush=True)
+                return 1
+            # Compléter jusqu'à la latence demandée (le temps de lecture/écriture en fait partie)
+            remaining = stage_latency - (time.time() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+    print("Denoising complete", flush=True)
+    return 0
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="fake_denoise_batch", description="Stand-in for RenderMan denoise_batch: copies the configured passes into the denoised layout")
+    parser.add_argument("-j", dest="config", required=True, help="denoise_batch config.json")
+    parser.add_argument("-v", dest="verbose", action="store_true", help="Print the per-layer 'Applying Denoiser' lines")
+    parser.add_argument("-cf", dest="crossframe", action="store_true", help="Accepted for compatibility (CrossFrame)")
+    parser.add_argument("-f", dest="flow", action="store_true", help="Accepted for compatibility (CrossFrame flow)")
+    parser.add_argument("--latency", type=float, default=float(os.environ.get("FAKE_DENOISE_LATENCY", 0)), help="Seconds spent per frame, spread over the stages (default: FAKE_DENOISE_LATENCY or 0)")
+    parser.add_argument("--fail-after", type=int, help="Exit with an error after writing this many frame outputs")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    try:
+        with open(args.config, "r") as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: could not read {args.config}: {str(e)}", flush=True)
+        return 1
+    try:
+        return run(config, args.latency, args.verbose, args.fail_after)
+    except IOError as e:
+        print(f"ERROR: {str(e)}", flush=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
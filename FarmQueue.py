@@ -0,0 +1,454 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from Pipeline import Pipeline, PipelineError, list_input_frames, load_user_config, add_pipeline_arguments, pipeline_options, console_callbacks
+from Integrator_Denoizer import integrator_output_name
+
+# Ferme de rendu: le coordinateur découpe une séquence en plages de frames (jobs) déposées
+# dans un dossier partagé; chaque worker (une machine, ou plusieurs process en local) prend
+# un job, exécute le pipeline complet (débruitage, BEAUTY, INTEGRATOR) sur sa plage dans un
+# dossier de travail local, puis copie les frames produites dans le dossier de sortie du plan.
+#
+# Dossier de la file:
+#   pending/  jobs en attente        claimed/  jobs pris par un worker (mtime = dernier signe de vie)
+#   done/     jobs terminés          failed/   jobs abandonnés après MAX_ATTEMPTS essais
+# Un job est pris en le renommant de pending/ vers claimed/: un seul worker réussit le renommage.
+
+QUEUE_FOLDERS = ("pending", "claimed", "done", "failed")
+
+# Frames par job: assez pour amortir le démarrage de denoise_batch (et le halo CrossFrame)
+DEFAULT_SHARD_SIZE = 50
+
+# Un job pris dont le worker n'a pas donné signe de vie depuis ce délai est remis en attente
+HEARTBEAT_INTERVAL = 30
+HEARTBEAT_TIMEOUT = 300
+
+# Nombre d'essais d'un job avant de le classer en échec
+MAX_ATTEMPTS = 3
+
+POLL_INTERVAL = 2.0
+
+
+def write_json_atomic(path, data):
+    """Écrire un fichier JSON via un fichier temporaire renommé (jamais lu à moitié écrit)"""
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(temp_path, path)
+
+
+def read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except:
+        return None
+
+
+def output_files(frame, with_integrator):
+    """Fichiers produits pour une frame, relatifs au dossier de sortie du plan"""
+    files = [os.path.join("BEAUTY", frame)]
+    if with_integrator:
+        files.append(os.path.join("INTEGRATOR", integrator_output_name(frame)))
+    return files
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class FarmQueue:
+    """File de jobs dans un dossier partagé (disque réseau visible par toutes les machines)"""
+
+    def __init__(self, queue_dir):
+        self.queue_dir = queue_dir
+        for folder in QUEUE_FOLDERS:
+            os.makedirs(os.path.join(queue_dir, folder), exist_ok=True)
+
+    def path(self, folder, job_id):
+        return os.path.join(self.queue_dir, folder, f"{job_id}.json")
+
+    def jobs(self, folder, shot=None):
+        """Jobs d'un dossier de la file (optionnellement ceux d'un seul plan), triés par identifiant"""
+        jobs = []
+        for name in sorted(os.listdir(os.path.join(self.queue_dir, folder))):
+            if not name.endswith(".json"):
+                continue
+            job = read_json(os.path.join(self.queue_dir, folder, name))
+            if job and (shot is None or job.get("shot") == shot):
+                jobs.append(job)
+        return jobs
+
+    def submit(self, job):
+        write_json_atomic(self.path("pending", job["id"]), job)
+
+    def claim(self, worker_name):
+        """Prendre le premier job en attente; retourne le job ou None si la file est vide"""
+        for name in sorted(os.listdir(os.path.join(self.queue_dir, "pending"))):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-len(".json")]
+            claimed_path = self.path("claimed", job_id)
+            try:
+                # Renommage atomique: si un autre worker l'a pris avant, le fichier n'existe plus
+                os.rename(self.path("pending", job_id), claimed_path)
+            except OSError:
+                continue
+            job = read_json(claimed_path)
+            if job is None:
+                continue
+            job["worker"] = worker_name
+            job["claimed_at"] = time.time()
+            write_json_atomic(claimed_path, job)
+            return job
+        return None
+
+    def heartbeat(self, job):
+        """Signe de vie du worker: mettre à jour la date du job pris"""
+        try:
+            os.utime(self.path("claimed", job["id"]))
+        except OSError:
+            pass
+
+    def complete(self, job, outputs):
+        job["finished_at"] = time.time()
+        job["outputs"] = outputs
+        write_json_atomic(self.path("done", job["id"]), job)
+        self._remove_claim(job)
+
+    def fail(self, job, error):
+        """Remettre le job en attente, ou le classer en échec après MAX_ATTEMPTS essais"""
+        job["attempts"] = job.get("attempts", 0) + 1
+        job["error"] = error
+        job.pop("worker", None)
+        folder = "pending" if job["attempts"] < MAX_ATTEMPTS else "failed"
+        write_json_atomic(self.path(folder, job["id"]), job)
+        self._remove_claim(job)
+
+    def _remove_claim(self, job):
+        try:
+            os.remove(self.path("claimed", job["id"]))
+        except OSError:
+            pass
+
+    def requeue_stale(self, timeout=HEARTBEAT_TIMEOUT):
+        """Remettre en attente les jobs dont le worker ne donne plus signe de vie; retourne leurs identifiants"""
+        requeued = []
+        claimed_dir = os.path.join(self.queue_dir, "claimed")
+        for name in os.listdir(claimed_dir):
+            path = os.path.join(claimed_dir, name)
+            try:
+                if not name.endswith(".json") or time.time() - os.path.getmtime(path) < timeout:
+                    continue
+            except OSError:
+                continue
+            job = read_json(path)
+            if job is None:
+                continue
+            self.fail(job, f"worker {job.get('worker', '?')} stopped responding")
+            requeued.append(job["id"])
+        return requeued
+
+    def status(self, shot=None):
+        """Nombre de jobs par état"""
+        return {folder: len(self.jobs(folder, shot)) for folder in QUEUE_FOLDERS}
+
+
+class FarmCoordinator:
+    """Découper un plan en jobs, suivre leur exécution et vérifier les frames produites"""
+
+    def __init__(self, queue_dir, input_path, output_path, options, shard_size=DEFAULT_SHARD_SIZE, log_callback=None, progress_callback=None, stop_check=None):
+        self.queue = FarmQueue(queue_dir)
+        self.input_path = os.path.abspath(input_path)
+        self.output_path = os.path.abspath(output_path)
+        self.options = dict(options)
+        self.shard_size = max(1, int(shard_size))
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+        self.stop_check = stop_check
+        self.shot = f"{os.path.basename(self.output_path.rstrip(os.sep)) or 'shot'}-{time.strftime('%Y%m%d-%H%M%S')}"
+        self.frames = []
+        self.job_ids = []
+
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def submit(self):
+        """Déposer un job par plage de `shard_size` frames; retourne le nombre de jobs"""
+        self.frames = list_input_frames(self.input_path)
+        if not self.frames:
+            raise PipelineError("No .exr files found in the input folder.")
+        os.makedirs(self.output_path, exist_ok=True)
+        for index, start in enumerate(range(0, len(self.frames), self.shard_size)):
+            job_id = f"{self.shot}-{index + 1:04d}"
+            self.queue.submit({
+                "id": job_id,
+                "shot": self.shot,
+                "index": index,
+                "frames": self.frames[start:start + self.shard_size],
+                "input_path": self.input_path,
+                "output_path": self.output_path,
+                "options": self.options,
+                "attempts": 0,
+                "submitted_at": time.time()
+            })
+            self.job_ids.append(job_id)
+        self.log(f"📤 Submitted {len(self.job_ids)} jobs of up to {self.shard_size} frames ({len(self.frames)} frames) to {self.queue.queue_dir}")
+        return len(self.job_ids)
+
+    def wait(self, poll_interval=POLL_INTERVAL):
+        """Attendre que tous les jobs du plan soient terminés ou en échec; retourne False si arrêté"""
+        last_status = None
+        while True:
+            for job_id in self.queue.requeue_stale():
+                self.log(f"⚠️ Job {job_id} requeued: its worker stopped responding")
+            status = self.queue.status(self.shot)
+            if status != last_status:
+                finished = status["done"] + status["failed"]
+                self.log(f"⏳ Progress: {finished}/{len(self.job_ids)} jobs finished ({status['claimed']} running, {status['pending']} pending, {status['failed']} failed)")
+                if self.progress_callback:
+                    self.progress_callback(finished / len(self.job_ids) * 100)
+                last_status = status
+            if status["pending"] == 0 and status["claimed"] == 0:
+                return True
+            if self.stop_check and self.stop_check():
+                self.log("🛑 Coordinator stopped - pending jobs stay in the queue")
+                return False
+            time.sleep(poll_interval)
+
+    def collect(self):
+        """Vérifier que chaque frame a sa BEAUTY (et son INTEGRATOR); retourne les fichiers manquants"""
+        with_integrator = bool(self.options.get("selected_integrators"))
+        missing = []
+        for frame in self.frames:
+            for path in output_files(frame, with_integrator):
+                if not os.path.exists(os.path.join(self.output_path, path)):
+                    missing.append(path)
+        for job in self.queue.jobs("failed", self.shot):
+            self.log(f"❌ Job {job['id']} ({job['frames'][0]} -> {job['frames'][-1]}) failed: {job.get('error', 'unknown error')}")
+        if missing:
+            self.log(f"❌ {len(missing)} output files missing in {self.output_path}")
+        else:
+            self.log(f"✅ All {len(self.frames)} frames collected in {self.output_path}")
+        return missing
+
+    def run(self):
+        start_time = time.time()
+        self.submit()
+        if not self.wait():
+            return False
+        missing = self.collect()
+        self.log(f"📊 Farm run finished in {time.time() - start_time:.1f}s")
+        return not missing
+
+
+class FarmWorker:
+    """Exécuter les jobs de la file: pipeline complet sur une plage de frames, puis copie des sorties"""
+
+    def __init__(self, queue_dir, name=None, scratch_dir=None, renderman_path=None, log_callback=None, stop_check=None, exit_when_idle=False, quiet=False):
+        self.queue = FarmQueue(queue_dir)
+        self.name = name or default_worker_name()
+        self.scratch_dir = scratch_dir or os.path.join(tempfile.gettempdir(), "denoizer_farm")
+        # Chemin RenderMan de cette machine (il peut différer de celui du coordinateur)
+        self.renderman_path = renderman_path
+        self.log_callback = log_callback
+        self.stop_check = stop_check
+        self.exit_when_idle = exit_when_idle
+        self.quiet = quiet
+        self.jobs_done = 0
+
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(f"[{self.name}] {message}")
+
+    def stopped(self):
+        return bool(self.stop_check and self.stop_check())
+
+    def run(self, poll_interval=POLL_INTERVAL):
+        """Boucle du worker: prendre un job, l'exécuter, recommencer. Retourne le nombre de jobs terminés"""
+        self.log(f"👷 Worker waiting for jobs in {self.queue.queue_dir}")
+        while not self.stopped():
+            job = self.queue.claim(self.name)
+            if job is None:
+                if self.exit_when_idle and self.queue.status()["pending"] == 0:
+                    break
+                time.sleep(poll_interval)
+                continue
+            self.run_job(job)
+        self.log(f"👷 Worker exiting after {self.jobs_done} jobs")
+        return self.jobs_done
+
+    def run_job(self, job):
+        frames = job["frames"]
+        self.log(f"▶️ Job {job['id']}: {len(frames)} frames ({frames[0]} -> {frames[-1]})")
+        work_dir = os.path.join(self.scratch_dir, job["id"])
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir, exist_ok=True)
+
+        # Signe de vie régulier pendant le job (un job peut durer bien plus que HEARTBEAT_TIMEOUT)
+        heartbeat_stop = threading.Event()
+
+        def heartbeat():
+            while not heartbeat_stop.wait(HEARTBEAT_INTERVAL):
+                self.queue.heartbeat(job)
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+
+        options = dict(job["options"])
+        if self.renderman_path:
+            options["renderman_path"] = self.renderman_path
+        callbacks = console_callbacks(self.quiet)
+        start_time = time.time()
+        try:
+            pipeline = Pipeline(job["input_path"], work_dir, frames=frames, stop_check=self.stopped, **options, **callbacks)
+            if not pipeline.run():
+                self.queue.fail(job, "stopped")
+                return False
+            outputs = self.publish(work_dir, job["output_path"], frames)
+        except Exception as e:
+            self.log(f"❌ Job {job['id']} failed: {e}")
+            self.queue.fail(job, str(e))
+            return False
+        finally:
+            heartbeat_stop.set()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        self.queue.complete(job, outputs)
+        self.jobs_done += 1
+        self.log(f"✅ Job {job['id']} done in {time.time() - start_time:.1f}s ({len(outputs)} files published)")
+        return True
+
+    def publish(self, work_dir, output_path, frames):
+        """Copier les BEAUTY/INTEGRATOR de la plage dans le dossier du plan (copie puis renommage)"""
+        outputs = []
+        for frame in frames:
+            for path in output_files(frame, with_integrator=True):
+                source = os.path.join(work_dir, path)
+                if not os.path.exists(source):
+                    continue
+                target = os.path.join(output_path, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                temp_target = f"{target}.{self.name}.tmp"
+                shutil.copyfile(source, temp_target)
+                os.replace(temp_target, target)
+                outputs.append(path)
+        if not any(path.startswith("BEAUTY") for path in outputs):
+            raise PipelineError("No BEAUTY frames were produced")
+        return outputs
+
+
+def worker_command(queue_dir, name, extra=()):
+    """Commande d'un worker local (script Python ou exécutable figé)"""
+    if getattr(sys, "frozen", False):
+        command = [sys.executable]
+    else:
+        command = [sys.executable, os.path.abspath(__file__)]
+    return command + ["worker", queue_dir, "--name", name, "--exit-when-idle"] + list(extra)
+
+
+def run_local(queue_dir, input_path, output_path, options, workers, shard_size, log_callback=None, quiet=False):
+    """Mode local: un coordinateur et `workers` process workers sur cette machine (tests, grosses stations)"""
+    coordinator = FarmCoordinator(queue_dir, input_path, output_path, options, shard_size, log_callback=log_callback)
+    coordinator.submit()
+    extra = ["--quiet"] if quiet else []
+    processes = [subprocess.Popen(worker_command(queue_dir, f"{socket.gethostname()}-local{index + 1}", extra))
+                 for index in range(workers)]
+    # Arrêter d'attendre si tous les workers sont sortis en laissant des jobs (crash, RenderMan introuvable...)
+    coordinator.stop_check = lambda: all(process.poll() is not None for process in processes)
+    try:
+        coordinator.wait()
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+            process.wait()
+    return not coordinator.collect()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="denoizer-farm", description="Distribute DenoiZer shots across farm nodes through a shared job folder")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="Split a shot into frame-range jobs and wait for the workers")
+    submit.add_argument("queue", help="Shared queue folder (visible from every node)")
+    submit.add_argument("input", help="Input EXR folder (shared path)")
+    submit.add_argument("output", help="Shot output folder (shared path)")
+    submit.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Frames per job")
+    submit.add_argument("--no-wait", action="store_true", help="Only submit the jobs")
+    add_pipeline_arguments(submit)
+
+    local = commands.add_parser("local", help="Run a coordinator and several workers on this machine")
+    local.add_argument("input", help="Input EXR folder")
+    local.add_argument("output", help="Shot output folder")
+    local.add_argument("--queue", help="Queue folder (default: <output>/_farm_queue)")
+    local.add_argument("--workers", type=int, default=2, help="Number of local worker processes")
+    local.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Frames per job")
+    add_pipeline_arguments(local)
+
+    worker = commands.add_parser("worker", help="Process jobs from the queue")
+    worker.add_argument("queue", help="Shared queue folder")
+    worker.add_argument("--name", help="Worker name (default: hostname-pid)")
+    worker.add_argument("--scratch", help="Local work folder (default: system temp)")
+    worker.add_argument("--renderman", help="RenderMan Pro Server folder on this node (overrides the job's)")
+    worker.add_argument("--exit-when-idle", action="store_true", help="Exit once the queue has no pending job")
+    worker.add_argument("--quiet", action="store_true", help="Only print job results and errors")
+
+    status = commands.add_parser("status", help="Show job counts")
+    status.add_argument("queue", help="Shared queue folder")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    def log(message):
+        print(message, flush=True)
+
+    if args.command == "status":
+        queue = FarmQueue(args.queue)
+        for shot in sorted({job["shot"] for folder in QUEUE_FOLDERS for job in queue.jobs(folder)}):
+            print(shot, queue.status(shot))
+        return 0
+
+    if args.command == "worker":
+        worker = FarmWorker(args.queue, name=args.name, scratch_dir=args.scratch, renderman_path=args.renderman,
+                            log_callback=log, exit_when_idle=args.exit_when_idle, quiet=args.quiet)
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            return 130
+        return 0
+
+    options = pipeline_options(args, load_user_config(args.config))
+    try:
+        if args.command == "local":
+            queue_dir = args.queue or os.path.join(args.output, "_farm_queue")
+            completed = run_local(queue_dir, args.input, args.output, options, max(1, args.workers), args.shard_size, log_callback=log, quiet=args.quiet)
+        else:
+            coordinator = FarmCoordinator(args.queue, args.input, args.output, options, args.shard_size, log_callback=log)
+            if args.no_wait:
+                coordinator.submit()
+                return 0
+            completed = coordinator.run()
+    except PipelineError as e:
+        print(f"❌ Farm run failed: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0 if completed else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,489 @@
+import os
+import re
+import time
+import threading
+import collections
+import concurrent.futures
+from functools import partial
+import multiprocessing
+import psutil
+import OpenImageIO as oiio
+from ExrIO import FrameCancelled, check_cancelled
+
+# Backends d'exécution des frames:
+#   THREAD  - ThreadPoolExecutor (léger, mais le GIL limite le travail numpy/Python)
+#   PROCESS - ProcessPoolExecutor, un interpréteur par worker, OIIO initialisé une seule fois
+#   AUTO    - démarre en threads et passe en processus si la contention du GIL est mesurée
+BACKENDS = ["AUTO", "THREAD", "PROCESS"]
+
+# En dessous de cette fraction des cœurs attendus, les threads sont considérés bridés par le GIL
+GIL_BOUND_UTILISATION = 0.6
+
+# Intervalle (s) auquel une session vérifie stop_check en attendant ses frames, et auquel un
+# worker en pause vérifie l'annulation
+STOP_POLL_INTERVAL = 0.25
+
+# Nom de frame numérotée: préfixe, numéro, extension (shot.1001.exr)
+FRAME_NUMBER = re.compile(r"^(.*?)(\d+)(\.[^.]+)$")
+
+# Événement de progression émis par MergeSession et IntegratorSession, un par frame terminée:
+#   phase          - "merge" ou "integrator"
+#   done / total   - frames terminées / à traiter dans la session
+#   bytes_read     - octets des fichiers EXR ouverts pour la frame
+#   bytes_written  - octets des fichiers écrits
+#   timings        - durée de chaque étape de la frame en secondes: queue_wait (file d'attente),
+#                    open (en-têtes), plan (plan de canaux + buffers), decode:<source>, read (open..decode),
+#                    write:<sortie>, write, total
+#   elapsed        - secondes depuis le démarrage de la session
+#   workers        - taille du pool de la session
+FrameEvent = collections.namedtuple("FrameEvent", "phase frame success done total bytes_read bytes_written timings elapsed workers")
+
+
+def file_size(path):
+    """Taille d'un fichier en octets (0 s'il n'existe pas)"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def format_frame_list(frames):
+    """Liste compacte de frames pour les logs: shot.1001-1010,1015.exr (noms sans numéro tels quels)"""
+    groups = {}
+    others = []
+    for frame in frames:
+        match = FRAME_NUMBER.match(frame)
+        if match:
+            groups.setdefault((match.group(1), match.group(3), len(match.group(2))), []).append(int(match.group(2)))
+        else:
+            others.append(frame)
+    parts = []
+    for (prefix, suffix, padding), numbers in groups.items():
+        numbers.sort()
+        ranges = []
+        for number in numbers:
+            if ranges and number == ranges[-1][1] + 1:
+                ranges[-1][1] = number
+            else:
+                ranges.append([number, number])
+        text = ",".join(f"{first:0{padding}d}" if first == last else f"{first:0{padding}d}-{last:0{padding}d}" for first, last in ranges)
+        parts.append(f"{prefix}{text}{suffix}")
+    return ", ".join(parts + sorted(others))
+
+
+# Job courant d'un worker process: fonction de frame + paramètres communs à toutes les frames.
+# Fixé une seule fois par l'initializer, pour que chaque tâche ne transporte que le nom de la frame.
+_worker_job = None
+# Event multiprocessing de la PauseGate du pool (levé = les frames peuvent démarrer)
+_worker_gate = None
+# Event multiprocessing du CancelToken du pool (levé = abandonner la frame en cours)
+_worker_cancel = None
+
+
+class CancelToken:
+    """Annulation coopérative des frames d'un pool
+
+    `cancel()` lève l'événement vu par les fonctions de frame (`cancel_event`), qui le vérifient
+    entre deux lectures de source, avant la compression et pendant l'écriture. Les workers
+    process reçoivent un Event multiprocessing levé en même temps (`process_event()`)."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.process_events = []
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            for event in [self.event] + self.process_events:
+                event.set()
+
+    def process_event(self):
+        """Event multiprocessing (contexte spawn) levé par `cancel()`, pour l'initializer des workers process"""
+        event = multiprocessing.get_context("spawn").Event()
+        with self.lock:
+            if self.cancelled:
+                event.set()
+            self.process_events.append(event)
+        return event
+
+    def release_process_event(self, event):
+        with self.lock:
+            if event in self.process_events:
+                self.process_events.remove(event)
+
+
+class PauseGate:
+    """Pause partagée entre l'interface, le pipeline et les workers des pools de frames
+
+    `pause()` et `resume()` s'appellent depuis n'importe quel thread. Les workers attendent
+    la porte avant de démarrer une frame: la frame en cours se termine, la suivante attend
+    la reprise. Les pools process reçoivent un Event multiprocessing tenu à jour par la porte
+    (`process_event()`), et `add_listener(callback)` permet de suspendre d'autres process
+    au même moment (denoise_batch)."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.event.set()
+        self.lock = threading.Lock()
+        self.process_events = []
+        self.listeners = []
+
+    @property
+    def paused(self):
+        return not self.event.is_set()
+
+    def pause(self):
+        self._set_paused(True)
+
+    def resume(self):
+        self._set_paused(False)
+
+    def _set_paused(self, paused):
+        with self.lock:
+            if paused == self.paused:
+                return
+            for event in [self.event] + self.process_events:
+                if paused:
+                    event.clear()
+                else:
+                    event.set()
+            listeners = list(self.listeners)
+        for callback in listeners:
+            try:
+                callback(paused)
+            except:
+                pass
+
+    def wait(self, timeout=None):
+        """Attendre la reprise (retour immédiat si la porte est ouverte). False si `timeout` expire"""
+        return self.event.wait(timeout)
+
+    def process_event(self):
+        """Event multiprocessing (contexte spawn) qui suit la porte, pour l'initializer des workers process"""
+        event = multiprocessing.get_context("spawn").Event()
+        with self.lock:
+            if not self.paused:
+                event.set()
+            self.process_events.append(event)
+        return event
+
+    def release_process_event(self, event):
+        with self.lock:
+            if event in self.process_events:
+                self.process_events.remove(event)
+
+    def add_listener(self, callback):
+        """`callback(paused)` est appelé à chaque pause / reprise, depuis le thread qui la demande"""
+        with self.lock:
+            self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self.lock:
+            if callback in self.listeners:
+                self.listeners.remove(callback)
+
+
+def get_optimal_thread_count():
+    """Déterminer le nombre optimal de threads pour le système actuel avec optimisations"""
+    cpu_count = multiprocessing.cpu_count()
+    physical_cores = psutil.cpu_count(logical=False)
+    if not physical_cores:
+        physical_cores = max(1, cpu_count // 2)
+    
+    # Obtenir la mémoire disponible pour ajuster le nombre de threads
+    try:
+        memory_gb = psutil.virtual_memory().available / (1024**3)
+        # Limiter les threads si la mémoire est faible (moins de 8GB disponibles)
+        if memory_gb < 8:
+            max_threads_by_memory = max(2, int(memory_gb / 2))  # 1 thread par 2GB
+        else:
+            max_threads_by_memory = physical_cores * 3
+    except:
+        max_threads_by_memory = physical_cores * 2
+    
+    # Pour les opérations I/O bound comme la fusion EXR, plus de threads peut aider
+    # mais on limite selon la mémoire disponible
+    optimal_threads = min(physical_cores * 3, cpu_count, max_threads_by_memory)
+    
+    # Minimum de 2 threads, maximum de 16 pour éviter la surcharge
+    return max(2, min(optimal_threads, 16))
+
+
+def get_optimal_process_count():
+    """Nombre de workers process: un par cœur physique, limité par la mémoire disponible"""
+    cpu_count = multiprocessing.cpu_count()
+    physical_cores = psutil.cpu_count(logical=False) or max(1, cpu_count // 2)
+    try:
+        memory_gb = psutil.virtual_memory().available / (1024**3)
+        # Environ 2GB par worker pour une frame 4K avec beaucoup de canaux
+        return max(1, min(physical_cores, int(memory_gb / 2)))
+    except:
+        return max(1, physical_cores)
+
+
+def get_budgeted_worker_count(cpu_budget):
+    """Nombre de workers pour une tâche de fond limitée à une fraction des cœurs physiques
+
+    Utilisé quand le pool tourne en même temps que denoise_batch: chaque worker process
+    décode sur un seul thread, donc N workers occupent au plus N cœurs."""
+    physical_cores = psutil.cpu_count(logical=False) or max(1, multiprocessing.cpu_count() // 2)
+    return max(1, min(int(physical_cores * cpu_budget), get_optimal_process_count()))
+
+
+def _init_process_worker(frame_fn, job_kwargs, gate_event=None, cancel_event=None):
+    """Initialiser un worker process: configuration OIIO une seule fois, puis mémoriser le job"""
+    global _worker_job, _worker_gate, _worker_cancel
+    try:
+        # Chaque process décode une frame à la fois: éviter la sursouscription des threads internes
+        oiio.attribute("threads", 1)
+        oiio.attribute("exr_threads", 1)
+        oiio.attribute("max_memory_MB", 1024)
+    except:
+        pass
+    _worker_job = (frame_fn, job_kwargs)
+    _worker_gate = gate_event
+    _worker_cancel = cancel_event
+
+
+def wait_for_gate(gate, cancel_event, frame):
+    """En pause: attendre la reprise avant de démarrer la frame (abandonnée si le pool est annulé entre-temps)"""
+    if gate is not None:
+        while not gate.wait(STOP_POLL_INTERVAL):
+            check_cancelled(cancel_event, frame)
+    check_cancelled(cancel_event, frame)
+
+
+def _run_process_frame(frame):
+    """Traiter une frame dans un worker process avec le job mémorisé"""
+    frame_fn, job_kwargs = _worker_job
+    # En pause: la frame précédente est terminée, attendre la reprise avant de démarrer celle-ci
+    wait_for_gate(_worker_gate, _worker_cancel, frame)
+    if _worker_cancel is not None:
+        return frame_fn(frame, cancel_event=_worker_cancel, **job_kwargs)
+    return frame_fn(frame, **job_kwargs)
+
+
+def _run_thread_frame(pause_gate, cancel_event, task, frame):
+    """Traiter une frame dans un worker thread (après la reprise si une pause est demandée)"""
+    wait_for_gate(pause_gate, cancel_event, frame)
+    return task(frame)
+
+
+def create_executor(backend, workers, frame_fn, job_kwargs, pause_gate=None, cancel_token=None):
+    """Créer l'exécuteur du backend demandé
+
+    Retourne (executor, task) où `task(frame)` est la fonction à soumettre: avec le
+    backend PROCESS, seuls les noms de frames traversent la frontière entre processus.
+    Avec `pause_gate`, chaque worker attend la porte avant de démarrer une frame; avec
+    `cancel_token`, la fonction de frame reçoit `cancel_event` pour ses points de contrôle."""
+    if backend == "PROCESS":
+        gate_event = pause_gate.process_event() if pause_gate is not None else None
+        cancel_event = cancel_token.process_event() if cancel_token is not None else None
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process_worker,
+            initargs=(frame_fn, job_kwargs, gate_event, cancel_event)
+        )
+        executor.gate_event = gate_event  # Rendu à la porte quand le pool est arrêté
+        executor.cancel_event = cancel_event  # Rendu au CancelToken quand le pool est arrêté
+        return executor, _run_process_frame
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    cancel_event = cancel_token.event if cancel_token is not None else None
+    if cancel_event is not None:
+        task = partial(frame_fn, cancel_event=cancel_event, **job_kwargs)
+    else:
+        task = partial(frame_fn, **job_kwargs)
+    if pause_gate is not None or cancel_event is not None:
+        task = partial(_run_thread_frame, pause_gate, cancel_event, task)
+    return executor, task
+
+
+class GilProbe:
+    """Mesurer l'utilisation CPU réelle du processus pendant un lot traité en threads
+
+    Si des threads occupés n'arrivent pas à utiliser une fraction raisonnable des cœurs
+    qu'ils devraient occuper, le travail Python/numpy est sérialisé par le GIL."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.process = psutil.Process(os.getpid())
+        self.start_wall = time.time()
+        times = self.process.cpu_times()
+        self.start_cpu = times.user + times.system
+
+    def utilisation(self):
+        """Fraction des cœurs attendus effectivement utilisés depuis le début de la mesure"""
+        wall = time.time() - self.start_wall
+        times = self.process.cpu_times()
+        cpu = times.user + times.system - self.start_cpu
+        expected_cores = max(1, min(self.workers, multiprocessing.cpu_count()))
+        if wall <= 0:
+            return 1.0
+        return (cpu / wall) / expected_cores
+
+    def choose_backend(self):
+        """Backend conseillé d'après la mesure: PROCESS si les threads sont bridés par le GIL"""
+        if self.workers < 2:
+            return "THREAD"
+        return "PROCESS" if self.utilisation() < GIL_BOUND_UTILISATION else "THREAD"
+
+
+class FrameScheduler:
+    """Pool de workers unique, alimenté en continu par une file de frames
+
+    Le nombre de frames en cours est borné (`max_pending`) pour limiter la mémoire, et
+    une frame est soumise dès qu'une autre se termine: aucun worker n'attend la plus
+    lente d'un lot. Les résultats sont rendus dans l'ordre de fin, pas de soumission.
+    Avec `pause_gate` (PauseGate), les workers s'arrêtent entre deux frames pendant une pause.
+    `frame_fn` accepte `cancel_event`: `cancel()` interrompt aussi les frames en cours."""
+
+    def __init__(self, frame_fn, job_kwargs, backend="AUTO", workers=None, max_workers=None, max_pending=None, log_callback=None, pause_gate=None):
+        self.frame_fn = frame_fn
+        self.job_kwargs = job_kwargs
+        self.log_callback = log_callback
+        self.pause_gate = pause_gate
+        self.cancel_token = CancelToken()
+        self.backend = (backend or "AUTO").upper()
+        self.active_backend = "THREAD" if self.backend == "AUTO" else self.backend
+        self.requested_workers = workers
+        self.max_workers = max_workers
+        self.workers = self._worker_count(self.active_backend)
+        self.max_pending = max_pending or self.workers * 2
+        self.queue = collections.deque()
+        self.pending = {}  # future -> frame
+        self.submitted_at = {}  # frame -> heure de soumission (attente en file)
+        self.retired_executors = []
+        self.executor, self.task = create_executor(self.active_backend, self.workers, frame_fn, job_kwargs, pause_gate, self.cancel_token)
+        # Mode AUTO: mesurer le GIL sur les premières frames traitées en threads
+        self.gil_probe = GilProbe(self.workers) if self.backend == "AUTO" else None
+        self.calibration_frames = self.workers
+        self.completed_count = 0
+
+    def _worker_count(self, backend):
+        """Nombre de workers pour un backend, plafonné par `max_workers` (ex: nombre de frames)"""
+        if self.requested_workers:
+            workers = self.requested_workers
+        elif backend == "PROCESS":
+            workers = get_optimal_process_count()
+        else:
+            workers = get_optimal_thread_count()
+        if self.max_workers:
+            workers = min(workers, self.max_workers)
+        return max(1, workers)
+
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def submit(self, frame):
+        """Ajouter une frame à la file; elle part dès qu'une place se libère dans le pool"""
+        self.submitted_at[frame] = time.time()
+        self.queue.append(frame)
+        self._fill()
+
+    def _fill(self):
+        while self.queue and len(self.pending) < self.max_pending:
+            frame = self.queue.popleft()
+            self.pending[self.executor.submit(self.task, frame)] = frame
+
+    @property
+    def outstanding(self):
+        """Nombre de frames en file ou en cours de traitement"""
+        return len(self.queue) + len(self.pending)
+
+    def queue_wait(self, frame, started):
+        """Temps passé en file par une frame avant qu'un worker ne la démarre"""
+        submitted = self.submitted_at.pop(frame, None)
+        if submitted is None or started is None:
+            return None
+        return max(0.0, started - submitted)
+
+    def completed(self, timeout=None):
+        """Attendre au moins une frame terminée (ou `timeout`) et retourner
+        [(frame, résultat, exception)] dans l'ordre de fin"""
+        if not self.pending:
+            return []
+        done, _ = concurrent.futures.wait(self.pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+        finished = []
+        for future in done:
+            frame = self.pending.pop(future)
+            if future.cancelled():
+                continue
+            error = future.exception()
+            finished.append((frame, None if error else future.result(), error))
+        self.completed_count += len(finished)
+        self._calibrate()
+        self._fill()
+        return finished
+
+    def results(self):
+        """Générateur de (frame, résultat, exception) jusqu'à épuisement de la file"""
+        while self.pending or self.queue:
+            for item in self.completed():
+                yield item
+
+    def _calibrate(self):
+        """Mode AUTO: après les premières frames, passer en processus si les threads sont bridés par le GIL"""
+        if self.gil_probe is None or self.completed_count < self.calibration_frames:
+            return
+        if self.pause_gate is not None and self.pause_gate.paused:
+            # Workers à l'arrêt: la mesure n'aurait pas de sens, recommencer après la reprise
+            self.gil_probe = GilProbe(self.workers)
+            self.calibration_frames = self.completed_count + self.workers
+            return
+        chosen_backend = self.gil_probe.choose_backend()
+        self.log(f"📊 Thread CPU utilisation {self.gil_probe.utilisation():.0%} of expected cores -> {chosen_backend.lower()} backend")
+        self.gil_probe = None
+        if chosen_backend == self.active_backend or not self.queue:
+            return
+        # Les frames déjà soumises finissent sur l'ancien pool, les suivantes partent sur le nouveau
+        self.retired_executors.append(self.executor)
+        self.executor.shutdown(wait=False)
+        self.active_backend = chosen_backend
+        self.workers = self._worker_count(chosen_backend)
+        self.max_pending = max(self.max_pending, self.workers * 2)
+        self.executor, self.task = create_executor(chosen_backend, self.workers, self.frame_fn, self.job_kwargs, self.pause_gate, self.cancel_token)
+        self.log(f"📊 Switched to {self.workers} process workers to escape the GIL")
+
+    def cancel(self):
+        """Annuler les frames en file et celles qui n'ont pas encore démarré; les frames en cours
+        s'arrêtent à leur prochain point de contrôle (FrameCancelled, voir `drain()`)"""
+        self.queue.clear()
+        self.gil_probe = None
+        self.cancel_token.cancel()
+        for future in list(self.pending):
+            if future.cancel():
+                del self.pending[future]
+
+    def drain(self):
+        """Après `cancel()`: attendre les frames en cours et retourner [(frame, résultat, exception)]
+
+        Une frame qui a terminé son écriture avant son point de contrôle est rendue avec son
+        résultat; les autres avec FrameCancelled."""
+        if not self.pending:
+            return []
+        concurrent.futures.wait(self.pending)
+        finished = []
+        for future, frame in self.pending.items():
+            if future.cancelled():
+                continue
+            error = future.exception()
+            finished.append((frame, None if error else future.result(), error))
+        self.pending.clear()
+        return finished
+
+    def shutdown(self, wait=True):
+        """Arrêter le pool (les frames non démarrées sont annulées)"""
+        self.queue.clear()
+        for executor in self.retired_executors + [self.executor]:
+            executor.shutdown(wait=wait, cancel_futures=True)
+            if self.pause_gate is not None and getattr(executor, "gate_event", None) is not None:
+                self.pause_gate.release_process_event(executor.gate_event)
+            if getattr(executor, "cancel_event", None) is not None:
+                self.cancel_token.release_process_event(executor.cancel_event)
+        self.retired_executors = []
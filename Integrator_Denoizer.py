@@ -3,36 +3,11 @@ import os
 # import OpenEXR
 # import Imath
 import OpenImageIO as oiio
-import concurrent.futures
-from functools import partial
 import multiprocessing
 import time
 import psutil
-
-def get_optimal_thread_count():
-    """Déterminer le nombre optimal de threads pour le système actuel avec optimisations"""
-    cpu_count = multiprocessing.cpu_count()
-    physical_cores = psutil.cpu_count(logical=False)
-    if not physical_cores:
-        physical_cores = max(1, cpu_count // 2)
-    
-    # Obtenir la mémoire disponible pour ajuster le nombre de threads
-    try:
-        memory_gb = psutil.virtual_memory().available / (1024**3)
-        # Limiter les threads si la mémoire est faible (moins de 8GB disponibles)
-        if memory_gb < 8:
-            max_threads_by_memory = max(2, int(memory_gb / 2))  # 1 thread par 2GB
-        else:
-            max_threads_by_memory = physical_cores * 3
-    except:
-        max_threads_by_memory = physical_cores * 2
-    
-    # Pour les opérations I/O bound comme la fusion EXR, plus de threads peut aider
-    # mais on limite selon la mémoire disponible
-    optimal_threads = min(physical_cores * 3, cpu_count, max_threads_by_memory)
-    
-    # Minimum de 2 threads, maximum de 16 pour éviter la surcharge
-    return max(2, min(optimal_threads, 16))
+from FramePool import FrameScheduler, FrameEvent, FrameCancelled, STOP_POLL_INTERVAL, check_cancelled, file_size, format_frame_list
+from ExrIO import ExrSource, apply_channel_formats, write_pixels, header_fingerprint, ChannelPlan, cached_channel_plan
 
 def set_high_priority():
     """Increase process priority to maximize CPU usage"""
@@ -84,11 +59,93 @@ def get_compression(compression_mode, compression_level=None):
         
     return compression, compression_level
 
-def process_integrator_frame(frame, input_folder, integrator_dir, selected_integrators, compression_mode, compression_level=None, log_callback=None):
-    """Traitement optimisé d'une seule frame pour l'extraction d'intégrateurs"""
+def build_integrator_plan(source, selected_integrators, pixel_type="FLOAT"):
+    """Calculer les canaux de sortie INTEGRATOR (alpha puis intégrateurs choisis) à partir de l'en-tête d'entrée"""
+    all_channels = source.channelnames
+    messages = []
+
+    # Canal de sortie -> (source, index du canal dans le fichier d'entrée)
+    output_channels = {}
+
+    # Ajouter automatiquement le canal alpha s'il existe (A ou a)
+    if 'A' in all_channels:
+        output_channels['A'] = (0, all_channels.index('A'))
+        messages.append("✅ Ajouté le canal Alpha (A) depuis l'input pour {frame}")
+    
+    # Chercher également le canal 'a' qui est souvent utilisé comme alpha
+    if 'a' in all_channels:
+        output_channels['a'] = (0, all_channels.index('a'))
+        messages.append("✅ Ajouté le canal alpha (a) depuis l'input pour {frame}")
+
+    for selected_aov in selected_integrators:
+        # Ne pas traiter 'a' comme un intégrateur s'il a déjà été extrait comme alpha
+        if selected_aov == 'a' and 'a' in output_channels:
+            continue
+            
+        found_channels = []
+        for ch_idx, ch in enumerate(all_channels):
+            if ch == selected_aov or ch.startswith(selected_aov + '.'):
+                output_channels[ch] = (0, ch_idx)
+                found_channels.append(ch)
+                messages.append(f"✅ Trouvé {ch} pour {selected_aov} dans {{frame}}")
+
+        if not found_channels:
+            messages.append(f"⚠️ AOV '{selected_aov}' manquant dans {{frame}}")
+
+    return ChannelPlan.from_layout(output_channels, [source], pixel_type, messages)
+
+def integrator_plan(source, selected_integrators, pixel_type="FLOAT"):
+    """Plan INTEGRATOR d'une source d'entrée, partagé par toutes les frames de même en-tête"""
+    plan_key = ("integrator", header_fingerprint(source), tuple(selected_integrators), pixel_type)
+    return cached_channel_plan(plan_key, lambda: build_integrator_plan(source, selected_integrators, pixel_type))
+
+def integrator_output_name(frame):
+    """Nom du fichier INTEGRATOR d'une frame: <base>_INTEGRATOR.<numéro>.exr"""
+    filename_no_ext = os.path.splitext(frame)[0]
+    if '.' in filename_no_ext:
+        base_name, frame_number = filename_no_ext.rsplit('.', 1)
+        return f"{base_name}_INTEGRATOR.{frame_number}.exr"
+    return f"{filename_no_ext}_INTEGRATOR.exr"
+
+def write_integrator_frame(frame, integrator_dir, plan, pixels, compression_mode, compression_level=None, cancel_event=None):
+    """Écrire le buffer INTEGRATOR d'une frame. Retourne (succès, chemin ou message d'erreur)"""
+    height, width = pixels.shape[:2]
+
+    # Créer une nouvelle spécification d'image optimisée pour la sortie
+    out_spec = oiio.ImageSpec(width, height, len(plan.channels), oiio.FLOAT)
+    out_spec.channelnames = list(plan.channels)
+    apply_channel_formats(out_spec, plan.formats)
+    
+    # Configurer la compression optimisée
+    compression, level = get_compression(compression_mode, compression_level)
+    out_spec.attribute("compression", compression)
+    if level is not None and compression in ["dwaa", "dwab"]:
+        out_spec.attribute("compressionlevel", level)
+    
+    # Attributs supplémentaires pour optimiser les performances
+    out_spec.attribute("oiio:ColorSpace", "Linear")
+    out_spec.attribute("openexr:lineOrder", "increasingY")
+    
+    # Optimiser pour les écritures parallèles
+    if compression in ["dwaa", "dwab"]:
+        out_spec.attribute("openexr:dwaCompressionLevel", level if level else 45)
+
+    output_path = os.path.join(integrator_dir, integrator_output_name(frame))
+    success, error_msg = write_pixels(output_path, out_spec, pixels, cancel_event)
+    if not success:
+        return False, f"{output_path} ({error_msg})"
+    return True, output_path
+
+def process_integrator_frame(frame, input_folder, integrator_dir, selected_integrators, compression_mode, compression_level=None, log_callback=None, pixel_type="FLOAT", cancel_event=None):
+    """Traitement optimisé d'une seule frame pour l'extraction d'intégrateurs
+
+    `cancel_event` est vérifié avant la lecture, avant la compression et pendant l'écriture (FrameCancelled).
+    Retourne (succès, messages, statistiques: octets lus/écrits et durées par étape)."""
     messages = []
     result = False
     start_time = time.time()
+    stats = {"bytes_read": 0, "bytes_written": 0, "timings": {}, "started": start_time}
+    timings = stats["timings"]
     
     def local_log(msg):
         if log_callback:
@@ -98,372 +155,318 @@ def process_integrator_frame(frame, input_folder, integrator_dir, selected_integ
     try:
         input_exr = os.path.join(input_folder, frame)
         
-        # Utiliser ImageBuf pour lire le fichier complet avec optimisations
-        buf = oiio.ImageBuf(input_exr)
-        if buf.has_error:
-            local_log(f"❌ Impossible d'ouvrir {input_exr}: {buf.geterror()}")
-            return result, messages
+        # Ouvrir le fichier une seule fois: seules les plages de canaux utiles seront décodées
+        try:
+            source = ExrSource(input_exr)
+            timings["open"] = time.time() - start_time
+        except IOError as e:
+            local_log(f"❌ Impossible d'ouvrir {input_exr}: {e}")
+            return result, messages, stats
             
-        # Obtenir les informations de l'image
-        spec = buf.spec()
-        width, height = spec.width, spec.height
-        size = (width, height)
-        all_channels = spec.channelnames
-        
-        # Initialiser le dictionnaire pour les canaux à extraire
-        output_channels = {}
-        import numpy as np
+        with source:
+            # Plan de canaux: calculé sur la première frame, réutilisé tant que l'en-tête est identique
+            plan_start = time.time()
+            plan = integrator_plan(source, selected_integrators, pixel_type)
+            for msg in plan.frame_messages(frame):
+                local_log(msg)
 
-        # Ajouter automatiquement le canal alpha s'il existe (A ou a)
-        if 'A' in all_channels:
-            try:
-                alpha_idx = all_channels.index('A')
-                # Extraire le canal alpha avec optimisations
-                alpha_buf = oiio.ImageBufAlgo.channels(buf, (alpha_idx,))
-                if alpha_buf and not alpha_buf.has_error:
-                    pixels = alpha_buf.get_pixels(oiio.FLOAT)
-                    if pixels is not None:
-                        # S'assurer que les données sont contiguës pour de meilleures performances
-                        if isinstance(pixels, np.ndarray) and not pixels.flags['C_CONTIGUOUS']:
-                            pixels = np.ascontiguousarray(pixels)
-                        output_channels['A'] = pixels
-                        local_log(f"✅ Ajouté le canal Alpha (A) depuis l'input pour {frame}")
-                    else:
-                        local_log(f"⚠️ Could not read Alpha channel (A) data")
-                else:
-                    local_log(f"⚠️ Error creating Alpha channel buffer")
-            except Exception as e:
-                local_log(f"⚠️ Error extracting Alpha channel (A): {e}")
-        
-        # Chercher également le canal 'a' qui est souvent utilisé comme alpha
-        if 'a' in all_channels:
-            try:
-                alpha_idx = all_channels.index('a')
-                # Extraire le canal alpha avec optimisations
-                alpha_buf = oiio.ImageBufAlgo.channels(buf, (alpha_idx,))
-                if alpha_buf and not alpha_buf.has_error:
-                    pixels = alpha_buf.get_pixels(oiio.FLOAT)
-                    if pixels is not None:
-                        # S'assurer que les données sont contiguës pour de meilleures performances
-                        if isinstance(pixels, np.ndarray) and not pixels.flags['C_CONTIGUOUS']:
-                            pixels = np.ascontiguousarray(pixels)
-                        output_channels['a'] = pixels
-                        local_log(f"✅ Ajouté le canal alpha (a) depuis l'input pour {frame}")
-                    else:
-                        local_log(f"⚠️ Could not read alpha channel (a) data")
-                else:
-                    local_log(f"⚠️ Error creating alpha channel buffer")
-            except Exception as e:
-                local_log(f"⚠️ Error extracting alpha channel (a): {e}")
-
-        for selected_aov in selected_integrators:
-            # Ne pas traiter 'a' comme un intégrateur s'il a déjà été extrait comme alpha
-            if selected_aov == 'a' and 'a' in output_channels:
-                continue
-                
-            found_channels = []
-            for ch_idx, ch in enumerate(all_channels):
-                if ch == selected_aov or ch.startswith(selected_aov + '.'):
-                    try:
-                        # Extraire le canal avec optimisations
-                        channel_buf = oiio.ImageBufAlgo.channels(buf, (ch_idx,))
-                        if channel_buf and not channel_buf.has_error:
-                            pixels = channel_buf.get_pixels(oiio.FLOAT)
-                            if pixels is not None:
-                                # S'assurer que les données sont contiguës pour de meilleures performances
-                                if isinstance(pixels, np.ndarray) and not pixels.flags['C_CONTIGUOUS']:
-                                    pixels = np.ascontiguousarray(pixels)
-                                output_channels[ch] = pixels
-                                found_channels.append(ch)
-                                local_log(f"✅ Trouvé {ch} pour {selected_aov} dans {frame}")
-                            else:
-                                local_log(f"⚠️ Could not read data for channel {ch}")
-                        else:
-                            local_log(f"⚠️ Error creating buffer for channel {ch}")
-                    except Exception as e:
-                        local_log(f"⚠️ Error extracting channel {ch}: {e}")
-                        continue
-
-            if not found_channels:
-                local_log(f"⚠️ AOV '{selected_aov}' manquant dans {frame}")
-
-        if not output_channels:
-            local_log(f"⚠️ Aucun canal valide trouvé pour {frame}")
-            return result, messages
-
-        # Créer une nouvelle spécification d'image optimisée pour la sortie
-        out_spec = oiio.ImageSpec(width, height, len(output_channels), oiio.FLOAT)
-        out_spec.channelnames = list(output_channels.keys())
-        
-        # Configurer la compression optimisée
-        compression, level = get_compression(compression_mode, compression_level)
-        out_spec.attribute("compression", compression)
-        if level is not None and compression in ["dwaa", "dwab"]:
-            out_spec.attribute("compressionlevel", level)
-        
-        # Optimisations pour les performances d'écriture
-        out_spec.tile_width = 64
-        out_spec.tile_height = 64
-        
-        # Attributs supplémentaires pour optimiser les performances
-        out_spec.attribute("oiio:ColorSpace", "Linear")
-        out_spec.attribute("openexr:lineOrder", "increasingY")
-        
-        # Optimiser pour les écritures parallèles
-        if compression in ["dwaa", "dwab"]:
-            out_spec.attribute("openexr:dwaCompressionLevel", level if level else 45)
-
-        filename_no_ext = os.path.splitext(frame)[0]
-        if '.' in filename_no_ext:
-            base_name, frame_number = filename_no_ext.rsplit('.', 1)
-            output_filename = f"{base_name}_INTEGRATOR.{frame_number}.exr"
-        else:
-            base_name = filename_no_ext
-            output_filename = f"{base_name}_INTEGRATOR.exr"
+            if not plan.channels:
+                local_log(f"⚠️ Aucun canal valide trouvé pour {frame}")
+                return result, messages, stats
 
-        output_path = os.path.join(integrator_dir, output_filename)
+            # Décoder les canaux directement dans le buffer HxWxC de sortie
+            pixels = plan.allocate(source.size)
+            timings["plan"] = time.time() - plan_start
+            decode_start = time.time()
+            plan.read([source], pixels, cancel_event)
+            timings["decode:input"] = time.time() - decode_start
+        stats["bytes_read"] = file_size(input_exr)
+        timings["read"] = time.time() - start_time
+        write_start = time.time()
 
-        # Créer un buffer d'image pour la sortie
-        out_buf = oiio.ImageBuf(out_spec)
-        
-        # Organiser les données des pixels dans l'ordre des canaux avec optimisations
-        all_pixels = []
-        
-        for ch in out_spec.channelnames:
-            if ch in output_channels:
-                pixel_data = output_channels[ch]
-                # Vérifier et corriger la forme des données avec optimisations
-                if isinstance(pixel_data, np.ndarray):
-                    # Si les données ont une dimension supplémentaire, la supprimer
-                    if pixel_data.ndim == 4 and pixel_data.shape[2] == 1:
-                        pixel_data = pixel_data.squeeze(axis=2)  # Supprimer la dimension de taille 1
-                    elif pixel_data.ndim == 3 and pixel_data.shape[2] == 1:
-                        pixel_data = pixel_data.squeeze(axis=2)  # Supprimer la dimension de taille 1
-                    
-                    # S'assurer que les données sont dans le bon format et contiguës
-                    if pixel_data.dtype != np.float32:
-                        pixel_data = pixel_data.astype(np.float32)
-                    if not pixel_data.flags['C_CONTIGUOUS']:
-                        pixel_data = np.ascontiguousarray(pixel_data)
-                        
-                all_pixels.append(pixel_data)
-            else:
-                # Créer un canal vide si manquant avec le bon type
-                empty_channel = np.zeros((height, width), dtype=np.float32)
-                all_pixels.append(empty_channel)
-        
-        # Combiner tous les canaux en un seul tableau avec optimisations
-        if all_pixels:
-            # Empiler les canaux le long de la dimension des canaux
-            combined_pixels = np.stack(all_pixels, axis=-1)
-            
-            # S'assurer que le tableau final est contiguë pour de meilleures performances d'écriture
-            if not combined_pixels.flags['C_CONTIGUOUS']:
-                combined_pixels = np.ascontiguousarray(combined_pixels)
-                
-            out_buf.set_pixels(oiio.ROI(), combined_pixels)
-
-        # Écrire le fichier de sortie avec optimisations
-        success = out_buf.write(output_path)
+        # Écrire directement le buffer de sortie, sans ImageBuf intermédiaire
+        check_cancelled(cancel_event, frame)
+        success, output_path = write_integrator_frame(frame, integrator_dir, plan, pixels, compression_mode, compression_level, cancel_event)
+        timings["write"] = time.time() - write_start
         if not success:
             local_log(f"❌ Erreur lors de l'écriture: {output_path}")
-            return result, messages
+            return result, messages, stats
 
         # Calculer et afficher les statistiques de performance
         elapsed_time = time.time() - start_time
-        try:
-            file_size = os.path.getsize(output_path) / (1024 * 1024)  # Taille en MB
-            local_log(f"✅ Integrator généré : {output_path} ({file_size:.1f}MB en {elapsed_time:.2f}s)")
-        except:
+        stats["bytes_written"] = file_size(output_path)
+        if stats["bytes_written"]:
+            local_log(f"✅ Integrator généré : {output_path} ({stats['bytes_written'] / (1024 * 1024):.1f}MB en {elapsed_time:.2f}s)")
+        else:
             local_log(f"✅ Integrator généré : {output_path} en {elapsed_time:.2f}s")
         
         result = True
 
+    except FrameCancelled:
+        raise
     except Exception as e:
         local_log(f"❌ Error generating Integrator for {frame} : {e}")
-    
-    return result, messages
 
-def run_integrator_generate(input_folder, output_folder, selected_integrators, compression_mode="DWAB", compression_level=None, log_callback=None, progress_callback=None, stop_check=None, use_gpu=False):
-    """Extract selected integrators from EXR files with optimized performance"""
-    
-    # Tenter de définir une priorité élevée pour ce processus
-    priority_set = set_high_priority()
-    
-    # Optimiser l'utilisation de la mémoire
-    memory_optimized = optimize_memory_usage()
-    
-    # Configuration GPU si activée
-    gpu_acceleration = False
-    if use_gpu:
-        try:
-            # Configurer OpenImageIO pour utiliser le GPU si possible
-            oiio.attribute("gpu", 1)
-            oiio.attribute("use_gpu", True)
-            gpu_acceleration = True
-            if log_callback:
-                log_callback("🚀 GPU acceleration enabled for image processing")
-        except Exception as e:
-            if log_callback:
-                log_callback(f"⚠️ GPU acceleration requested but failed to initialize: {str(e)}")
-                log_callback("ℹ️ Falling back to CPU processing")
-    
-    if log_callback:
-        log_callback("🔄 Starting optimized integrator generation...")
+    timings["total"] = time.time() - start_time
+    return result, messages, stats
+
+class IntegratorSession:
+    """Séparation des intégrateurs dans son propre pool, suivie par `poll()` depuis le thread appelant
+
+    La séparation ne lit que les EXR d'entrée: elle peut démarrer en même temps que le
+    débruitage, avec un nombre de workers limité (`workers`) pour laisser le CPU à denoise_batch."""
+
+    def __init__(self, input_folder, output_folder, selected_integrators, compression_mode="DWAB", compression_level=None, log_callback=None, progress_callback=None, stop_check=None, use_gpu=False, pixel_type="FLOAT", backend="AUTO", workers=None, max_pending=None, high_priority=True, frame_list=None, event_callback=None, pause_gate=None):
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+        # event_callback(FrameEvent): appelé pour chaque fichier terminé (progression, temps restant, manifeste)
+        self.event_callback = event_callback
+        self.stop_check = stop_check
+        self.total_success = 0
+        self.files_processed = 0
+        # Bilan exact d'un arrêt: fichiers écrits, fichiers interrompus en cours de traitement
+        self.completed_frames = []
+        self.cancelled_frames = []
+        self.stopped = False
+        self.scheduler = None
+
+        # Tenter de définir une priorité élevée pour ce processus (pas en tâche de fond)
+        priority_set = set_high_priority() if high_priority else False
+        
+        # Optimiser l'utilisation de la mémoire
+        memory_optimized = optimize_memory_usage()
+        
+        # Configuration GPU si activée
+        gpu_acceleration = False
+        if use_gpu:
+            try:
+                # Configurer OpenImageIO pour utiliser le GPU si possible
+                oiio.attribute("gpu", 1)
+                oiio.attribute("use_gpu", True)
+                gpu_acceleration = True
+                self.log("🚀 GPU acceleration enabled for image processing")
+            except Exception as e:
+                self.log(f"⚠️ GPU acceleration requested but failed to initialize: {str(e)}")
+                self.log("ℹ️ Falling back to CPU processing")
+        
+        self.log("🔄 Starting optimized integrator generation...")
         if priority_set:
-            log_callback("⚡ High priority mode enabled for faster processing")
+            self.log("⚡ High priority mode enabled for faster processing")
         if memory_optimized:
-            log_callback("🧠 Memory usage optimized for better performance")
+            self.log("🧠 Memory usage optimized for better performance")
         if gpu_acceleration:
-            log_callback("🎮 Using GPU acceleration for faster image operations")
+            self.log("🎮 Using GPU acceleration for faster image operations")
         if compression_mode in ["DWAA", "DWAB"] and compression_level is not None:
-            log_callback(f"📊 Using compression level: {compression_level} for {compression_mode} compression")
+            self.log(f"📊 Using compression level: {compression_level} for {compression_mode} compression")
+        self.log(f"🎚️ Pixel type: {pixel_type}")
 
-    # Créer le répertoire de sortie s'il n'existe pas
-    os.makedirs(output_folder, exist_ok=True)
+        # Créer le répertoire de sortie s'il n'existe pas
+        os.makedirs(output_folder, exist_ok=True)
 
-    # Obtenir la liste des fichiers EXR dans le dossier d'entrée
-    exr_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.exr')]
-    if not exr_files:
-        if log_callback:
-            log_callback("❌ No EXR files found in input folder")
-        return False
+        # Obtenir la liste des fichiers EXR dans le dossier d'entrée (ou seulement ceux de frame_list)
+        self.exr_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.exr')]
+        if frame_list is not None:
+            wanted = set(frame_list)
+            self.exr_files = [f for f in self.exr_files if f in wanted]
+        self.total_files = len(self.exr_files)
+        if not self.exr_files:
+            self.log("❌ No EXR files found in input folder")
+            return
 
-    # Déterminer le nombre optimal de workers avec optimisations
-    optimal_workers = get_optimal_thread_count()
-    # Ajuster selon le nombre de fichiers disponibles
-    optimal_workers = min(optimal_workers, len(exr_files))
-    
-    if log_callback:
-        log_callback(f"📊 Using {optimal_workers} optimized parallel workers for processing")
+        # Paramètres communs à toutes les frames: transmis une seule fois à chaque worker
+        job_kwargs = {
+            "input_folder": input_folder,
+            "integrator_dir": output_folder,
+            "selected_integrators": selected_integrators,
+            "compression_mode": compression_mode,
+            "compression_level": compression_level,
+            "log_callback": None,  # On gère les logs nous-mêmes pour éviter les concurrences
+            "pixel_type": pixel_type,
+        }
+
+        # Pool unique alimenté en continu, plafonné au nombre de fichiers disponibles.
+        # En AUTO, les premiers fichiers tournent en threads pendant qu'on mesure le GIL.
+        self.scheduler = FrameScheduler(process_integrator_frame, job_kwargs, backend=backend, workers=workers,
+                                        max_workers=len(self.exr_files), max_pending=max_pending,
+                                        log_callback=log_callback, pause_gate=pause_gate)
         
-        # Afficher des informations sur les ressources système
-        try:
-            memory_gb = psutil.virtual_memory().available / (1024**3)
-            cpu_count = multiprocessing.cpu_count()
-            log_callback(f"💻 System resources: {cpu_count} CPU cores, {memory_gb:.1f}GB available memory")
-        except:
-            pass
+        self.log(f"📊 Using {self.scheduler.workers} optimized parallel workers for processing ({self.scheduler.active_backend.lower()} backend{', auto' if self.scheduler.gil_probe else ''})")
+        if self.log_callback:
+            # Afficher des informations sur les ressources système
+            try:
+                memory_gb = psutil.virtual_memory().available / (1024**3)
+                cpu_count = multiprocessing.cpu_count()
+                self.log(f"💻 System resources: {cpu_count} CPU cores, {memory_gb:.1f}GB available memory")
+            except:
+                pass
+        self.log(f"📦 Streaming {self.total_files} files with at most {self.scheduler.max_pending} in flight")
+        self.start_time = time.time()
 
-    # Traiter les fichiers en parallèle avec optimisations
-    total_success = 0
-    total_files = len(exr_files)
-    files_processed = 0
-    start_time = time.time()
-    
-    # Diviser les fichiers en batches pour optimiser la mémoire
-    batch_size = max(1, min(optimal_workers * 2, 10))  # Traiter par petits batches
-    batches = [exr_files[i:i + batch_size] for i in range(0, len(exr_files), batch_size)]
-    
-    if log_callback:
-        log_callback(f"📦 Processing {total_files} files in {len(batches)} batches of {batch_size} files each")
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
 
-    for batch_index, batch in enumerate(batches):
-        if log_callback:
-            log_callback(f"🔄 Processing batch {batch_index + 1}/{len(batches)} ({len(batch)} files)")
-        
-        batch_start_time = time.time()
+    def start(self):
+        """Mettre tous les fichiers en file (seul le nom du fichier est transmis aux workers)"""
+        for frame in self.exr_files:
+            self.scheduler.submit(frame)
+
+    @property
+    def outstanding(self):
+        """Nombre de fichiers pas encore traités"""
+        return self.scheduler.outstanding if self.scheduler else 0
+
+    def record(self, frame, outcome, error):
+        """Prendre en compte un fichier terminé (logs, bilan, FrameEvent). Retourne le pourcentage de progression"""
+        if isinstance(error, FrameCancelled):
+            # Interrompu par l'arrêt: rien n'a été écrit, le fichier sera refait au prochain run
+            self.cancelled_frames.append(frame)
+            return None
+        result = False
+        stats = {}
+        if error is not None:
+            self.log(f"❌ Error processing file {frame}: {str(error)}")
+        else:
+            result, messages, stats = outcome
+            if result:
+                self.total_success += 1
+                self.completed_frames.append(frame)
+            
+            # Logs par frame
+            if messages:
+                self.log(f"⏳ Processing file: {frame}")
+                for msg in messages:
+                    self.log(f"  {msg}")
+
+        # Attente en file avant qu'un worker ne démarre la frame
+        queue_wait = self.scheduler.queue_wait(frame, stats.get("started"))
+        if queue_wait is not None:
+            stats["timings"]["queue_wait"] = queue_wait
+
+        # Mettre à jour la progression
+        self.files_processed += 1
+        if self.event_callback:
+            self.event_callback(FrameEvent("integrator", frame, bool(result), self.files_processed, self.total_files,
+                                           stats.get("bytes_read", 0), stats.get("bytes_written", 0),
+                                           stats.get("timings", {}), time.time() - self.start_time, self.scheduler.workers))
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=optimal_workers) as executor:
-            futures = []
-            for frame in batch:
-                future = executor.submit(
-                    process_integrator_frame,
-                    frame,
-                    input_folder,
-                    output_folder,
-                    selected_integrators,
-                    compression_mode,
-                    compression_level,
-                    None  # On gère les logs nous-mêmes pour éviter les concurrences
-                )
-                futures.append((frame, future))
-
-            # Surveiller la progression du batch
-            for frame, future in futures:
-                # Check for stop request
-                if stop_check and stop_check():
-                    if log_callback:
-                        log_callback(f"🛑 Process stopped by user (at file {files_processed+1}/{total_files})")
-                    # Cancel all pending futures
-                    for _, f in futures:
-                        f.cancel()
+        if self.files_processed % max(1, self.total_files//10) == 0:  # Limiter les logs de progression
+            self.log(f"⏳ Progress: {self.files_processed}/{self.total_files} files processed")
+        return self.files_processed / self.total_files * 100
+
+    def poll(self, timeout=0):
+        """Traiter les fichiers terminés (sans attendre par défaut). Retourne False si la séparation est arrêtée"""
+        if self.stopped or self.scheduler is None:
+            return False
+        # Arrêt demandé pendant que les workers travaillent: interrompre les fichiers en cours
+        if self.stop_check and self.stop_check():
+            self.log(f"🛑 Process stopped by user (at file {self.files_processed}/{self.total_files})")
+            self.cancel()
+            return False
+        # Les résultats arrivent dans l'ordre de fin: aucun worker n'attend le fichier le plus lent
+        for frame, outcome, error in self.scheduler.completed(timeout=timeout):
+            progress_percent = self.record(frame, outcome, error)
+            if progress_percent is None:
+                continue
+
+            # Check for stop request
+            if self.stop_check and self.stop_check():
+                self.log(f"🛑 Process stopped by user (at file {self.files_processed}/{self.total_files})")
+                self.cancel()
+                return False
+            
+            if self.progress_callback:
+                should_stop = self.progress_callback(progress_percent)
+                if should_stop:
+                    self.log(f"🛑 Process stopped by progress callback")
+                    self.cancel()
                     return False
+        return True
+
+    def finish(self):
+        """Attendre les fichiers restants, fermer le pool et afficher le bilan. Retourne True si au moins un fichier a réussi"""
+        if self.scheduler is None:
+            return False
+        try:
+            # Attente par intervalles courts: un arrêt est vu sans attendre la fin d'un fichier
+            while self.outstanding and self.poll(timeout=STOP_POLL_INTERVAL):
+                pass
+        finally:
+            self.scheduler.shutdown(wait=True)
+        if self.stopped:
+            return False
 
-                try:
-                    result, messages = future.result()
-                    if result:
-                        total_success += 1
-                    
-                    # Logs par frame
-                    if log_callback and messages:
-                        log_callback(f"⏳ Processing file: {frame}")
-                        for msg in messages:
-                            log_callback(f"  {msg}")
-                except Exception as e:
-                    if log_callback:
-                        log_callback(f"❌ Error processing file {frame}: {str(e)}")
-
-                # Mettre à jour la progression
-                files_processed += 1
-                progress_percent = files_processed / total_files * 100
+        # Statistiques finales avec informations de performance
+        total_time = time.time() - self.start_time
+        total_files = self.total_files
+        total_success = self.total_success
+        
+        if self.log_callback:
+            # Calculer les statistiques de performance
+            if total_time > 0:
+                files_per_second = total_files / total_time
+                avg_time_per_file = total_time / total_files if total_files > 0 else 0
+                
+                # Formater le temps total
+                if total_time < 60:
+                    time_str = f"{total_time:.1f}s"
+                elif total_time < 3600:
+                    time_str = f"{int(total_time//60)}m {int(total_time%60)}s"
+                else:
+                    time_str = f"{int(total_time//3600)}h {int((total_time%3600)//60)}m"
                 
-                if log_callback and files_processed % max(1, total_files//10) == 0:  # Limiter les logs de progression
-                    log_callback(f"⏳ Progress: {files_processed}/{total_files} files processed")
+                self.log(f"✅ Integrator generation completed: {total_success}/{total_files} files successfully processed")
+                self.log(f"📊 Performance: {files_per_second:.2f} files/s, {avg_time_per_file:.2f}s per file, total time: {time_str}")
                 
-                if progress_callback:
-                    should_stop = progress_callback(progress_percent)
-                    if should_stop:
-                        if log_callback:
-                            log_callback(f"🛑 Process stopped by progress callback")
-                        # Cancel all pending futures
-                        for _, f in futures:
-                            f.cancel()
-                        return False
-        
-        # Statistiques par batch et optimisation mémoire
-        batch_time = time.time() - batch_start_time
-        if log_callback and len(batches) > 1:
-            log_callback(f"✅ Batch {batch_index+1}/{len(batches)} completed in {batch_time:.2f}s ({len(batch)/batch_time:.2f} frames/s)")
+                # Afficher des informations sur l'efficacité
+                if total_success == total_files:
+                    self.log(f"🎯 Perfect success rate: 100% of files processed successfully")
+                elif total_success > 0:
+                    success_rate = (total_success / total_files) * 100
+                    self.log(f"⚠️ Partial success: {success_rate:.1f}% of files processed successfully")
+                else:
+                    self.log(f"❌ No files were processed successfully")
+            else:
+                self.log(f"✅ Integrator generation completed: {total_success}/{total_files} files successfully processed")
         
-        # Optimiser la mémoire entre les batches
-        if batch_index < len(batches) - 1:  # Pas le dernier batch
-            try:
-                import gc
-                gc.collect()
-                optimize_memory_usage()
-            except:
-                pass
+        return total_success > 0
 
-    # Statistiques finales avec informations de performance
-    total_time = time.time() - start_time
-    
-    if log_callback:
-        # Calculer les statistiques de performance
-        if total_time > 0:
-            files_per_second = total_files / total_time
-            avg_time_per_file = total_time / total_files if total_files > 0 else 0
-            
-            # Formater le temps total
-            if total_time < 60:
-                time_str = f"{total_time:.1f}s"
-            elif total_time < 3600:
-                time_str = f"{int(total_time//60)}m {int(total_time%60)}s"
-            else:
-                time_str = f"{int(total_time//3600)}h {int((total_time%3600)//60)}m"
-            
-            log_callback(f"✅ Integrator generation completed: {total_success}/{total_files} files successfully processed")
-            log_callback(f"📊 Performance: {files_per_second:.2f} files/s, {avg_time_per_file:.2f}s per file, total time: {time_str}")
-            
-            # Afficher des informations sur l'efficacité
-            if total_success == total_files:
-                log_callback(f"🎯 Perfect success rate: 100% of files processed successfully")
-            elif total_success > 0:
-                success_rate = (total_success / total_files) * 100
-                log_callback(f"⚠️ Partial success: {success_rate:.1f}% of files processed successfully")
-            else:
-                log_callback(f"❌ No files were processed successfully")
-        else:
-            log_callback(f"✅ Integrator generation completed: {total_success}/{total_files} files successfully processed")
-    
-    return total_success > 0
+    def cancel(self):
+        """Arrêter la séparation: les fichiers non démarrés sont abandonnés, ceux en cours s'arrêtent
+        à leur prochain point de contrôle, puis le bilan exact est affiché"""
+        if self.stopped or self.scheduler is None:
+            self.stopped = True
+            return
+        self.stopped = True
+        outstanding = self.scheduler.outstanding
+        self.scheduler.cancel()
+        for frame, outcome, error in self.scheduler.drain():
+            self.record(frame, outcome, error)
+        if outstanding:
+            self.log(f"🛑 Integrator stopped: {len(self.completed_frames)}/{self.total_files} files written, "
+                     f"{len(self.cancelled_frames)} in-flight files cancelled (no partial files), "
+                     f"{self.total_files - self.files_processed - len(self.cancelled_frames)} not started")
+            if self.completed_frames:
+                self.log(f"✅ Completed files: {format_frame_list(self.completed_frames)}")
+
+    def close(self):
+        """Libérer le pool sans attendre les fichiers restants (arrêt ou erreur)"""
+        if self.scheduler:
+            self.cancel()
+            self.scheduler.shutdown(wait=True)
+
+
+def run_integrator_generate(input_folder, output_folder, selected_integrators, compression_mode="DWAB", compression_level=None, log_callback=None, progress_callback=None, stop_check=None, use_gpu=False, pixel_type="FLOAT", backend="AUTO", frame_list=None, event_callback=None, workers=None, pause_gate=None):
+    """Extract selected integrators from EXR files with optimized performance"""
+    session = IntegratorSession(input_folder, output_folder, selected_integrators, compression_mode,
+                                compression_level=compression_level, log_callback=log_callback,
+                                progress_callback=progress_callback, stop_check=stop_check,
+                                use_gpu=use_gpu, pixel_type=pixel_type, backend=backend, workers=workers,
+                                frame_list=frame_list, event_callback=event_callback, pause_gate=pause_gate)
+    if not session.exr_files:
+        return False
+    try:
+        session.start()
+        return session.finish()
+    finally:
+        session.close()
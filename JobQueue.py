@@ -0,0 +1,465 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import subprocess
+import multiprocessing
+from collections import deque
+import psutil
+from Pipeline import (load_user_config, add_pipeline_arguments, pipeline_options, pipeline_arguments, pipeline_command)
+from Scheduler import ResourceScheduler, machine_capacity, job_kind, job_demand, DEFAULT_DISK_MB_S
+
+# File de jobs persistante (SQLite), indépendante des onglets de l'interface:
+#   - l'interface ou la ligne de commande déposent des jobs (réglages complets d'un onglet)
+#   - un démon local les exécute, chacun dans un process du pipeline (--ui-stream), admis par
+#     l'ordonnanceur de ressources (Scheduler.py) comme en mode DENOIZE ALL
+#   - l'état (file, progression, statut, code de sortie) est dans la base: fermer l'interface
+#     ne perd rien, et un démon relancé reprend les jobs interrompus (le manifeste de reprise
+#     du dossier de sortie évite de refaire les frames déjà écrites)
+#
+# États d'un job: queued -> running -> done | failed | cancelled
+#                 cancelling: arrêt demandé pendant l'exécution
+
+JOB_STATES = ("queued", "running", "cancelling", "done", "failed", "cancelled")
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+QUEUE_NAME = "jobs.sqlite"
+
+# Boucle du démon et écriture de la progression dans la base
+POLL_INTERVAL = 1.0
+
+# Un démon dont le signe de vie est plus ancien est considéré comme arrêté
+DAEMON_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    input_path TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    options TEXT NOT NULL,
+    priority INTEGER DEFAULT 0,
+    state TEXT DEFAULT 'queued',
+    progress REAL DEFAULT 0,
+    status TEXT DEFAULT '',
+    returncode INTEGER,
+    attempts INTEGER DEFAULT 0,
+    pid INTEGER,
+    created REAL,
+    started REAL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS daemon (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    pid INTEGER,
+    host TEXT,
+    heartbeat REAL
+);
+"""
+
+
+def default_queue_dir():
+    """Dossier de la file par défaut (LOCALAPPDATA sous Windows, ~/.cache ailleurs)"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "DenoiZer", "jobs")
+
+
+class JobQueue:
+    """Accès à la base de la file (une connexion par objet, à utiliser depuis un seul thread)"""
+
+    def __init__(self, queue_dir=None):
+        self.queue_dir = queue_dir or default_queue_dir()
+        self.logs_dir = os.path.join(self.queue_dir, "logs")
+        os.makedirs(self.logs_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.queue_dir, QUEUE_NAME), timeout=30)
+        self.db.row_factory = sqlite3.Row
+        # WAL: l'interface et la ligne de commande lisent pendant que le démon écrit
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def log_path(self, job_id):
+        return os.path.join(self.logs_dir, f"job_{job_id}.log")
+
+    def submit(self, input_path, output_path, options, name=None, priority=0):
+        """Ajouter un job (paramètres de Pipeline sans les dossiers ni les callbacks). Retourne son id"""
+        cursor = self.db.execute(
+            "INSERT INTO jobs (name, input_path, output_path, options, priority, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (name or os.path.basename(os.path.normpath(input_path)), input_path, output_path,
+             json.dumps(options), priority, time.time()))
+        self.db.commit()
+        return cursor.lastrowid
+
+    def jobs(self, states=None):
+        """Jobs de la file (tous, ou seulement ceux des états donnés), par priorité puis ordre d'arrivée"""
+        query = "SELECT * FROM jobs"
+        parameters = ()
+        if states:
+            query += f" WHERE state IN ({','.join('?' * len(states))})"
+            parameters = tuple(states)
+        return [dict(row) for row in self.db.execute(query + " ORDER BY priority DESC, id", parameters)]
+
+    def job(self, job_id):
+        row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def cancel(self, job_id):
+        """Annuler un job en file, ou demander l'arrêt d'un job en cours. Retourne False si déjà terminé"""
+        cursor = self.db.execute("UPDATE jobs SET state = 'cancelled', finished = ? WHERE id = ? AND state = 'queued'", (time.time(), job_id))
+        if not cursor.rowcount:
+            cursor = self.db.execute("UPDATE jobs SET state = 'cancelling' WHERE id = ? AND state = 'running'", (job_id,))
+        self.db.commit()
+        return bool(cursor.rowcount)
+
+    def retry(self, job_id):
+        """Remettre en file un job terminé (les frames déjà écrites sont reprises par le manifeste)"""
+        cursor = self.db.execute(
+            f"UPDATE jobs SET state = 'queued', progress = 0, status = '', returncode = NULL, finished = NULL "
+            f"WHERE id = ? AND state IN ({','.join('?' * len(FINISHED_STATES))})", (job_id,) + FINISHED_STATES)
+        self.db.commit()
+        return bool(cursor.rowcount)
+
+    def claim(self, job_id, pid=None):
+        """Passer un job de queued à running (un seul démon réussit)"""
+        cursor = self.db.execute(
+            "UPDATE jobs SET state = 'running', started = ?, attempts = attempts + 1, pid = ? WHERE id = ? AND state = 'queued'",
+            (time.time(), pid, job_id))
+        self.db.commit()
+        return bool(cursor.rowcount)
+
+    def update(self, job_id, **fields):
+        if not fields:
+            return
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", tuple(fields.values()) + (job_id,))
+        self.db.commit()
+
+    def finish(self, job_id, returncode, cancelled=False):
+        state = "cancelled" if cancelled else ("done" if returncode == 0 else "failed")
+        fields = {"state": state, "returncode": returncode, "finished": time.time(), "pid": None}
+        if state == "done":
+            fields["progress"] = 100
+        self.update(job_id, **fields)
+        return state
+
+    def requeue_interrupted(self):
+        """Jobs marqués running sans démon vivant (démon arrêté, machine redémarrée): les remettre en file
+
+        Les jobs en cancelling ont été annulés par l'utilisateur: ils passent en cancelled."""
+        self.db.execute("UPDATE jobs SET state = 'cancelled', finished = ?, pid = NULL WHERE state = 'cancelling'", (time.time(),))
+        cursor = self.db.execute("UPDATE jobs SET state = 'queued', pid = NULL WHERE state = 'running'")
+        self.db.commit()
+        return cursor.rowcount
+
+    def daemon_alive(self):
+        """Vrai si un démon a donné signe de vie récemment et que son process existe"""
+        row = self.db.execute("SELECT pid, heartbeat FROM daemon WHERE id = 1").fetchone()
+        if not row or not row["pid"]:
+            return False
+        return time.time() - (row["heartbeat"] or 0) < DAEMON_TIMEOUT and psutil.pid_exists(row["pid"])
+
+    def heartbeat(self, pid=None):
+        self.db.execute("INSERT OR REPLACE INTO daemon (id, pid, host, heartbeat) VALUES (1, ?, ?, ?)",
+                        (pid, socket.gethostname(), time.time()))
+        self.db.commit()
+
+
+class RunningJob:
+    """Process du pipeline d'un job, avec le thread qui lit sa sortie"""
+
+    def __init__(self, job, command, log_path):
+        self.job = job
+        self.log_file = open(log_path, "a", encoding="utf-8")
+        self.log_file.write(f"\n=== {time.strftime('%Y-%m-%d %H:%M:%S')} {' '.join(command)}\n")
+        self.lines = deque()
+        creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        universal_newlines=True, bufsize=1, creationflags=creationflags)
+        self.reader = threading.Thread(target=self.read_output, daemon=True)
+        self.reader.start()
+        self.progress = None
+        self.status = None
+        self.stop_sent = False
+
+    def read_output(self):
+        for line in self.process.stdout:
+            self.lines.append(line)
+
+    def drain(self):
+        """Écrire les logs reçus dans le fichier du job et retenir la dernière progression / statut"""
+        while self.lines:
+            line = self.lines.popleft().strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self.log_file.write(line + "\n")
+                continue
+            kind, value = message.get("type"), message.get("value")
+            if kind == "log":
+                self.log_file.write(f"{value}\n")
+            elif kind == "error":
+                self.log_file.write(f"❌ {value[0]}: {value[1]}\n")
+            elif kind == "overall":
+                self.progress = value
+            elif kind == "status":
+                self.status = value
+        self.log_file.flush()
+
+    def stop(self):
+        if self.stop_sent:
+            return
+        self.stop_sent = True
+        try:
+            self.process.stdin.write("stop\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def finished(self):
+        return self.process.poll() is not None and not self.reader.is_alive()
+
+    def close(self):
+        self.drain()
+        self.log_file.close()
+
+
+class JobDaemon:
+    """Exécuter les jobs de la file en parallèle selon les ressources de la machine"""
+
+    def __init__(self, queue, max_jobs=0, exit_when_idle=False, log_callback=None, stop_check=None):
+        self.queue = queue
+        self.exit_when_idle = exit_when_idle
+        self.log_callback = log_callback
+        self.stop_check = stop_check
+        config = load_user_config()
+        self.capacity = machine_capacity(config.get("DISK_BANDWIDTH_MB_S", DEFAULT_DISK_MB_S))
+        self.scheduler = ResourceScheduler(self.capacity, max_jobs or config.get("MAX_PARALLEL_JOBS", 0))
+        self.running = {}  # id -> RunningJob
+        self.scheduled = set()  # jobs en file déjà connus de l'ordonnanceur
+
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def schedule_queued(self):
+        """Ajouter à l'ordonnanceur les nouveaux jobs en file; oublier ceux annulés entre-temps"""
+        queued = self.queue.jobs(["queued"])
+        queued_ids = {job["id"] for job in queued}
+        for job_id in self.scheduled - queued_ids:
+            if job_id not in self.running:
+                self.scheduler.release(job_id)
+        self.scheduled &= queued_ids | set(self.running)
+        for job in queued:
+            if job["id"] not in self.scheduled:
+                demand = job_demand(job_kind(job["input_path"], job["output_path"]), job["input_path"], self.capacity)
+                self.scheduler.add(job["id"], demand)
+                self.scheduled.add(job["id"])
+
+    def start(self, job_id, demand):
+        job = self.queue.job(job_id)
+        if not job or not self.queue.claim(job_id, os.getpid()):
+            self.scheduler.release(job_id)
+            self.scheduled.discard(job_id)
+            return
+        options = json.loads(job["options"])
+        options["max_cores"] = demand["cores"]
+        available_gb = psutil.virtual_memory().available / (1024 ** 3)
+        options["memory_fraction"] = round(min(0.75, demand["memory_gb"] / max(available_gb, 1.0)), 3)
+        command = pipeline_command() + pipeline_arguments(job["input_path"], job["output_path"], options) + ["--ui-stream"]
+        try:
+            self.running[job_id] = RunningJob(job, command, self.queue.log_path(job_id))
+        except OSError as e:
+            self.log(f"❌ Job {job_id} could not start: {str(e)}")
+            self.queue.finish(job_id, -1)
+            self.scheduler.release(job_id)
+            self.scheduled.discard(job_id)
+            return
+        self.queue.update(job_id, pid=self.running[job_id].process.pid, status="Starting")
+        self.log(f"🚀 Job {job_id} ({job['name']}) started with {self.scheduler.describe(demand)}")
+
+    def poll_running(self):
+        """Progression des jobs en cours, arrêts demandés et jobs terminés"""
+        for job_id, running in list(self.running.items()):
+            running.drain()
+            job = self.queue.job(job_id)
+            if job and job["state"] == "cancelling":
+                running.stop()
+            if running.progress is not None or running.status is not None:
+                fields = {}
+                if running.progress is not None:
+                    fields["progress"] = running.progress
+                if running.status is not None:
+                    fields["status"] = running.status
+                self.queue.update(job_id, **fields)
+                running.progress = running.status = None
+            if not running.finished:
+                continue
+            running.close()
+            state = self.queue.finish(job_id, running.process.returncode, cancelled=running.stop_sent)
+            elapsed = self.scheduler.release(job_id)
+            self.scheduled.discard(job_id)
+            del self.running[job_id]
+            self.log(f"{'✅' if state == 'done' else '❌'} Job {job_id} ({running.job['name']}) {state} in {elapsed:.0f}s")
+
+    def run(self):
+        if self.queue.daemon_alive():
+            self.log("ℹ️ A job daemon is already running for this queue")
+            return False
+        requeued = self.queue.requeue_interrupted()
+        if requeued:
+            self.log(f"♻️ {requeued} interrupted jobs queued again")
+        self.log(f"🗂️ Job daemon watching {self.queue.queue_dir} ({self.capacity['cores']} cores, {self.capacity['memory_gb']:.0f}GB RAM)")
+        try:
+            while not (self.stop_check and self.stop_check()):
+                self.queue.heartbeat(os.getpid())
+                self.schedule_queued()
+                for job_id, demand in self.scheduler.admit():
+                    self.start(job_id, demand)
+                self.poll_running()
+                if self.exit_when_idle and not self.running and not self.queue.jobs(["queued"]):
+                    break
+                time.sleep(POLL_INTERVAL)
+        finally:
+            # Arrêt du démon: les jobs en cours s'arrêtent proprement et seront repris au prochain démarrage,
+            # sauf ceux que l'utilisateur avait déjà annulés
+            cancelled = [job_id for job_id, running in self.running.items() if running.stop_sent]
+            for running in self.running.values():
+                running.stop()
+            for running in self.running.values():
+                running.process.wait()
+                running.close()
+            for job_id in cancelled:
+                self.queue.finish(job_id, self.running[job_id].process.returncode, cancelled=True)
+            if self.running:
+                self.queue.requeue_interrupted()
+            self.queue.heartbeat(None)
+        return True
+
+
+def daemon_command(queue_dir=None):
+    """Commande du démon (script Python ou exécutable figé de l'interface)"""
+    if getattr(sys, "frozen", False):
+        command = [sys.executable, "--jobs"]
+    else:
+        command = [sys.executable, os.path.abspath(__file__)]
+    if queue_dir:
+        command += ["--queue", queue_dir]
+    return command + ["daemon"]
+
+
+def ensure_daemon(queue_dir=None):
+    """Démarrer le démon en tâche de fond s'il ne tourne pas (il survit à la fermeture de l'interface)"""
+    queue = JobQueue(queue_dir)
+    try:
+        if queue.daemon_alive():
+            return False
+        log = open(os.path.join(queue.logs_dir, "daemon.log"), "a", encoding="utf-8")
+        if os.name == 'nt':
+            flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+            subprocess.Popen(daemon_command(queue_dir), stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, creationflags=flags)
+        else:
+            subprocess.Popen(daemon_command(queue_dir), stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        log.close()
+        return True
+    finally:
+        queue.close()
+
+
+def describe_job(job):
+    """Ligne de statut d'un job"""
+    line = f"#{job['id']:<4} {job['state']:<10} {job['progress'] or 0:5.1f}%  {job['name']}"
+    if job["state"] in ("running", "cancelling") and job["status"]:
+        line += f"  [{job['status']}]"
+    elif job["state"] in ("failed",) and job["returncode"] is not None:
+        line += f"  (exit code {job['returncode']})"
+    return line
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="denoizer-jobs", description="Persistent DenoiZer job queue: submit shots, run them with a background daemon, follow their status")
+    parser.add_argument("--queue", help="Queue folder (default: the user DenoiZer/jobs folder)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    daemon = commands.add_parser("daemon", help="Run queued jobs (one daemon per queue)")
+    daemon.add_argument("--max-jobs", type=int, default=0, help="Concurrent jobs limit (default: MAX_PARALLEL_JOBS, 0 = resources only)")
+    daemon.add_argument("--exit-when-idle", action="store_true", help="Exit once the queue is empty")
+
+    submit = commands.add_parser("submit", help="Queue a shot")
+    submit.add_argument("input", help="Folder containing the input EXR sequence")
+    submit.add_argument("output", help="Output folder")
+    submit.add_argument("--name", help="Job name (default: the input folder name)")
+    submit.add_argument("--priority", type=int, default=0, help="Higher runs first")
+    submit.add_argument("--start-daemon", action="store_true", help="Start the daemon in the background if it is not running")
+    add_pipeline_arguments(submit)
+
+    listing = commands.add_parser("list", help="Show the jobs")
+    listing.add_argument("--all", action="store_true", help="Include finished jobs")
+
+    for name, text in (("cancel", "Cancel a queued job or stop a running one"), ("retry", "Queue a finished job again"), ("log", "Print a job's log")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("job", type=int)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "daemon":
+        queue = JobQueue(args.queue)
+        daemon = JobDaemon(queue, args.max_jobs, args.exit_when_idle, log_callback=lambda message: print(message, flush=True))
+        try:
+            return 0 if daemon.run() else 1
+        except KeyboardInterrupt:
+            return 130
+        finally:
+            queue.close()
+
+    queue = JobQueue(args.queue)
+    try:
+        if args.command == "submit":
+            options = pipeline_options(args, load_user_config(args.config))
+            job_id = queue.submit(os.path.abspath(args.input), os.path.abspath(args.output), options, args.name, args.priority)
+            print(f"✅ Job {job_id} queued")
+            if args.start_daemon and ensure_daemon(args.queue):
+                print("🚀 Job daemon started")
+            elif not queue.daemon_alive():
+                print("ℹ️ No job daemon running - start one with: daemon")
+        elif args.command == "list":
+            jobs = queue.jobs(None if args.all else ("queued", "running", "cancelling"))
+            for job in jobs:
+                print(describe_job(job))
+            print(f"{'🟢 Daemon running' if queue.daemon_alive() else '⚪ Daemon stopped'} - {len(jobs)} jobs")
+        elif args.command == "cancel":
+            if not queue.cancel(args.job):
+                print(f"⚠️ Job {args.job} is not queued or running", file=sys.stderr)
+                return 1
+            print(f"🛑 Job {args.job} cancelled")
+        elif args.command == "retry":
+            if not queue.retry(args.job):
+                print(f"⚠️ Job {args.job} is not finished", file=sys.stderr)
+                return 1
+            print(f"♻️ Job {args.job} queued again")
+        elif args.command == "log":
+            try:
+                with open(queue.log_path(args.job), "r", encoding="utf-8") as f:
+                    sys.stdout.write(f.read())
+            except OSError:
+                print(f"⚠️ No log for job {args.job}", file=sys.stderr)
+                return 1
+    finally:
+        queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import os
+import csv
+import json
+import math
+import time
+import uuid
+
+# Rapport de performance d'un run, écrit à côté de BEAUTY:
+#   denoizer_perf.json - durée des phases, débits, utilisation des workers, statistiques par étape
+#   denoizer_perf.csv  - une ligne par (phase, étape): nombre, p50, p95, max, moyenne, total
+# Les statistiques sont calculées à partir des FrameEvent des sessions de fusion et d'intégrateurs.
+
+REPORT_NAME = "denoizer_perf"
+
+
+def percentile(values, fraction):
+    """Percentile par rang le plus proche d'une liste de valeurs"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def stage_summary(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "max": max(values) if values else 0.0,
+        "mean": sum(values) / len(values) if values else 0.0,
+        "total": sum(values)
+    }
+
+
+class PerfReport:
+    """Agrégation des FrameEvent d'un run et des durées de ses phases"""
+
+    def __init__(self):
+        self.phases = {}
+        self.phase_times = {}
+        self.started = time.time()
+
+    def phase(self, name):
+        return self.phases.setdefault(name, {
+            "frames": 0, "failed": 0, "bytes_read": 0, "bytes_written": 0,
+            "busy": 0.0, "elapsed": 0.0, "workers": 0, "timings": {}
+        })
+
+    def add_event(self, event):
+        phase = self.phase(event.phase)
+        phase["frames"] += 1
+        if not event.success:
+            phase["failed"] += 1
+        phase["bytes_read"] += event.bytes_read
+        phase["bytes_written"] += event.bytes_written
+        # Temps de travail effectif du worker (hors attente en file)
+        phase["busy"] += event.timings.get("total", 0.0)
+        phase["elapsed"] = max(phase["elapsed"], event.elapsed)
+        phase["workers"] = max(phase["workers"], event.workers or 0)
+        for stage, seconds in event.timings.items():
+            phase["timings"].setdefault(stage, []).append(seconds)
+
+    def add_phase_time(self, name, seconds):
+        """Durée murale d'une phase du pipeline (preparation, denoise, merge, integrator)"""
+        self.phase_times[name] = self.phase_times.get(name, 0.0) + seconds
+
+    def summary(self):
+        phases = {}
+        for name, phase in self.phases.items():
+            elapsed = phase["elapsed"]
+            capacity = elapsed * phase["workers"]
+            phases[name] = {
+                "frames": phase["frames"],
+                "failed": phase["failed"],
+                "workers": phase["workers"],
+                "elapsed": elapsed,
+                "mb_read": phase["bytes_read"] / (1024 * 1024),
+                "mb_written": phase["bytes_written"] / (1024 * 1024),
+                "read_mb_per_s": phase["bytes_read"] / (1024 * 1024) / elapsed if elapsed > 0 else 0.0,
+                "write_mb_per_s": phase["bytes_written"] / (1024 * 1024) / elapsed if elapsed > 0 else 0.0,
+                "frames_per_s": phase["frames"] / elapsed if elapsed > 0 else 0.0,
+                # Part du temps où les workers travaillaient sur une frame
+                "worker_utilisation": phase["busy"] / capacity if capacity > 0 else 0.0,
+                "stages": {stage: stage_summary(values) for stage, values in sorted(phase["timings"].items())}
+            }
+        return {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "total_time": time.time() - self.started,
+            "phase_times": dict(self.phase_times),
+            "phases": phases
+        }
+
+    def save(self, folder):
+        """Écrire le rapport JSON et CSV dans `folder`. Retourne le chemin du JSON"""
+        summary = self.summary()
+        json_path = os.path.join(folder, f"{REPORT_NAME}.json")
+        csv_path = os.path.join(folder, f"{REPORT_NAME}.csv")
+
+        temp_path = f"{json_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        os.replace(temp_path, json_path)
+
+        temp_path = f"{csv_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["phase", "stage", "count", "p50_s", "p95_s", "max_s", "mean_s", "total_s"])
+            for name, phase in summary["phases"].items():
+                for stage, stats in phase["stages"].items():
+                    writer.writerow([name, stage, stats["count"]] + [f"{stats[key]:.4f}" for key in ("p50", "p95", "max", "mean", "total")])
+        os.replace(temp_path, csv_path)
+        return json_path
+
+    def describe(self):
+        """Lignes de log résumant le rapport"""
+        lines = []
+        for name, phase in self.summary()["phases"].items():
+            if not phase["stages"]:
+                lines.append(f"📊 {name}: {phase['frames']} frames in {phase['elapsed']:.1f}s")
+                continue
+            lines.append(f"📊 {name}: {phase['frames']} frames, read {phase['read_mb_per_s']:.1f}MB/s, "
+                         f"write {phase['write_mb_per_s']:.1f}MB/s, {phase['workers']} workers at {phase['worker_utilisation'] * 100:.0f}%")
+            slowest = sorted(phase["stages"].items(), key=lambda item: item[1]["total"], reverse=True)
+            # Étapes de travail seulement (sans les cumuls ni l'attente en file)
+            slowest = [(stage, stats) for stage, stats in slowest if stage not in ("total", "read", "write", "queue_wait")][:3]
+            if slowest:
+                lines.append("   slowest stages (p50/p95): " + ", ".join(f"{stage} {stats['p50']:.3f}/{stats['p95']:.3f}s" for stage, stats in slowest))
+        return lines
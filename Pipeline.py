@@ -0,0 +1,1701 @@
+import os
+import sys
+import json
+import time
+import queue
+import shlex
+import shutil
+import threading
+import argparse
+import subprocess
+import multiprocessing
+from collections import namedtuple
+import psutil
+import OpenImageIO as oiio
+from ExrMerge import merge_final_exrs, MergeSession, DenoisedFrameTracker, expected_denoised_layers
+from Integrator_Denoizer import run_integrator_generate, IntegratorSession, integrator_output_name
+from FramePool import BACKENDS, FrameEvent, PauseGate, file_size, get_budgeted_worker_count
+from ExrIO import PIXEL_TYPES
+from RunManifest import RunManifest, MANIFEST_NAME
+from PerfReport import PerfReport
+from DenoiseCache import DenoiseCache, DEFAULT_CACHE_SIZE_GB, default_cache_dir, file_hash, renderman_version
+
+# Pipeline complet sans interface graphique: débruitage RenderMan -> BEAUTY -> INTEGRATOR.
+# Aucun import Qt: utilisable sur les nœuds de rendu sans affichage. L'interface
+# (DenoizerTab.run_denoise) le pilote avec ses callbacks de log et de progression.
+
+# Fichiers de paramètres du débruiteur (dans <RenderMan>/lib/denoise)
+CROSSFRAME_DENOISE_FILES = ("20970-renderman.param", "full_w7_4sv2_sym_gen2.topo")
+STANDARD_DENOISE_FILES = ("20973-renderman.param", "full_w1_5s_sym_gen2.topo")
+
+# Débruiteur de remplacement sans RenderMan (tests et mesures du pipeline)
+FAKE_DENOISER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "FakeDenoiser.py")
+
+# Fenêtre temporelle du filtre CrossFrame (topologie w7: la frame et 3 voisines de chaque côté).
+# Un shard débruite aussi ces voisines pour que ses frames de bord voient la même fenêtre
+# que dans une seule instance; leurs sorties en double sont ignorées.
+CROSSFRAME_HALO = 3
+
+COMPRESSION_MODES = ["ZIP", "DWAA", "DWAB", "PIZ", "NO_COMPRESSION"]
+
+# Rafraîchissement de l'interface pendant le débruitage: les lignes de denoise_batch sont lues et
+# analysées dans des threads, puis traitées par lots au plus UI_REFRESH_INTERVAL secondes d'écart
+# (progression, statut et temps restant ne sont mis à jour qu'une fois par lot)
+UI_REFRESH_INTERVAL = 1 / 30
+MAX_EVENT_BATCH = 500
+
+# Ligne de denoise_batch analysée par le thread de lecture
+#   kind: "output" (Applying Denoiser: entrée > sortie | layer: L), "stage" (Processing albedo, ...) ou "text"
+DenoiserEvent = namedtuple("DenoiserEvent", "kind text error stage output_path layer")
+DENOISER_STAGES = ("albedo", "diffuse", "specular", "subsurface")
+
+# Répartition de la barre de progression de l'onglet entre les phases
+PHASES = {
+    "preparation": {"weight": 5, "start": 0, "end": 5},
+    "denoising": {"weight": 50, "start": 5, "end": 55},
+    "merging": {"weight": 30, "start": 55, "end": 85},
+    "integrators": {"weight": 15, "start": 85, "end": 100}
+}
+
+# Définir les étapes globales et leur progression
+GLOBAL_PHASES = {
+    "preparation": 1,         # 1% quand config.json est créé
+    "denoising_albedo": 15,   # 15% quand l'étape albedo est terminée
+    "denoising_subsurface": 25, # 25% quand l'étape subsurface est terminée
+    "denoising_diffuse": 35,  # 35% quand l'étape diffuse est terminée
+    "denoising_done": 50,     # 50% quand le débruitage est terminé
+    "merging_done": 75,       # 75% quand la fusion est terminée
+    "integrators_done": 100   # 100% quand tout est terminé
+}
+
+
+class PipelineError(Exception):
+    """Erreur bloquante du pipeline (dossier invalide, échec de denoise_batch, ...)"""
+
+
+def parse_denoiser_line(line_text):
+    """Ligne de sortie de denoise_batch -> DenoiserEvent"""
+    error = "ERROR" in line_text.upper()
+    for stage in DENOISER_STAGES:
+        if f"Processing {stage}" in line_text:
+            return DenoiserEvent("stage", line_text, error, stage, None, None)
+    if "Applying Denoiser:" in line_text and "temp_denoised" in line_text and ">" in line_text and "|" in line_text:
+        output_part, layer_info = line_text.split("|", 1)
+        output_path = output_part.split(">", 1)[1].strip()
+        layer = layer_info.split(":", 1)[1].strip() if ":" in layer_info else "unknown"
+        if output_path:
+            return DenoiserEvent("output", line_text, error, None, output_path, layer)
+    return DenoiserEvent("text", line_text, error, None, None, None)
+
+
+def raise_priority():
+    """Priorité haute pour denoise_batch (Linux); ignorée si l'utilisateur n'en a pas le droit"""
+    try:
+        os.nice(-10)
+    except OSError:
+        pass
+
+
+def format_duration(seconds):
+    """Durée lisible: "12 seconds", "3 minutes 20 seconds", "1 hours 5 minutes" """
+    if seconds < 60:
+        return f"{int(seconds)} seconds"
+    elif seconds < 3600:
+        return f"{int(seconds/60)} minutes {int(seconds%60)} seconds"
+    return f"{int(seconds/3600)} hours {int((seconds%3600)/60)} minutes"
+
+
+def list_input_frames(input_path):
+    """Frames EXR du dossier d'entrée, dans l'ordre de la séquence"""
+    return sorted([f for f in os.listdir(input_path) if f.endswith(".exr")])
+
+
+def list_input_aovs(input_path):
+    """AOVs (noms de base des canaux) de la première frame du dossier d'entrée"""
+    frames = list_input_frames(input_path)
+    if not frames:
+        return []
+    inp = oiio.ImageInput.open(os.path.join(input_path, frames[0]))
+    if not inp:
+        return []
+    channels = inp.spec().channelnames
+    inp.close()
+    return sorted({ch.rsplit('.', 1)[0] if '.' in ch else ch for ch in channels})
+
+
+def with_halo(frames, sequence, halo):
+    """Frames `frames` de `sequence`, élargies de `halo` voisines de chaque côté (dans l'ordre de la séquence)"""
+    if not frames or not halo:
+        return list(frames)
+    position = {frame: index for index, frame in enumerate(sequence)}
+    keep = set()
+    for frame in frames:
+        index = position[frame]
+        keep.update(range(max(0, index - halo), min(len(sequence), index + halo + 1)))
+    return [sequence[index] for index in sorted(keep)]
+
+
+def shard_frames(frames, shards, halo=0, sequence=None):
+    """Découper la séquence en `shards` plages contiguës
+
+    Retourne [(frames du shard, frames à débruiter)]: la seconde liste ajoute `halo`
+    frames voisines de chaque côté (contexte temporel du CrossFrame), prises dans
+    `sequence` (toute la séquence d'entrée, par défaut `frames`)."""
+    sequence = list(sequence or frames)
+    shards = max(1, min(shards, len(frames)))
+    size, extra = divmod(len(frames), shards)
+    result = []
+    start = 0
+    for index in range(shards):
+        end = start + size + (1 if index < extra else 0)
+        result.append((frames[start:end], with_halo(frames[start:end], sequence, halo)))
+        start = end
+    return result
+
+
+class DenoiseShard:
+    """Une instance de denoise_batch sur une plage de frames
+
+    Chaque shard écrit dans son propre dossier (les frames du halo sont débruitées par
+    deux shards); ses frames sont déplacées dans temp_denoised une fois complètes."""
+
+    def __init__(self, index, frames, primary_frames, config_path, output_dir, expected_layers):
+        self.index = index
+        self.frames = list(frames)
+        self.primary_frames = list(primary_frames)
+        self.config_path = config_path
+        self.output_dir = output_dir
+        self.tracker = DenoisedFrameTracker(self.frames, expected_layers, output_dir)
+        self.process = None
+        self.reader = None
+        self.error_message = None
+
+    def move_frame(self, frame, denoised_folder):
+        """Déplacer les fichiers débruités d'une frame vers temp_denoised (même disque: simple renommage)"""
+        if os.path.normpath(self.output_dir) == os.path.normpath(denoised_folder):
+            return
+        for folder in self.tracker.expected_layers:
+            source = os.path.join(self.output_dir, folder, frame)
+            if not os.path.exists(source):
+                continue
+            target_dir = os.path.join(denoised_folder, folder)
+            os.makedirs(target_dir, exist_ok=True)
+            os.replace(source, os.path.join(target_dir, frame))
+
+
+class Pipeline:
+    """Débruitage d'une séquence, fusion BEAUTY puis séparation INTEGRATOR, sans interface
+
+    Les callbacks sont optionnels: `log_callback(message)`, `status_callback(text)`,
+    `progress_callback(percent)` et `overall_progress_callback(percent)` pour les barres,
+    `eta_callback(text)` pour le temps restant, `error_callback(title, message)` pour les
+    erreurs à signaler, `process_callback(process)` quand denoise_batch démarre (ou None
+    quand il se termine), `idle_callback()` pour garder une interface réactive,
+    `stop_check()` et `pause_check()` pour l'arrêt et la pause. `denoiser_command` remplace
+    <RenderMan>/bin/denoise_batch.exe (liste d'arguments, ex: FakeDenoiser.py sans RenderMan).
+    `max_cores` et `memory_fraction` bornent les ressources du run (plusieurs plans en parallèle).
+    `pause_gate` (PauseGate) propage la pause aux workers de fusion / séparation et suspend denoise_batch."""
+
+    def __init__(self, input_path, output_path, renderman_path, selected_aovs, light_groups=None, shadow_mode=False, shadow_aovs=None, crossframe=False, compression_mode="DWAB", compression_level=None, pixel_type="FLOAT", backend="AUTO", selected_integrators=None, pipelined_merge=True, integrator_during_denoise=False, integrator_cpu_budget=0.25, combined_pass=True, denoise_shards=1, frames=None, resume=True,
+                 denoise_cache_dir=None, denoise_cache_size_gb=DEFAULT_CACHE_SIZE_GB, keep_temp=False, log_callback=None, status_callback=None, progress_callback=None, overall_progress_callback=None, eta_callback=None, error_callback=None, process_callback=None, idle_callback=None, stop_check=None, pause_check=None,
+                 event_callback=None, denoiser_command=None, max_cores=None, memory_fraction=0.75, pause_gate=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.renderman_path = renderman_path
+        self.denoiser_command = list(denoiser_command or [])
+        self.selected_aovs = list(selected_aovs or [])
+        self.light_groups = light_groups or {"prefix": "", "diffuse": [], "specular": []}
+        self.shadow_mode = shadow_mode
+        self.shadow_aovs = list(shadow_aovs or [])
+        self.crossframe = crossframe
+        self.compression_mode = compression_mode
+        self.compression_level = compression_level if compression_mode in ["DWAA", "DWAB"] else None
+        self.pixel_type = pixel_type
+        self.backend = backend
+        # INTEGRATOR construit seulement si des intégrateurs sont demandés
+        self.selected_integrators = list(selected_integrators or [])
+        self.pipelined_merge = pipelined_merge
+        self.integrator_during_denoise = integrator_during_denoise
+        self.integrator_cpu_budget = integrator_cpu_budget
+        self.combined_pass = combined_pass
+        # Nombre d'instances de denoise_batch lancées en parallèle sur des plages de frames
+        self.denoise_shards = max(1, int(denoise_shards or 1))
+        # Reprise: ne traiter que les frames que le manifeste du dossier de sortie ne donne pas à jour
+        self.resume = resume
+        # Cache des fichiers débruités entre les runs (désactivé sans dossier)
+        self.denoise_cache_dir = denoise_cache_dir
+        self.denoise_cache_size_gb = denoise_cache_size_gb
+        self.denoise_cache = None
+        self.cache_keys = {}
+        self.denoised_folders = {}
+        self.denoised_count = 0
+        self.keep_temp = keep_temp
+        # Ressources accordées au run: cœurs (denoise_batch et workers de fusion) et part de la RAM de denoise_batch
+        self.max_cores = max_cores
+        self.memory_fraction = memory_fraction
+
+        self.log_callback = log_callback
+        self.status_callback = status_callback
+        self.progress_callback = progress_callback
+        self.overall_progress_callback = overall_progress_callback
+        self.eta_callback = eta_callback
+        self.error_callback = error_callback
+        self.process_callback = process_callback
+        self.idle_callback = idle_callback
+        self.stop_check = stop_check
+        self.pause_check = pause_check
+        # Pause partagée: les pools s'arrêtent entre deux frames, denoise_batch est suspendu
+        self.pause_gate = pause_gate
+        if self.pause_gate is not None:
+            self.pause_gate.add_listener(self.suspend_denoisers)
+        # event_callback(FrameEvent): une frame débruitée, fusionnée ou séparée (phase "denoise", "merge", "integrator")
+        self.event_callback = event_callback
+        # Durées par étape et débits du run (denoizer_perf.json / .csv à côté de BEAUTY)
+        self.perf = PerfReport()
+
+        self.stop_requested = False
+        self.process = None
+        self.shards = []
+        self.merge_session = None
+        self.integrator_session = None
+        # Frames à produire (toutes par défaut, une plage pour un job de ferme de rendu)
+        self.requested_frames = list(frames) if frames else None
+        self.frames = []
+        self.manifest = None
+        self.denoise_targets = []  # frames à débruiter
+        self.denoise_frames = []  # frames à débruiter + voisines CrossFrame
+        self.merge_frames = []  # frames dont la BEAUTY est à écrire
+        self.integrator_frames = []  # frames dont l'INTEGRATOR est à écrire
+        self.beauty_dir = os.path.join(output_path, "BEAUTY")
+        self.temp_dir = os.path.join(output_path, "temp_denoised")
+        self.integrator_dir = os.path.join(output_path, "INTEGRATOR") if self.selected_integrators else None
+        self.config_path = os.path.join(output_path, "config.json")
+
+    # --- Callbacks ---------------------------------------------------------
+
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def set_status(self, text):
+        if self.status_callback:
+            self.status_callback(text)
+
+    def set_progress(self, percent):
+        if self.progress_callback:
+            self.progress_callback(percent)
+
+    def set_overall_progress(self, percent):
+        if self.overall_progress_callback:
+            self.overall_progress_callback(percent)
+
+    def set_estimated_time(self, text):
+        if self.eta_callback:
+            self.eta_callback(text)
+
+    def emit(self, event):
+        self.perf.add_event(event)
+        if self.event_callback:
+            self.event_callback(event)
+
+    def report_error(self, title, message):
+        if self.error_callback:
+            self.error_callback(title, message)
+
+    def idle(self):
+        """Laisser l'interface se rafraîchir (équivalent de QApplication.processEvents)"""
+        if self.idle_callback:
+            self.idle_callback()
+
+    def stopped(self):
+        if self.stop_check and self.stop_check():
+            self.stop_requested = True
+        return self.stop_requested
+
+    def pause(self):
+        """Attendre tant qu'une pause est demandée"""
+        if self.pause_check:
+            self.pause_check()
+        elif self.pause_gate is not None:
+            self.pause_gate.wait()
+
+    def suspend_denoisers(self, paused):
+        """PauseGate: suspendre / reprendre les denoise_batch en cours (appelé depuis le thread qui demande la pause)"""
+        suspended = 0
+        for shard in list(self.shards):
+            process = shard.process
+            if process is None or process.poll() is not None:
+                continue
+            try:
+                parent = psutil.Process(process.pid)
+                for target in [parent] + parent.children(recursive=True):
+                    if paused:
+                        target.suspend()
+                    else:
+                        target.resume()
+                suspended += 1
+            except psutil.Error:
+                pass
+        if suspended:
+            self.log(f"⏸️ denoise_batch suspended ({suspended} instances)" if paused else f"▶️ denoise_batch resumed ({suspended} instances)")
+
+    def stop(self):
+        """Demander l'arrêt: denoise_batch est terminé et les pools n'acceptent plus de frames"""
+        self.stop_requested = True
+        self.stop_shards()
+
+    def stop_shards(self):
+        """Terminer toutes les instances de denoise_batch encore actives"""
+        for shard in self.shards:
+            if shard.process and shard.process.poll() is None:
+                try:
+                    shard.process.terminate()
+                except:
+                    pass
+
+    # --- Préparation -------------------------------------------------------
+
+    @property
+    def combined_integrator_dir(self):
+        """Dossier INTEGRATOR écrit pendant la fusion (passe combinée), sinon None"""
+        if self.integrator_dir and not self.integrator_during_denoise and self.combined_pass:
+            return self.integrator_dir
+        return None
+
+    def resolve_aovs(self):
+        """AOVs à débruiter: sélection (ou tous les AOVs en mode shadow) + light groups"""
+        if self.shadow_mode:
+            # En mode shadow, on sélectionne tous les AOVs pour le denoising
+            selected_aovs = list(self.selected_aovs) or list_input_aovs(self.input_path)
+            self.log(f"🔍 Shadow Mode: Processing all {len(selected_aovs)} AOVs")
+            # S'assurer que les AOVs des shadows sont bien dans la liste
+            for shadow_aov in self.shadow_aovs:
+                if shadow_aov not in selected_aovs:
+                    selected_aovs.append(shadow_aov)
+                    self.log(f"➕ Added shadow AOV '{shadow_aov}' to processing list")
+        else:
+            selected_aovs = list(self.selected_aovs)
+            if not selected_aovs:
+                raise PipelineError("Please select at least one AOV to denoise.")
+
+        # Automatically add light group AOVs to selection
+        selected_aovs.extend(self.light_groups["diffuse"])
+        selected_aovs.extend(self.light_groups["specular"])
+        return selected_aovs
+
+    def denoise_files(self):
+        """Chemins (param, topo) selon le mode CrossFrame"""
+        param_name, topo_name = CROSSFRAME_DENOISE_FILES if self.crossframe else STANDARD_DENOISE_FILES
+        param = os.path.join(self.renderman_path, "lib", "denoise", param_name).replace("\\", "/")
+        topo = os.path.join(self.renderman_path, "lib", "denoise", topo_name).replace("\\", "/")
+        return param, topo
+
+    def build_config(self, frames, selected_aovs, output_dir=None):
+        """Contenu du config.json de denoise_batch pour les frames données"""
+        param, topo = self.denoise_files()
+        primary = [os.path.join(self.input_path, f).replace("\\", "/") for f in frames]
+        config = {
+            "primary": primary,
+            "aux": {
+                "diffuse": [],
+                "specular": [],
+                "albedo": [{"paths": list(primary), "layers": ["albedo"]}],
+                "Ci": [{"paths": list(primary), "layers": ["Ci"]}],
+                "subsurface": [{"paths": list(primary), "layers": ["subsurface"]}]
+            },
+            "config": {
+                "passes": selected_aovs,
+                "topology": topo,
+                "parameters": param,
+                "output-dir": (output_dir or self.temp_dir).replace("\\", "/"),
+                "flow": self.crossframe,  # CrossFrame flow
+                "debug": False,
+                "asymmetry": 0.0
+            }
+        }
+
+        # Add light groups to appropriate categories
+        for aov in selected_aovs:
+            if aov in self.light_groups["diffuse"]:
+                config["aux"]["diffuse"].append({
+                    "paths": config["primary"],
+                    "layers": [aov]
+                })
+            elif aov in self.light_groups["specular"]:
+                config["aux"]["specular"].append({
+                    "paths": config["primary"],
+                    "layers": [aov]
+                })
+            # Add subsurface to diffuse category if found in selected AOVs
+            elif aov == "subsurface":
+                config["aux"]["diffuse"].append({
+                    "paths": config["primary"],
+                    "layers": ["subsurface"]
+                })
+
+        # Add shadows to diffuse category if enabled
+        if self.shadow_mode:
+            for shadow_aov in self.shadow_aovs:
+                if shadow_aov in selected_aovs:
+                    config["aux"]["diffuse"].append({
+                        "paths": config["primary"],
+                        "layers": [shadow_aov]
+                    })
+        return config
+
+    def prepare(self):
+        """Phase 1: dossiers de sortie, liste des AOVs et config.json. Retourne False si arrêté"""
+        if not self.input_path or not os.path.isdir(self.input_path):
+            raise PipelineError(f"Invalid input folder: {self.input_path}")
+        if not self.output_path or not os.path.isdir(self.output_path):
+            raise PipelineError(f"Invalid output folder: {self.output_path}")
+
+        sequence = list_input_frames(self.input_path)
+        if not sequence:
+            raise PipelineError("No .exr files found in the input folder.")
+        self.frames = sequence
+        if self.requested_frames is not None:
+            wanted = set(self.requested_frames)
+            self.frames = [f for f in sequence if f in wanted]
+            if not self.frames:
+                raise PipelineError("None of the requested frames were found in the input folder.")
+        self.sequence = sequence
+
+        # Phase: preparation (5%)
+        self.set_status("1: DENOISING RENDERMAN - Preparing configuration...")
+        self.set_overall_progress(0)  # Initialiser la barre globale à 0%
+        self.idle()
+
+        if self.stopped():
+            self.log("🛑 Process stopped during preparation.")
+            return False
+
+        # Create directories
+        os.makedirs(self.beauty_dir, exist_ok=True)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self.log(f"✅ Created output directory: BEAUTY")
+
+        # Create integrator directory only if enabled
+        if self.integrator_dir:
+            os.makedirs(self.integrator_dir, exist_ok=True)
+            self.log(f"✅ Created output directory: INTEGRATOR")
+        else:
+            self.log(f"ℹ️ Build Integrator disabled - INTEGRATOR directory not created")
+
+        self.selected_aovs = self.resolve_aovs()
+        if self.denoiser_command:
+            self.log(f"🛠️ Using denoiser command: {' '.join(self.denoiser_command)}")
+        else:
+            self.log(f"🛠️ Using RenderMan: {self.renderman_path}")
+        self.plan_work()
+
+        if self.stopped():
+            self.log("🛑 Process stopped during preparation.")
+            return False
+        self.pause()
+
+        if self.crossframe:
+            self.log("🔧 Using CrossFrame optimized parameters: " + " & ".join(CROSSFRAME_DENOISE_FILES))
+        else:
+            self.log("🔧 Using standard parameters: " + " & ".join(STANDARD_DENOISE_FILES))
+        self.config = self.build_config(self.denoise_frames, self.selected_aovs)
+
+        # Log whether CrossFrame is enabled
+        if self.crossframe:
+            self.log("✅ CrossFrame denoising enabled - Better temporal coherence between frames")
+        else:
+            self.log("ℹ️ CrossFrame denoising disabled - Each frame processed independently")
+        if self.shadow_mode:
+            for shadow_aov in self.shadow_aovs:
+                if shadow_aov in self.selected_aovs:
+                    self.log(f"✅ Added shadow AOV '{shadow_aov}' to diffuse category for denoising")
+
+        # Write config file
+        with open(self.config_path, "w") as f:
+            json.dump(self.config, f, indent=4)
+
+        self.log(f"✅ Configuration file written to: {self.config_path}")
+        self.shards = self.build_shards()
+        self.set_progress(PHASES["preparation"]["end"])
+        self.set_overall_progress(GLOBAL_PHASES["preparation"])  # 1% quand config.json est créé
+        self.idle()
+
+        if self.stopped():
+            self.log("🛑 Process stopped after configuration.")
+            return False
+        self.pause()
+        return True
+
+    def stage_settings(self):
+        """Réglages dont dépend chaque étape (une modification rend l'étape périmée dans le manifeste)"""
+        param, topo = self.denoise_files()
+        denoise = {
+            "aovs": sorted(self.selected_aovs),
+            "light_groups": self.light_groups,
+            "shadow": [self.shadow_mode, sorted(self.shadow_aovs)],
+            "crossframe": self.crossframe,
+            "parameters": [os.path.basename(param), os.path.basename(topo)]
+        }
+        output = {"compression": [self.compression_mode, self.compression_level], "pixel_type": self.pixel_type}
+        return {
+            "denoise": denoise,
+            "beauty": dict(output, denoise=denoise),
+            "integrator": dict(output, integrators=sorted(self.selected_integrators))
+        }
+
+    def plan_work(self):
+        """Choisir les frames à débruiter, fusionner et séparer d'après le manifeste de reprise"""
+        self.manifest = RunManifest(self.output_path, self.input_path, self.stage_settings())
+        self.merge_frames = list(self.frames)
+        self.integrator_frames = list(self.frames) if self.integrator_dir else []
+        self.denoise_targets = list(self.frames)
+        # Fichiers débruités attendus par frame (les catégories aux ne dépendent pas des frames)
+        self.denoised_folders = expected_denoised_layers(self.build_config([], self.selected_aovs))
+        if self.resume:
+            self.merge_frames = [f for f in self.frames if not self.manifest.is_done(f, "beauty", os.path.join(self.beauty_dir, f))]
+            self.integrator_frames = [f for f in self.integrator_frames if not self.manifest.is_done(f, "integrator", os.path.join(self.integrator_dir, integrator_output_name(f)))]
+            self.denoise_targets = [f for f in self.merge_frames if not self.manifest.is_done(
+                f, "denoise", *[os.path.join(self.temp_dir, folder, f) for folder in self.denoised_folders])]
+            if len(self.merge_frames) < len(self.frames) or len(self.integrator_frames) < len(self.frames) or len(self.denoise_targets) < len(self.merge_frames):
+                message = f"♻️ Resuming from {MANIFEST_NAME}: {len(self.denoise_targets)}/{len(self.frames)} frames to denoise, {len(self.merge_frames)} to merge"
+                if self.integrator_dir:
+                    message += f", {len(self.integrator_frames)} integrator files to write"
+                self.log(message)
+        self.restore_from_cache()
+        # Avec CrossFrame, débruiter aussi les voisines des frames à refaire (contexte temporel)
+        self.denoise_frames = with_halo(self.denoise_targets, self.sequence, CROSSFRAME_HALO if self.crossframe else 0)
+
+    def cache_settings(self):
+        """Réglages dont dépend le résultat de denoise_batch (hors options de fusion)"""
+        param, topo = self.denoise_files()
+        layout = self.build_config([], self.selected_aovs)
+        return {
+            "passes": sorted(self.selected_aovs),
+            "aux": {category: [entry["layers"] for entry in entries] for category, entries in layout["aux"].items()},
+            "parameters": [file_hash(param), file_hash(topo)],
+            "crossframe": self.crossframe,
+            "renderman": renderman_version(self.renderman_path, self.denoise_command()[0])
+        }
+
+    def restore_from_cache(self):
+        """Copier depuis le cache les frames à débruiter dont les entrées et réglages n'ont pas changé"""
+        if not self.denoise_cache_dir or not self.denoise_targets:
+            return
+        try:
+            self.denoise_cache = DenoiseCache(self.denoise_cache_dir, self.denoise_cache_size_gb, log_callback=self.log)
+        except OSError as e:
+            self.log(f"⚠️ Denoise cache disabled: {str(e)}")
+            return
+        settings = self.cache_settings()
+        # Avec CrossFrame, le résultat d'une frame dépend aussi de ses voisines
+        halo = CROSSFRAME_HALO if self.crossframe else 0
+        position = {frame: index for index, frame in enumerate(self.sequence)}
+        restored = set()
+        for frame in self.denoise_targets:
+            if self.stopped():
+                return
+            index = position[frame]
+            window = self.sequence[max(0, index - halo):index + halo + 1]
+            key = self.denoise_cache.key([self.denoise_cache.input_hash(os.path.join(self.input_path, f)) for f in window], settings)
+            self.cache_keys[frame] = key
+            if self.denoise_cache.restore(key, frame, self.denoised_folders, self.temp_dir):
+                self.manifest.mark(frame, "denoise")
+                restored.add(frame)
+            self.idle()
+        if restored:
+            self.log(f"🗄️ {len(restored)}/{len(self.denoise_targets)} frames restored from the denoise cache: {self.denoise_cache_dir}")
+            self.denoise_targets = [frame for frame in self.denoise_targets if frame not in restored]
+
+    def close_cache(self):
+        """Attendre les copies vers le cache et appliquer sa taille maximale"""
+        if self.denoise_cache is None:
+            return
+        self.denoise_cache.close()
+        if self.denoise_cache.stored:
+            self.log(f"🗄️ Denoise cache: stored {self.denoise_cache.stored} frames")
+        self.denoise_cache = None
+
+    @property
+    def up_to_date(self):
+        """Vrai si le manifeste ne laisse rien à faire"""
+        return not self.merge_frames and not self.integrator_frames
+
+    # --- Débruitage --------------------------------------------------------
+
+    def build_shards(self):
+        """Plages de frames des instances de denoise_batch, avec leur config.json"""
+        expected_layers = expected_denoised_layers(self.config)
+        # Frames du halo CrossFrame hors des frames à refaire: déjà dans temp_denoised (reprise ou cache)
+        # et peut-être en cours de fusion, denoise_batch ne doit pas les réécrire à leur place
+        halo_only = set(self.denoise_frames) - set(self.denoise_targets)
+        if self.denoise_shards == 1 and not halo_only:
+            return [DenoiseShard(0, self.denoise_targets, self.denoise_frames, self.config_path, self.temp_dir, expected_layers)]
+        if halo_only:
+            self.log(f"🧩 {len(halo_only)} CrossFrame context frames are denoised in a scratch folder (finished frames are kept)")
+
+        halo = CROSSFRAME_HALO if self.crossframe else 0
+        shards = []
+        for index, (frames, primary_frames) in enumerate(shard_frames(self.denoise_targets, self.denoise_shards, halo, self.sequence)):
+            output_dir = os.path.join(self.temp_dir, f"shard_{index + 1:02d}")
+            config_path = os.path.join(self.output_path, f"config_shard_{index + 1:02d}.json")
+            os.makedirs(output_dir, exist_ok=True)
+            with open(config_path, "w") as f:
+                json.dump(self.build_config(primary_frames, self.selected_aovs, output_dir), f, indent=4)
+            shards.append(DenoiseShard(index, frames, primary_frames, config_path, output_dir, expected_layers))
+        return shards
+
+    def denoise_command(self, config_path=None):
+        """Commande denoise_batch pour un config.json"""
+        if self.denoiser_command:
+            command = list(self.denoiser_command)
+        else:
+            command = [os.path.join(self.renderman_path, "bin", "denoise_batch.exe")]
+        # Construire la commande avec le flag -f si CrossFrame est activé
+        if self.crossframe:
+            command.extend(["-cf", "-f"])
+        # Activer le mode verbose pour un meilleur suivi du progrès
+        command.extend(["-v"])
+        # Ajouter le fichier de configuration JSON (toujours nécessaire)
+        command.extend(["-j", config_path or self.config_path])
+        return command
+
+    def available_cores(self):
+        """Cœurs utilisables par ce run (tous, sauf limite de l'ordonnanceur)"""
+        cpu_count = multiprocessing.cpu_count()
+        return max(1, min(self.max_cores, cpu_count)) if self.max_cores else cpu_count
+
+    def denoise_env(self, threads=None, memory_fraction=0.75):
+        """Environnement de denoise_batch: RMANTREE, threads et limite mémoire"""
+        threads = threads or multiprocessing.cpu_count()
+        env = os.environ.copy()
+        # Variables d'environnement RenderMan pour optimiser les performances
+        env['RMANTREE'] = self.renderman_path
+        env['RMAN_THREADS'] = str(threads)
+        env['RMAN_DENOISE_THREADS'] = str(threads)
+
+        # Optimiser la mémoire pour RenderMan
+        try:
+            memory_gb = psutil.virtual_memory().available / (1024**3)
+            # Allouer jusqu'à 75% de la RAM disponible pour RenderMan
+            env['RMAN_MEMORY_LIMIT'] = str(int(memory_gb * memory_fraction * 1024))
+        except:
+            pass
+        return env
+
+    def launch_denoiser(self, command, env):
+        """Démarrer denoise_batch avec une priorité haute, sortie standard lue ligne par ligne"""
+        if os.name == 'nt':  # Windows
+            # Utiliser HIGH_PRIORITY_CLASS sur Windows
+            return subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+                bufsize=1,
+                env=env,
+                creationflags=subprocess.HIGH_PRIORITY_CLASS
+            )
+        return subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1,
+            env=env,
+            preexec_fn=raise_priority  # Priorité haute
+        )
+
+    def start_overlapped_work(self):
+        """Démarrer la fusion en pipeline et la séparation des intégrateurs en tâche de fond"""
+        # merged_before: frames déjà fusionnées à la fin du débruitage (exclues de l'estimation du temps)
+        self.pipeline_state = {"denoise_done": False, "merge_start_time": time.time(), "merged_before": 0}
+
+        if self.pipelined_merge and self.merge_frames:
+            # Fusion en pipeline: chaque frame est fusionnée dès que ses fichiers dénoisés sont écrits,
+            # pendant que denoise_batch continue sur les frames suivantes
+            self.merge_session = self.create_merge_session()
+            self.log("🔀 Pipelined merge enabled - frames are merged as soon as they are denoised")
+            # Frames déjà débruitées par un run précédent: fusionnables tout de suite
+            denoise_targets = set(self.denoise_targets)
+            for frame in self.merge_frames:
+                if frame not in denoise_targets:
+                    self.merge_session.submit(frame)
+
+        # Séparation des intégrateurs en tâche de fond: elle ne lit que les EXR d'entrée,
+        # elle tourne donc pendant tout le débruitage avec une part limitée du CPU
+        if self.integrator_frames and self.integrator_during_denoise:
+            integrator_backend = self.backend
+            if integrator_backend == "AUTO":
+                # Mesurer le GIL n'a pas de sens pendant que denoise_batch occupe le CPU:
+                # des workers process mono-thread respectent directement le budget de cœurs
+                integrator_backend = "PROCESS"
+            integrator_workers = get_budgeted_worker_count(self.integrator_cpu_budget)
+            if self.max_cores:
+                integrator_workers = min(integrator_workers, self.max_cores)
+            self.integrator_session = IntegratorSession(
+                input_folder=self.input_path,
+                output_folder=self.integrator_dir,
+                selected_integrators=self.selected_integrators,
+                compression_mode=self.compression_mode,
+                compression_level=self.compression_level,
+                log_callback=self.log,
+                stop_check=self.stopped,
+                use_gpu=False,
+                pixel_type=self.pixel_type,
+                backend=integrator_backend,
+                workers=integrator_workers,
+                max_pending=len(self.integrator_frames),  # Tout mettre en file: le pool avance même entre deux lignes du débruiteur
+                high_priority=False,
+                frame_list=self.integrator_frames,
+                event_callback=self.integrator_event,
+                pause_gate=self.pause_gate
+            )
+            self.integrator_session.start()
+            self.log(f"🔀 Integrator separation running alongside denoising with {integrator_workers} workers")
+
+    def poll_overlapped_work(self):
+        """Traiter les fusions/séparations terminées et en soumettre de nouvelles"""
+        if self.merge_session is not None:
+            self.merge_session.poll()
+        if self.integrator_session is not None:
+            self.integrator_session.poll()
+
+    def collect_frame(self, shard, frame):
+        """Frame entièrement débruitée par son shard: la ranger dans temp_denoised et la fusionner"""
+        shard.move_frame(frame, self.temp_dir)
+        self.manifest.mark(frame, "denoise")
+        self.denoised_count += 1
+        self.emit(FrameEvent("denoise", frame, True, self.denoised_count, len(self.denoise_targets), 0,
+                             sum(file_size(os.path.join(self.temp_dir, folder, frame)) for folder in self.denoised_folders),
+                             {}, time.time() - self.denoising_start_time, len(self.shards)))
+        if self.denoise_cache is not None:
+            self.denoise_cache.store(self.cache_keys.get(frame), frame, self.denoised_folders, self.temp_dir)
+        if self.merge_session is not None:
+            self.merge_session.submit(frame)
+
+    def read_shard_output(self, shard, events):
+        """Thread de lecture de la sortie d'un shard: (shard, DenoiserEvent) par ligne puis (shard, None) à la fin
+
+        Le tube est vidé en continu quel que soit l'état de l'interface: denoise_batch ne bloque
+        jamais sur un tampon de sortie plein."""
+        for line in iter(shard.process.stdout.readline, ''):
+            line_text = line.strip()
+            if line_text:
+                events.put((shard, parse_denoiser_line(line_text)))
+        events.put((shard, None))
+
+    def launch_shards(self):
+        """Démarrer un denoise_batch par shard, avec une part des threads et de la mémoire"""
+        cpu_count = self.available_cores()
+        shard_count = len(self.shards)
+        threads = max(1, cpu_count // shard_count)
+        events = queue.Queue()
+        for shard in self.shards:
+            command = self.denoise_command(shard.config_path)
+
+            # Message de log approprié
+            log_message = f"🚀 Starting denoiser"
+            if shard_count > 1:
+                log_message += f" shard {shard.index + 1}/{shard_count} ({shard.frames[0]} -> {shard.frames[-1]}, {threads} threads)"
+            if self.crossframe:
+                log_message += " with CrossFrame"
+            log_message += " using CPU"
+            log_message += f": \"{command[0]}\""
+            if self.crossframe:
+                log_message += " -cf -f"
+            log_message += f" -j \"{shard.config_path}\""
+            self.log(log_message)
+
+            # Afficher la commande complète pour debug
+            command_str = " ".join([f'"{arg}"' if " " in arg else arg for arg in command])
+            self.log(f"🔧 Full command: {command_str}")
+
+            # Chaque instance reçoit sa part des cœurs et de la mémoire (75% de la RAM au total par défaut)
+            env = self.denoise_env(threads, self.memory_fraction / shard_count)
+            if 'RMAN_MEMORY_LIMIT' in env:
+                self.log(f"💾 Allocated {env['RMAN_MEMORY_LIMIT']}MB RAM for RenderMan denoising")
+
+            shard.process = self.launch_denoiser(command, env)
+            shard.reader = threading.Thread(target=self.read_shard_output, args=(shard, events), daemon=True)
+            shard.reader.start()
+        self.process = self.shards[0].process
+        if self.process_callback:
+            self.process_callback(self.process)
+        return events
+
+    def finish_shard(self, shard):
+        """Shard terminé: ranger ses dernières frames, ou retourner le message d'erreur"""
+        shard.process.wait()
+        if shard.process.returncode != 0:
+            return shard.error_message or f"RenderMan denoiser failed with code: {shard.process.returncode}"
+        # Toutes les sorties du shard sont écrites: ses frames restantes sont complètes
+        for frame in shard.tracker.remaining():
+            self.collect_frame(shard, frame)
+        if shard.process is self.process:
+            # Passer au shard suivant encore actif (suivi de l'arrêt d'urgence par l'interface)
+            running = [s.process for s in self.shards if s.process.poll() is None]
+            self.process = running[0] if running else None
+            if self.process_callback:
+                self.process_callback(self.process)
+        return None
+
+    def denoise(self):
+        """Phase 2: lancer denoise_batch (un par shard) et suivre sa sortie. Retourne False si arrêté"""
+        self.set_status("1: DENOISING RENDERMAN - Running RenderMan Denoiser...")
+
+        # Estimate total time based on frame count
+        # Empirical formula: ~10 seconds per frame for denoising, ~3 seconds for merging, ~2 seconds for integrators
+        # Multiplier par 3 pour les étapes albedo, diffuse, specular
+        frame_count = len(self.frames)
+        estimated_denoise_time = frame_count * 10 * 3  # Ajusté pour les 3 étapes
+        estimated_merge_time = frame_count * 3
+        estimated_integrator_time = frame_count * 2
+
+        # Adjust time if integrator is disabled
+        if not self.integrator_dir:
+            total_estimated_time = estimated_denoise_time + estimated_merge_time
+        else:
+            total_estimated_time = estimated_denoise_time + estimated_merge_time + estimated_integrator_time
+        self.set_estimated_time(format_duration(total_estimated_time))
+        self.idle()
+
+        if not self.denoise_targets:
+            # Reprise: toutes les frames à fusionner ont déjà leurs fichiers débruités
+            self.log("♻️ All frames to merge are already denoised - skipping RenderMan denoiser")
+            self.start_overlapped_work()
+            self.set_progress(PHASES["denoising"]["end"])
+            self.set_overall_progress(GLOBAL_PHASES["denoising_done"])
+            return True
+
+        # Note: L'argument -t pour les threads n'est pas supporté par denoise_batch
+        # RenderMan gère automatiquement les threads selon les ressources disponibles
+        cpu_count = self.available_cores()
+        self.log(f"💻 {cpu_count} CPU cores available for RenderMan")
+        if len(self.shards) > 1:
+            self.log(f"🔀 Denoising in {len(self.shards)} concurrent shards" + (f" with a ±{CROSSFRAME_HALO} frame CrossFrame halo" if self.crossframe else ""))
+
+        # Supprimer le système de tuiles pour un traitement plus fluide
+        # RenderMan traitera l'image entière d'un coup pour de meilleures performances
+        self.log("🔧 Processing full image without tiling for optimal performance")
+
+        # Informations supplémentaires sur le mode utilisé et les optimisations
+        self.log("ℹ️ CPU mode: Using all available CPU cores for denoising")
+        self.log(f"⚡ Performance optimizations: Full image processing, high priority process, verbose output")
+
+        events = self.launch_shards()
+        self.start_overlapped_work()
+
+        # Monitor denoiser output
+        self.denoising_start_time = time.time()
+        self.reset_denoise_progress()
+
+        running = len(self.shards)
+        error_message = None
+        next_refresh = 0.0
+        while running:
+            # Check for stop request
+            if self.stopped():
+                self.log("🛑 Stop requested during denoising. Terminating...")
+                self.stop()
+                return False
+
+            # Handle pause if requested
+            self.pause()
+
+            # Lignes déjà analysées par les threads de lecture, regroupées jusqu'au prochain rafraîchissement
+            batch = []
+            try:
+                while len(batch) < MAX_EVENT_BATCH:
+                    batch.append(events.get(timeout=max(0.0, next_refresh - time.time())))
+            except queue.Empty:
+                pass
+
+            for shard, event in batch:
+                if event is None:
+                    running -= 1
+                    error_message = self.finish_shard(shard)
+                    if error_message:
+                        break
+                    continue
+                # Fusion en pipeline: soumettre les frames complètes
+                if event.kind == "output":
+                    for ready_frame in shard.tracker.announce(event.output_path, event.layer):
+                        self.collect_frame(shard, ready_frame)
+                self.handle_denoiser_event(shard, event)
+
+            if error_message:
+                # Un shard en échec: inutile de laisser tourner les autres
+                self.stop_shards()
+                break
+
+            # Rafraîchir l'interface et faire avancer la fusion à cadence fixe, pas à chaque ligne
+            if time.time() >= next_refresh:
+                self.flush_denoise_ui()
+                self.poll_overlapped_work()
+                self.idle()
+                next_refresh = time.time() + UI_REFRESH_INTERVAL
+        self.flush_denoise_ui()
+
+        if self.stopped():
+            self.log("🛑 Process stopped after denoising.")
+            self.process = None
+            return False
+
+        self.process = None
+        if self.process_callback:
+            self.process_callback(None)
+
+        if error_message:
+            self.report_error("Denoiser Error", error_message)
+            raise PipelineError(error_message)
+
+        self.log("✅ Denoising completed")
+        self.set_progress(PHASES["denoising"]["end"])
+        self.set_overall_progress(GLOBAL_PHASES["denoising_done"])  # 50% quand le débruitage est terminé
+        self.idle()
+        self.pause()
+        return True
+
+    def reset_denoise_progress(self):
+        """Compteurs de couches débruitées, partagés par tous les shards"""
+        self.last_frame_time = None
+
+        # Variables pour suivre les étapes du débruitage
+        self.current_stage = ""
+        self.aov_counters = {"albedo": 0, "diffuse": 0, "specular": 0, "subsurface": 0, "light_groups": 0}
+        self.aov_totals = {"albedo": 0, "diffuse": 0, "specular": 0, "subsurface": 0, "light_groups": 0}
+
+        # Dernières valeurs de progression/statut du lot en cours (voir flush_denoise_ui)
+        self.denoise_ui = {}
+
+        # Ajouter un set pour éviter les doublons de logs (et les frames du halo débruitées par deux shards)
+        self.processed_entries = set()
+
+        # Calculer les totaux estimés pour chaque type d'AOV (frames du halo comprises)
+        frame_count = len(self.denoise_frames)
+        prefix = self.light_groups["prefix"].upper()
+        for aov in self.selected_aovs:
+            if "albedo" in aov.lower():
+                self.aov_totals["albedo"] += frame_count
+            elif "diffuse" in aov.lower():
+                if prefix in aov:
+                    self.aov_totals["light_groups"] += frame_count
+                else:
+                    self.aov_totals["diffuse"] += frame_count
+            elif "specular" in aov.lower():
+                if prefix in aov:
+                    self.aov_totals["light_groups"] += frame_count
+                else:
+                    self.aov_totals["specular"] += frame_count
+            elif "subsurface" in aov.lower():
+                self.aov_totals["subsurface"] += frame_count
+            else:
+                # Par défaut, considérer comme diffuse
+                self.aov_totals["diffuse"] += frame_count
+
+    def handle_denoiser_event(self, shard, event):
+        """Traiter une ligne analysée de denoise_batch: erreurs, étapes et progression du débruitage"""
+        aov_counters = self.aov_counters
+        aov_totals = self.aov_totals
+        prefix = self.light_groups["prefix"].upper()
+        line_text = event.text
+
+        # Check for error messages
+        if event.error:
+            shard.error_message = line_text
+            self.log(line_text)
+            # Special error handling for missing AOVs
+            if "aov" in line_text.lower() and "not found" in line_text.lower():
+                missing_aov = line_text.split("'")[1] if "'" in line_text else "unknown"
+                self.report_error("Missing AOV",
+                                  f"RenderMan denoiser error: AOV '{missing_aov}' not found.\n\n"
+                                  f"Please check that all required AOVs are present in your EXR files.")
+
+        # Detect denoising stage changes
+        if event.stage == "albedo":
+            self.current_stage = "albedo"
+            self.denoise_ui["status"] = "1: DENOISING RENDERMAN - ALBEDO"
+            self.log("\n🔄 Starting ALBEDO denoising")
+            self.denoise_ui["overall"] = 5  # 5% quand commence l'étape albedo
+        elif event.stage == "diffuse":
+            self.current_stage = "diffuse"
+            self.denoise_ui["status"] = "1: DENOISING RENDERMAN - ALBEDO / DIFFUSE"
+            self.log("\n🔄 Starting DIFFUSE denoising")
+            self.denoise_ui["overall"] = GLOBAL_PHASES["denoising_albedo"]  # 15% quand termine l'étape albedo
+        elif event.stage == "specular":
+            self.current_stage = "specular"
+            self.denoise_ui["status"] = "1: DENOISING RENDERMAN - ALBEDO / DIFFUSE / SPECULAR"
+            self.log("\n🔄 Starting SPECULAR denoising")
+            self.denoise_ui["overall"] = GLOBAL_PHASES["denoising_diffuse"]  # 35% quand termine l'étape diffuse
+        elif event.stage == "subsurface":
+            self.current_stage = "subsurface"
+            self.denoise_ui["status"] = "1: DENOISING RENDERMAN - ALBEDO / DIFFUSE / SUBSURFACE"
+            self.log("\n🔄 Starting SUBSURFACE denoising")
+            self.denoise_ui["overall"] = GLOBAL_PHASES["denoising_subsurface"]  # 25% quand commence l'étape subsurface
+        current_stage = self.current_stage
+
+        # Afficher la ligne originale telle quelle
+        self.log(line_text)
+
+        # Ne compter que les fichiers de sortie dans temp_denoised (résultat final)
+        if event.kind != "output":
+            return
+
+        # Fichier de sortie (après le >) et couche (AOV)
+        layer_name = event.layer
+        file_name = os.path.basename(event.output_path.replace("\\", "/")) or "unknown"
+
+        # Créer une clé unique pour éviter les doublons (fichier + layer)
+        unique_key = f"{file_name}|{layer_name}"
+        if unique_key in self.processed_entries:
+            return  # Ignorer les doublons
+        self.processed_entries.add(unique_key)
+
+        # Incrémenter le compteur approprié
+        if current_stage == "albedo" or "albedo" in layer_name.lower():
+            aov_counters["albedo"] += 1
+            progress_text = f"{aov_counters['albedo']}/{aov_totals['albedo']} albedo"
+        elif current_stage == "diffuse" or "diffuse" in layer_name.lower():
+            # Vérifier si c'est un light group
+            if prefix in layer_name:
+                aov_counters["light_groups"] += 1
+                progress_text = f"{aov_counters['diffuse']}/{aov_totals['diffuse']} diffuse, {aov_counters['light_groups']}/{aov_totals['light_groups']} light groups"
+            else:
+                aov_counters["diffuse"] += 1
+                progress_text = f"{aov_counters['diffuse']}/{aov_totals['diffuse']} diffuse"
+        elif current_stage == "specular" or "specular" in layer_name.lower():
+            # Vérifier si c'est un light group
+            if prefix in layer_name:
+                aov_counters["light_groups"] += 1
+                progress_text = f"{aov_counters['specular']}/{aov_totals['specular']} specular, {aov_counters['light_groups']}/{aov_totals['light_groups']} light groups"
+            else:
+                aov_counters["specular"] += 1
+                progress_text = f"{aov_counters['specular']}/{aov_totals['specular']} specular"
+        elif current_stage == "subsurface" or "subsurface" in layer_name.lower():
+            aov_counters["subsurface"] += 1
+            progress_text = f"{aov_counters['subsurface']}/{aov_totals['subsurface']} subsurface"
+        else:
+            # Si on ne peut pas déterminer le type, ne pas compter
+            return
+
+        # Afficher le progrès seulement après avoir compté
+        self.log(f"🔄 {progress_text}: {file_name} | layer: {layer_name}")
+
+        # Calculer la progression globale
+        total_aovs = sum(aov_totals.values())
+        processed_aovs = sum(aov_counters.values())
+        if total_aovs > 0:
+            denoise_progress = PHASES["denoising"]["start"] + (
+                (processed_aovs / total_aovs) *
+                (PHASES["denoising"]["end"] - PHASES["denoising"]["start"])
+            )
+            self.denoise_ui["progress"] = int(denoise_progress)
+
+        # Mettre à jour le statut avec l'étape actuelle et le progrès
+        stages_status = ""
+        if aov_counters["albedo"] > 0:
+            stages_status += "ALBEDO"
+        if aov_counters["diffuse"] > 0:
+            stages_status += " / DIFFUSE"
+        if aov_counters["subsurface"] > 0:
+            stages_status += " / SUBSURFACE"
+        if aov_counters["specular"] > 0:
+            stages_status += " / SPECULAR"
+        if aov_counters["light_groups"] > 0:
+            stages_status += " / LIGHT GROUPS"
+
+        # S'assurer qu'il y a au moins une étape affichée
+        if not stages_status:
+            stages_status = current_stage.upper()
+
+        self.denoise_ui["status"] = f"1: DENOISING RENDERMAN - {stages_status} - {progress_text}"
+
+        # Calculer et mettre à jour le temps estimé
+        current_time = time.time()
+        if self.last_frame_time is not None and processed_aovs > 0:
+            time_per_aov = (current_time - self.denoising_start_time) / processed_aovs
+            remaining_aovs = total_aovs - processed_aovs
+            self.denoise_ui["eta"] = format_duration(time_per_aov * remaining_aovs)
+        self.last_frame_time = current_time
+
+    def flush_denoise_ui(self):
+        """Appliquer en une fois les dernières valeurs de progression, statut et temps restant d'un lot"""
+        ui = self.denoise_ui
+        if "status" in ui:
+            self.set_status(ui["status"])
+        if "progress" in ui:
+            self.set_progress(ui["progress"])
+        if "overall" in ui:
+            self.set_overall_progress(ui["overall"])
+        if "eta" in ui:
+            self.set_estimated_time(ui["eta"])
+        ui.clear()
+
+    # --- Fusion ------------------------------------------------------------
+
+    def merge_progress(self, progress_percent):
+        """Progression de la fusion (0-100%) reportée sur les barres. Retourne True pour arrêter"""
+        if self.stopped():
+            return True  # Signal to stop processing
+
+        # Handle pause if requested
+        self.pause()
+
+        # Garder le pool des intégrateurs en tâche de fond alimenté pendant la fusion
+        if self.integrator_session is not None:
+            self.integrator_session.poll()
+
+        # Pendant le débruitage, les barres suivent denoise_batch
+        if not self.pipeline_state["denoise_done"]:
+            return False
+
+        # Map 0-100% of merge to the merge phase range
+        merge_range = PHASES["merging"]["end"] - PHASES["merging"]["start"]
+        self.set_progress(int(PHASES["merging"]["start"] + (progress_percent / 100 * merge_range)))
+
+        # Mettre à jour la barre de progression globale (entre 50% et 75%)
+        self.set_overall_progress(int(GLOBAL_PHASES["denoising_done"] + (
+            (progress_percent / 100) *
+            (GLOBAL_PHASES["merging_done"] - GLOBAL_PHASES["denoising_done"])
+        )))
+        self.idle()
+        return False  # Signal to continue processing
+
+    def merge_log(self, message):
+        """Log de la fusion"""
+        if self.stopped():
+            return True  # Signal to stop processing
+        self.log(message)
+        self.idle()
+        return False  # Signal to continue processing
+
+    def merge_event(self, event):
+        """Frame fusionnée: manifeste (avec son INTEGRATOR en passe combinée) et temps restant"""
+        if event.success:
+            self.manifest.mark(event.frame, "beauty")
+            if self.combined_integrator_dir:
+                self.manifest.mark(event.frame, "integrator")
+        self.emit(event)
+
+        # Temps restant d'après les frames fusionnées depuis la fin du débruitage
+        if not self.pipeline_state["denoise_done"]:
+            return
+        elapsed_merge_time = time.time() - self.pipeline_state["merge_start_time"]
+        current = event.done - self.pipeline_state["merged_before"]
+        total = event.total - self.pipeline_state["merged_before"]
+        if elapsed_merge_time > 0 and current > 0:
+            estimated_total_merge_time = elapsed_merge_time / (current / total)
+            remaining_total = estimated_total_merge_time - elapsed_merge_time
+
+            # Update integrator estimate
+            if self.integrator_dir and not self.combined_integrator_dir:
+                remaining_total += estimated_total_merge_time * 0.7
+
+            self.set_estimated_time(format_duration(remaining_total))
+
+    def merge_options(self):
+        """Paramètres communs à MergeSession et merge_final_exrs"""
+        return dict(
+            compression_level=self.compression_level,
+            log_callback=self.merge_log,
+            progress_callback=self.merge_progress,
+            temp_folder=self.temp_dir,
+            shadow_mode=self.shadow_mode,
+            shadow_aovs=self.shadow_aovs if self.shadow_mode else [],
+            stop_check=self.stopped,
+            use_gpu=False,
+            pixel_type=self.pixel_type,
+            backend=self.backend,
+            workers=self.max_cores,
+            # Passe combinée: sans séparation en tâche de fond, la fusion écrit aussi l'INTEGRATOR
+            # à partir de la même lecture du fichier d'entrée (chaque EXR d'entrée n'est décodé qu'une fois)
+            integrator_dir=self.combined_integrator_dir,
+            selected_integrators=self.selected_integrators,
+            event_callback=self.merge_event,
+            pause_gate=self.pause_gate
+        )
+
+    def integrator_event(self, event):
+        """Fichier INTEGRATOR écrit: manifeste et temps restant (pendant la phase INTEGRATOR)"""
+        if event.success:
+            self.manifest.mark(event.frame, "integrator")
+        self.emit(event)
+
+        start_time, done_before = self.pipeline_state.get("integrator_start", (None, 0))
+        if start_time is None:
+            return
+        elapsed_integrator_time = time.time() - start_time
+        current = event.done - done_before
+        total = event.total - done_before
+        if elapsed_integrator_time > 0 and current > 0:
+            estimated_total_integrator_time = elapsed_integrator_time / (current / total)
+            self.set_estimated_time(format_duration(estimated_total_integrator_time - elapsed_integrator_time))
+
+    def create_merge_session(self):
+        return MergeSession(self.beauty_dir, self.input_path, self.selected_aovs, self.compression_mode,
+                            len(self.merge_frames), **self.merge_options())
+
+    def merge(self):
+        """Phase 3: fusion BEAUTY (termine la fusion en pipeline ou fusionne toute la séquence)"""
+        # Phase: merging (30%)
+        self.set_status("2: REBUILD BEAUTY - Merging AOVs...")
+        self.log("\n🔄 2: REBUILD BEAUTY - Starting AOVs merging...")
+        self.idle()
+
+        self.pipeline_state["denoise_done"] = True
+        self.pipeline_state["merge_start_time"] = time.time()
+
+        if not self.merge_frames:
+            self.log("♻️ All BEAUTY frames are up to date - nothing to merge")
+        elif self.merge_session is not None:
+            # Les dernières frames de chaque shard ont été soumises à la fin de son débruitage
+            self.pipeline_state["merged_before"] = self.merge_session.frames_processed
+            self.log(f"🔀 {self.pipeline_state['merged_before']}/{len(self.merge_frames)} frames already merged during denoising")
+            self.merge_session.finish()
+            self.merge_session = None
+        else:
+            merge_final_exrs(self.beauty_dir, self.merge_frames, self.input_path, self.selected_aovs,
+                             self.compression_mode, **self.merge_options())
+
+        if self.stopped():
+            self.log("🛑 Process stopped after merging.")
+            return False
+        self.pause()
+        return True
+
+    # --- Intégrateurs ------------------------------------------------------
+
+    def integrate(self):
+        """Phase 4: séparation INTEGRATOR (si elle n'a pas déjà été faite pendant la fusion)"""
+        # If integrator is disabled, skip to cleanup
+        if not self.integrator_dir:
+            self.set_progress(100)
+            self.set_overall_progress(100)  # 100% quand tout est terminé sans intégrateur
+            return True
+        # Frames dont l'INTEGRATOR n'a pas été écrit par la passe combinée (BEAUTY déjà à jour)
+        integrator_frames = self.integrator_frames
+        if self.combined_integrator_dir:
+            merged = set(self.merge_frames)
+            integrator_frames = [frame for frame in integrator_frames if frame not in merged]
+        if not integrator_frames and self.integrator_session is None:
+            # INTEGRATOR déjà écrit pendant la fusion: pas de troisième passe sur les fichiers d'entrée
+            if self.combined_integrator_dir:
+                self.log("✅ 3: REBUILD INTEGRATOR - Written during merge (combined pass)")
+            else:
+                self.log("♻️ All INTEGRATOR files are up to date")
+            self.set_progress(100)
+            self.set_overall_progress(100)
+            return True
+
+        self.set_progress(PHASES["merging"]["end"])
+        self.set_overall_progress(GLOBAL_PHASES["merging_done"])  # 75% quand la fusion est terminée
+
+        # Phase: integrators (15%)
+        self.set_status("3: REBUILD INTEGRATOR - Separating integrators...")
+        self.log("\n🔄 3: REBUILD INTEGRATOR - Starting integrator separation...")
+        self.idle()
+
+        # Fichiers déjà séparés en tâche de fond (exclus de l'estimation du temps)
+        done_before = self.integrator_session.files_processed if self.integrator_session is not None else 0
+        self.pipeline_state["integrator_start"] = (time.time(), done_before)
+
+        def integrator_progress(progress_percent):
+            if self.stopped():
+                return True  # Signal to stop processing
+            self.pause()
+
+            # Map 0-100% of integrator to the integrator phase range
+            integrator_range = PHASES["integrators"]["end"] - PHASES["integrators"]["start"]
+            self.set_progress(int(PHASES["integrators"]["start"] + (progress_percent / 100 * integrator_range)))
+
+            # Mettre à jour la barre de progression globale (entre 75% et 100%)
+            self.set_overall_progress(int(GLOBAL_PHASES["merging_done"] + (
+                (progress_percent / 100) *
+                (GLOBAL_PHASES["integrators_done"] - GLOBAL_PHASES["merging_done"])
+            )))
+            self.idle()
+            return False  # Signal to continue processing
+
+        def integrator_log(message):
+            if self.stopped():
+                return True  # Signal to stop processing
+            self.log(message)
+            self.idle()
+            return False  # Signal to continue processing
+
+        if self.integrator_session is not None:
+            # Séparation démarrée pendant le débruitage: attendre seulement les fichiers restants
+            self.log(f"🔀 {done_before}/{self.integrator_session.total_files} integrator files already separated during denoising")
+            self.integrator_session.log_callback = integrator_log
+            self.integrator_session.progress_callback = integrator_progress
+            self.integrator_session.finish()
+            self.integrator_session = None
+        else:
+            run_integrator_generate(
+                input_folder=self.input_path,
+                output_folder=self.integrator_dir,  # Use INTEGRATOR subdirectory
+                selected_integrators=self.selected_integrators,
+                compression_mode=self.compression_mode,
+                compression_level=self.compression_level,
+                log_callback=integrator_log,
+                progress_callback=integrator_progress,
+                stop_check=self.stopped,
+                use_gpu=False,
+                pixel_type=self.pixel_type,
+                backend=self.backend,
+                workers=self.max_cores,
+                frame_list=integrator_frames,
+                event_callback=self.integrator_event,
+                pause_gate=self.pause_gate
+            )
+
+        if self.stopped():
+            self.log("🛑 Process stopped after integrator generation.")
+            return False
+
+        self.set_progress(100)
+        self.set_overall_progress(100)  # 100% quand tout est terminé
+        return True
+
+    # --- Exécution ---------------------------------------------------------
+
+    def cleanup(self):
+        """Supprimer temp_denoised (sauf si keep_temp ou si des frames restent à fusionner)"""
+        # Les copies vers le cache lisent temp_denoised
+        self.close_cache()
+        if self.keep_temp:
+            self.log(f"ℹ️ Keeping temporary directory: {self.temp_dir}")
+            return
+        pending = [frame for frame in self.frames if not self.manifest.is_done(frame, "beauty")]
+        if pending:
+            # Fusion incomplète: garder les frames débruitées pour la reprise
+            self.log(f"⚠️ {len(pending)} frames were not merged - keeping {self.temp_dir} for the next run")
+            return
+        # Cleanup: Delete temp_denoised folder
+        self.log("🧹 Cleaning up temporary files...")
+        try:
+            shutil.rmtree(self.temp_dir)
+            self.log(f"✅ Removed temporary directory: {self.temp_dir}")
+            # Les frames débruitées n'existent plus: une relance devra les refaire
+            self.manifest.forget("denoise")
+        except Exception as e:
+            self.log(f"⚠️ Warning: Could not remove temporary directory: {str(e)}")
+
+    def close(self):
+        """Libérer les pools et denoise_batch après un arrêt ou une erreur"""
+        if self.pause_gate is not None:
+            self.pause_gate.remove_listener(self.suspend_denoisers)
+        self.stop_shards()
+        self.process = None
+        if self.merge_session is not None:
+            self.merge_session.close()
+            self.merge_session = None
+        if self.integrator_session is not None:
+            self.integrator_session.close()
+            self.integrator_session = None
+        self.close_cache()
+        if self.manifest is not None:
+            self.manifest.save(force=True)
+
+    def timed(self, name, step):
+        """Exécuter une phase en mesurant sa durée pour le rapport de performance"""
+        phase_start = time.time()
+        try:
+            return step()
+        finally:
+            self.perf.add_phase_time(name, time.time() - phase_start)
+
+    def save_perf_report(self):
+        """Écrire le rapport de performance du run (seulement si des frames ont été traitées)"""
+        if not self.perf.phases:
+            return
+        for line in self.perf.describe():
+            self.log(line)
+        try:
+            path = self.perf.save(self.output_path)
+            self.log(f"📊 Performance report: {path}")
+        except OSError as e:
+            self.log(f"⚠️ Could not write the performance report: {str(e)}")
+
+    def run(self):
+        """Exécuter toutes les phases. Retourne True si terminé, False si arrêté; PipelineError en cas d'échec"""
+        start_time = time.time()
+        try:
+            if not self.timed("preparation", self.prepare):
+                return False
+            if self.up_to_date:
+                self.log(f"✅ All {len(self.frames)} frames are up to date ({MANIFEST_NAME}) - nothing to do")
+                self.set_progress(100)
+                self.set_overall_progress(100)
+                return True
+            if not self.timed("denoise", self.denoise):
+                return False
+            if not self.timed("merge", self.merge):
+                return False
+            if not self.timed("integrator", self.integrate):
+                return False
+            self.timed("cleanup", self.cleanup)
+        finally:
+            self.close()
+            self.save_perf_report()
+
+        # Calculate actual total time
+        total_time_str = format_duration(time.time() - start_time)
+        self.set_status(f"Process completed in {total_time_str}")
+        self.log(f"✅ Process completed in {total_time_str}!")
+        self.idle()
+        return True
+
+
+def load_user_config(path=None):
+    """Lire user_config.json (valeurs par défaut de la ligne de commande)"""
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_config.json")
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except:
+        return {}
+
+
+def split_list(value):
+    """"a,b, c" -> ["a", "b", "c"]"""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def add_pipeline_arguments(parser):
+    """Options du pipeline communes à la ligne de commande et à la ferme de rendu (FarmQueue)"""
+    parser.add_argument("--config", help="user_config.json providing defaults (RenderMan path, backend, pixel type...)")
+    parser.add_argument("--renderman", help="RenderMan Pro Server folder (default: RENDERMAN_PROSERVER from the config, then RMANTREE)")
+    parser.add_argument("--aovs", default="", help="Comma-separated AOVs to denoise")
+    parser.add_argument("--lgt-prefix", help="Light group prefix (default: LIGHT_GROUP_PREFIX from the config)")
+    parser.add_argument("--diffuse-lgt", default="", help="Comma-separated diffuse light group AOVs")
+    parser.add_argument("--specular-lgt", default="", help="Comma-separated specular light group AOVs")
+    parser.add_argument("--shadow", action="store_true", help="Shadow mode: denoise every AOV, keep only alpha and shadow AOVs")
+    parser.add_argument("--shadow-aovs", default="", help="Comma-separated shadow AOVs (default: SHADOWS_AOV_NAME from the config)")
+    parser.add_argument("--crossframe", action="store_true", help="Enable CrossFrame temporal denoising")
+    parser.add_argument("--compression", choices=COMPRESSION_MODES, default="DWAB")
+    parser.add_argument("--compression-level", type=float, default=45.0, help="DWAA/DWAB compression level")
+    parser.add_argument("--pixel-type", choices=PIXEL_TYPES, help="Pixel type policy for written EXRs")
+    parser.add_argument("--backend", choices=BACKENDS, help="Worker backend for merge and integrator")
+    parser.add_argument("--integrators", default="", help="Comma-separated integrator AOVs (enables the INTEGRATOR output)")
+    parser.add_argument("--integrator-during-denoise", action="store_true", help="Separate integrators in the background while denoising")
+    parser.add_argument("--no-pipelined-merge", action="store_true", help="Wait for denoise_batch to exit before merging")
+    parser.add_argument("--no-combined-pass", action="store_true", help="Run the integrator as its own pass after the merge")
+    parser.add_argument("--shards", type=int, help="Number of concurrent denoise_batch instances (default: DENOISE_SHARDS from the config)")
+    parser.add_argument("--no-resume", action="store_true", help="Redo every frame even if the output manifest marks it up to date")
+    parser.add_argument("--cache-dir", help="Denoise cache folder (default: DENOISE_CACHE_DIR from the config, then the user cache folder)")
+    parser.add_argument("--cache-size-gb", type=float, help="Denoise cache size limit in GB, 0 disables it (default: DENOISE_CACHE_SIZE_GB from the config)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or fill the denoise cache")
+    parser.add_argument("--denoiser", help="Command replacing <RenderMan>/bin/denoise_batch.exe (config flags are appended)")
+    parser.add_argument("--fake-denoiser", action="store_true", help="Use the bundled FakeDenoiser.py instead of RenderMan (testing and benchmarks)")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="Seconds the fake denoiser spends per frame")
+    parser.add_argument("--max-cores", type=int, help="Limit the CPU cores used by denoise_batch and the merge workers")
+    parser.add_argument("--memory-fraction", type=float, default=0.75, help="Fraction of the available RAM given to denoise_batch")
+    parser.add_argument("--keep-temp", action="store_true", help="Keep the temp_denoised folder")
+    parser.add_argument("--quiet", action="store_true", help="Only print status changes and errors")
+
+
+def pipeline_options(args, config):
+    """Paramètres de Pipeline (hors dossiers et callbacks) depuis les options et user_config.json"""
+    shadow_aovs = split_list(args.shadow_aovs) or split_list(config.get("SHADOWS_AOV_NAME", ""))
+    cache_size = args.cache_size_gb if args.cache_size_gb is not None else config.get("DENOISE_CACHE_SIZE_GB", DEFAULT_CACHE_SIZE_GB)
+    cache_dir = None
+    if not args.no_cache and cache_size > 0:
+        cache_dir = args.cache_dir or config.get("DENOISE_CACHE_DIR") or default_cache_dir()
+    denoiser_command = shlex.split(args.denoiser, posix=os.name != "nt") if args.denoiser else None
+    if args.fake_denoiser:
+        denoiser_command = fake_denoiser_command() + ["--latency", str(args.fake_latency)]
+    return dict(
+        renderman_path=args.renderman or config.get("RENDERMAN_PROSERVER") or os.environ.get("RMANTREE", ""),
+        selected_aovs=split_list(args.aovs),
+        light_groups={
+            "prefix": args.lgt_prefix or config.get("LIGHT_GROUP_PREFIX", "LGT"),
+            "diffuse": split_list(args.diffuse_lgt),
+            "specular": split_list(args.specular_lgt)
+        },
+        shadow_mode=args.shadow,
+        shadow_aovs=shadow_aovs if args.shadow else [],
+        crossframe=args.crossframe,
+        compression_mode=args.compression,
+        compression_level=args.compression_level,
+        pixel_type=args.pixel_type or config.get("PIXEL_TYPE", "FLOAT"),
+        backend=args.backend or config.get("MERGE_BACKEND", "AUTO"),
+        selected_integrators=split_list(args.integrators),
+        pipelined_merge=not args.no_pipelined_merge and config.get("PIPELINED_MERGE", True),
+        integrator_during_denoise=args.integrator_during_denoise or config.get("INTEGRATOR_DURING_DENOISE", False),
+        integrator_cpu_budget=config.get("INTEGRATOR_CPU_BUDGET", 0.25),
+        combined_pass=not args.no_combined_pass and config.get("COMBINED_FRAME_PASS", True),
+        denoise_shards=args.shards or config.get("DENOISE_SHARDS", 1),
+        resume=not args.no_resume and config.get("RESUME_RUNS", True),
+        denoise_cache_dir=cache_dir,
+        denoise_cache_size_gb=cache_size,
+        keep_temp=args.keep_temp,
+        denoiser_command=denoiser_command,
+        max_cores=args.max_cores,
+        memory_fraction=args.memory_fraction
+    )
+
+
+def pipeline_arguments(input_path, output_path, options):
+    """Paramètres de Pipeline -> arguments de la ligne de commande (inverse de pipeline_options)
+
+    Utilisé par l'interface pour lancer un onglet dans son propre process. Les réglages sans
+    option (INTEGRATOR_CPU_BUDGET, ...) sont relus dans le même user_config.json."""
+    light_groups = options.get("light_groups") or {}
+    arguments = [input_path, output_path,
+                 "--aovs", ",".join(options.get("selected_aovs") or []),
+                 "--diffuse-lgt", ",".join(light_groups.get("diffuse", [])),
+                 "--specular-lgt", ",".join(light_groups.get("specular", [])),
+                 "--compression", options.get("compression_mode", "DWAB"),
+                 "--integrators", ",".join(options.get("selected_integrators") or []),
+                 "--shards", str(options.get("denoise_shards", 1)),
+                 "--memory-fraction", str(options.get("memory_fraction", 0.75))]
+    for option, flag in (("renderman_path", "--renderman"), ("pixel_type", "--pixel-type"), ("backend", "--backend"),
+                         ("compression_level", "--compression-level"), ("max_cores", "--max-cores")):
+        if options.get(option) is not None and options.get(option) != "":
+            arguments += [flag, str(options[option])]
+    if light_groups.get("prefix"):
+        arguments += ["--lgt-prefix", light_groups["prefix"]]
+    if options.get("shadow_mode"):
+        arguments += ["--shadow", "--shadow-aovs", ",".join(options.get("shadow_aovs") or [])]
+    for option, flag in (("crossframe", "--crossframe"), ("integrator_during_denoise", "--integrator-during-denoise"),
+                         ("keep_temp", "--keep-temp")):
+        if options.get(option):
+            arguments.append(flag)
+    for option, flag in (("pipelined_merge", "--no-pipelined-merge"), ("combined_pass", "--no-combined-pass"),
+                         ("resume", "--no-resume")):
+        if not options.get(option, True):
+            arguments.append(flag)
+    if options.get("denoise_cache_dir"):
+        arguments += ["--cache-dir", options["denoise_cache_dir"],
+                      "--cache-size-gb", str(options.get("denoise_cache_size_gb", DEFAULT_CACHE_SIZE_GB))]
+    else:
+        arguments.append("--no-cache")
+    if options.get("denoiser_command"):
+        arguments += ["--denoiser", subprocess.list2cmdline(options["denoiser_command"]) if os.name == "nt" else shlex.join(options["denoiser_command"])]
+    return arguments
+
+
+def pipeline_command():
+    """Commande qui lance le pipeline en ligne de commande (script Python ou exécutable figé de l'interface)"""
+    if getattr(sys, "frozen", False):
+        # DenoiZer.exe --pipeline ... exécute main() de ce module sans ouvrir l'interface
+        return [sys.executable, "--pipeline"]
+    return [sys.executable, os.path.abspath(__file__)]
+
+
+def fake_denoiser_command():
+    """Commande du faux denoise_batch (FakeDenoiser.py, ou DenoiZer.exe --fake-denoiser dans l'exécutable figé)"""
+    if getattr(sys, "frozen", False):
+        return [sys.executable, "--fake-denoiser"]
+    return [sys.executable, FAKE_DENOISER]
+
+
+def console_callbacks(quiet=False):
+    """Callbacks de log, statut et erreur qui écrivent sur la console"""
+    def log(message):
+        if not quiet or message.startswith(("❌", "⚠️", "🛑", "✅ Process")):
+            print(message, flush=True)
+
+    def status(text):
+        if not quiet:
+            print(f"[{text}]", flush=True)
+
+    def error(title, message):
+        print(f"❌ {title}: {message}", file=sys.stderr, flush=True)
+
+    return dict(log_callback=log, status_callback=status, error_callback=error)
+
+
+def print_event(event):
+    """--events: un FrameEvent par ligne, en JSON, pour les outils qui suivent la progression"""
+    print(json.dumps(event._asdict()), flush=True)
+
+
+def stream_callbacks():
+    """--ui-stream: chaque callback écrit une ligne JSON {"type": ..., "value": ...} sur la sortie standard
+
+    Lues par l'onglet de l'interface qui a lancé le process (log, status, progress, overall, eta, error, event)."""
+    lock = threading.Lock()
+
+    def send(kind, value):
+        # ensure_ascii: les emojis des logs passent quel que soit l'encodage du tube
+        line = json.dumps({"type": kind, "value": value})
+        with lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    return dict(
+        log_callback=lambda message: send("log", message),
+        status_callback=lambda text: send("status", text),
+        progress_callback=lambda percent: send("progress", percent),
+        overall_progress_callback=lambda percent: send("overall", percent),
+        eta_callback=lambda text: send("eta", text),
+        error_callback=lambda title, message: send("error", [title, message]),
+        event_callback=lambda event: send("event", event._asdict())
+    )
+
+
+def watch_commands(control):
+    """--ui-stream: lire les commandes de l'interface sur l'entrée standard
+
+    "stop" demande l'arrêt; la fermeture de l'entrée (interface fermée) aussi.
+    "pause" / "resume" ferment et rouvrent control["gate"] (PauseGate du pipeline et de ses workers)."""
+    def read():
+        try:
+            for line in sys.stdin:
+                command = line.strip()
+                if command == "stop":
+                    control["stop"] = True
+                    control["gate"].resume()
+                elif command == "pause":
+                    control["gate"].pause()
+                elif command == "resume":
+                    control["gate"].resume()
+        except (OSError, ValueError):
+            pass
+        control["stop"] = True
+        control["gate"].resume()
+
+    threading.Thread(target=read, daemon=True).start()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="denoizer", description="DenoiZer headless pipeline: RenderMan denoise -> BEAUTY merge -> INTEGRATOR separation")
+    parser.add_argument("input", help="Folder containing the input EXR sequence")
+    parser.add_argument("output", help="Output folder (BEAUTY, INTEGRATOR and temp_denoised are created inside)")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--events", action="store_true", help="Print one JSON progress event per denoised, merged or separated frame")
+    parser.add_argument("--ui-stream", action="store_true", help="Print every log, status and progress update as a JSON line and read 'stop', 'pause' and 'resume' commands on stdin (used by the GUI)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    config = load_user_config(args.config)
+    if args.ui_stream:
+        callbacks = stream_callbacks()
+        control = {"stop": False, "gate": PauseGate()}
+        watch_commands(control)
+        callbacks["stop_check"] = lambda: control["stop"]
+        callbacks["pause_gate"] = control["gate"]
+    else:
+        callbacks = console_callbacks(args.quiet)
+        callbacks["event_callback"] = print_event if args.events else None
+    pipeline = Pipeline(args.input, args.output, **pipeline_options(args, config), **callbacks)
+    try:
+        completed = pipeline.run()
+    except PipelineError as e:
+        callbacks["error_callback"]("Pipeline failed", str(e))
+        return 1
+    except KeyboardInterrupt:
+        pipeline.stop()
+        pipeline.close()
+        print("🛑 Interrupted", file=sys.stderr)
+        return 130
+    return 0 if completed else 2
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+# Manifeste de reprise: dans le dossier de sortie, l'état de chaque frame par étape
+#   denoise    - fichiers débruités présents dans temp_denoised
+#   beauty     - BEAUTY écrite
+#   integrator - INTEGRATOR écrit
+# Chaque étape enregistre l'empreinte des réglages qui l'ont produite, et chaque frame
+# l'empreinte de son EXR d'entrée (taille + date de modification). Une étape est à refaire
+# si l'entrée a changé, si ses réglages ont changé ou si son fichier de sortie a disparu.
+
+MANIFEST_NAME = "denoizer_manifest.json"
+MANIFEST_VERSION = 1
+
+# Écriture du manifeste au plus toutes les SAVE_INTERVAL secondes pendant un run
+SAVE_INTERVAL = 2.0
+
+STAGES = ("denoise", "beauty", "integrator")
+
+
+def input_fingerprint(path):
+    """Empreinte d'un EXR d'entrée: taille et date de modification (sans relire les pixels)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def settings_hash(settings):
+    """Empreinte courte des réglages d'une étape"""
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+class RunManifest:
+    """État par frame d'un run, pour qu'une relance ne traite que les frames manquantes ou périmées"""
+
+    def __init__(self, output_path, input_path, stage_settings):
+        self.path = os.path.join(output_path, MANIFEST_NAME)
+        self.input_path = input_path
+        self.hashes = {stage: settings_hash(stage_settings.get(stage)) for stage in STAGES}
+        self.fingerprints = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.last_save = 0.0
+        self.data = self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION and isinstance(data.get("frames"), dict):
+                return data
+        except:
+            pass
+        return {"version": MANIFEST_VERSION, "frames": {}}
+
+    def fingerprint(self, frame):
+        """Empreinte de l'entrée d'une frame, lue une seule fois par run"""
+        if frame not in self.fingerprints:
+            self.fingerprints[frame] = input_fingerprint(os.path.join(self.input_path, frame))
+        return self.fingerprints[frame]
+
+    def is_done(self, frame, stage, *output_files):
+        """Vrai si l'étape est faite pour cette frame avec l'entrée et les réglages actuels"""
+        entry = self.data["frames"].get(frame)
+        if not entry or entry.get("input") != self.fingerprint(frame):
+            return False
+        if entry.get(stage) != self.hashes[stage]:
+            return False
+        return all(os.path.exists(path) for path in output_files)
+
+    def mark(self, frame, stage):
+        """Enregistrer une étape terminée (les étapes d'une ancienne version de l'entrée sont oubliées)"""
+        with self.lock:
+            entry = self.data["frames"].get(frame)
+            fingerprint = self.fingerprint(frame)
+            if not entry or entry.get("input") != fingerprint:
+                entry = {"input": fingerprint}
+                self.data["frames"][frame] = entry
+            entry[stage] = self.hashes[stage]
+            entry["updated"] = time.time()
+            self.dirty = True
+        self.save()
+
+    def forget(self, stage):
+        """Oublier une étape pour toutes les frames (ex: temp_denoised supprimé après le run)"""
+        with self.lock:
+            for entry in self.data["frames"].values():
+                if entry.pop(stage, None) is not None:
+                    self.dirty = True
+        self.save(force=True)
+
+    def save(self, force=False):
+        """Écrire le manifeste (fichier temporaire puis renommage), au plus toutes les SAVE_INTERVAL secondes"""
+        with self.lock:
+            if not self.dirty or (not force and time.time() - self.last_save < SAVE_INTERVAL):
+                return
+            temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(temp_path, "w") as f:
+                    json.dump(self.data, f, indent=1)
+                os.replace(temp_path, self.path)
+            except OSError:
+                return
+            self.dirty = False
+            self.last_save = time.time()
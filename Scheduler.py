@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import psutil
+from Pipeline import list_input_frames
+from RunManifest import MANIFEST_NAME
+
+# Ordonnancement des onglets en mode "DENOIZE ALL": plusieurs plans tournent en même temps,
+# chacun dans son propre process, tant que leurs besoins tiennent dans le budget de la machine
+# (cœurs, mémoire, débit disque). Un job est admis dès que des ressources se libèrent, dans
+# l'ordre de la file quand c'est possible, sinon le premier job qui tient dans ce qui reste.
+#
+# Besoins par type de job (pour une frame de référence de REFERENCE_FRAME_MB):
+#   denoise - denoise_batch + fusion en pipeline: beaucoup de cœurs et de mémoire
+#   merge   - débruitage déjà fait (reprise): fusion BEAUTY / INTEGRATOR, surtout du disque
+JOB_PROFILES = {
+    "denoise": {"cores": 0.5, "memory_gb": 8.0, "disk_mb_s": 150.0},
+    "merge": {"cores": 0.25, "memory_gb": 3.0, "disk_mb_s": 300.0}
+}
+
+# Taille d'un EXR d'entrée pour laquelle les besoins mémoire de JOB_PROFILES sont donnés
+REFERENCE_FRAME_MB = 200.0
+
+# Débit disque supposé de la machine (DISK_BANDWIDTH_MB_S dans user_config.json)
+DEFAULT_DISK_MB_S = 800.0
+
+# Part de la mémoire disponible réservée aux jobs (le reste pour le système et l'interface)
+MEMORY_RESERVE = 0.9
+
+# Nombre de fois où le premier job de la file peut être doublé par un job plus petit
+# avant que l'ordonnanceur n'attende qu'il tienne (pas de famine des gros plans)
+MAX_BYPASS = 3
+
+
+def machine_capacity(disk_mb_s=DEFAULT_DISK_MB_S):
+    """Budget total de la machine: cœurs physiques, mémoire disponible (GB), débit disque (MB/s)"""
+    cores = psutil.cpu_count(logical=False) or psutil.cpu_count() or 1
+    try:
+        memory_gb = psutil.virtual_memory().available / (1024 ** 3) * MEMORY_RESERVE
+    except:
+        memory_gb = 8.0
+    return {"cores": cores, "memory_gb": memory_gb, "disk_mb_s": disk_mb_s or DEFAULT_DISK_MB_S}
+
+
+def job_kind(input_path, output_path):
+    """"merge" si toutes les frames sont débruitées (manifeste + fichiers dans temp_denoised), sinon "denoise"
+
+    Estimation rapide pour l'ordonnancement: le pipeline vérifie ensuite les réglages et les fichiers."""
+    frames = list_input_frames(input_path) if input_path and os.path.isdir(input_path) else []
+    try:
+        with open(os.path.join(output_path, MANIFEST_NAME), "r") as f:
+            done = json.load(f).get("frames", {})
+    except:
+        return "denoise"
+    # Comme RunManifest.is_done: l'étape ne compte que si le fichier débruité existe encore
+    temp_dir = os.path.join(output_path, "temp_denoised")
+    if frames and all("denoise" in done.get(frame, {}) and os.path.exists(os.path.join(temp_dir, frame)) for frame in frames):
+        return "merge"
+    return "denoise"
+
+
+def job_demand(kind, input_path, capacity):
+    """Ressources demandées par un job, d'après son type et la taille de ses EXR d'entrée"""
+    profile = JOB_PROFILES[kind]
+    frame_mb = REFERENCE_FRAME_MB
+    frames = list_input_frames(input_path) if input_path and os.path.isdir(input_path) else []
+    if frames:
+        try:
+            frame_mb = os.path.getsize(os.path.join(input_path, frames[0])) / (1024 * 1024)
+        except OSError:
+            pass
+    # La mémoire suit la taille des frames (au moins un quart du profil: coût fixe des process)
+    memory_gb = profile["memory_gb"] * max(0.25, frame_mb / REFERENCE_FRAME_MB)
+    return {
+        "cores": max(1, int(round(capacity["cores"] * profile["cores"]))),
+        "memory_gb": min(memory_gb, capacity["memory_gb"]),
+        "disk_mb_s": min(profile["disk_mb_s"], capacity["disk_mb_s"])
+    }
+
+
+class ResourceScheduler:
+    """File de jobs admis selon les ressources libres
+
+    `add(job_id, demand)` met un job en file, `admit()` retourne les jobs à démarrer
+    maintenant, `release(job_id)` rend les ressources d'un job terminé."""
+
+    def __init__(self, capacity, max_jobs=0, log_callback=None):
+        self.capacity = dict(capacity)
+        self.max_jobs = max_jobs or 0  # 0: seules les ressources limitent
+        self.log_callback = log_callback
+        self.pending = []  # [(job_id, demande)] dans l'ordre de la file
+        self.running = {}  # job_id -> demande
+        self.bypassed = 0
+        self.started = {}
+
+    def log(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def add(self, job_id, demand):
+        self.pending.append((job_id, dict(demand)))
+
+    def free(self):
+        """Ressources encore disponibles"""
+        free = dict(self.capacity)
+        for demand in self.running.values():
+            for resource in free:
+                free[resource] -= demand.get(resource, 0)
+        return free
+
+    def fits(self, demand, free):
+        return all(demand.get(resource, 0) <= free[resource] + 1e-6 for resource in free)
+
+    def admit(self):
+        """Jobs à démarrer maintenant: [(job_id, demande)]
+
+        Un job qui dépasse à lui seul le budget de la machine est admis quand rien d'autre ne tourne."""
+        admitted = []
+        while self.pending and (not self.max_jobs or len(self.running) < self.max_jobs):
+            free = self.free()
+            head_id, head = self.pending[0]
+            if self.fits(head, free) or not self.running:
+                chosen = 0
+            elif self.bypassed >= MAX_BYPASS:
+                # Le premier job a assez attendu: laisser les ressources se libérer pour lui
+                break
+            else:
+                chosen = next((index for index, (_, demand) in enumerate(self.pending[1:], 1) if self.fits(demand, free)), None)
+                if chosen is None:
+                    break
+                self.bypassed += 1
+            job_id, demand = self.pending.pop(chosen)
+            if chosen == 0:
+                self.bypassed = 0
+            self.running[job_id] = demand
+            self.started[job_id] = time.time()
+            admitted.append((job_id, demand))
+        return admitted
+
+    def release(self, job_id):
+        """Job terminé (ou abandonné): ses ressources redeviennent disponibles"""
+        self.running.pop(job_id, None)
+        self.pending = [(pending_id, demand) for pending_id, demand in self.pending if pending_id != job_id]
+        started = self.started.pop(job_id, None)
+        return time.time() - started if started else 0.0
+
+    @property
+    def idle(self):
+        return not self.pending and not self.running
+
+    def describe(self, demand):
+        return f"{demand['cores']} cores, {demand['memory_gb']:.1f}GB RAM, {demand['disk_mb_s']:.0f}MB/s disk"
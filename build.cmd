@@ -27,6 +27,17 @@ pyinstaller --clean --noconfirm ^
   --add-data "DenoiZer_icon.ico;." ^
   --add-data "ExrMerge.py;." ^
   --add-data "Integrator_Denoizer.py;." ^
+  --add-data "ExrIO.py;." ^
+  --add-data "FramePool.py;." ^
+  --add-data "Pipeline.py;." ^
+  --add-data "FarmQueue.py;." ^
+  --add-data "RunManifest.py;." ^
+  --add-data "DenoiseCache.py;." ^
+  --add-data "PerfReport.py;." ^
+  --add-data "Scheduler.py;." ^
+  --add-data "JobQueue.py;." ^
+  --add-data "ExrBenchmark.py;." ^
+  --add-data "FakeDenoiser.py;." ^
   --add-data "fonts\\CutePixel.ttf;fonts" ^
   --add-data "fonts\\Minecrafter.Alt.ttf;fonts" ^
   --hidden-import numpy ^
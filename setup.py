@@ -5,7 +5,7 @@ from cx_Freeze import setup, Executable
 build_exe_options = {
     "packages": ["os", "sys", "json", "subprocess", "OpenImageIO", "OpenEXR", "Imath", "time", "PySide2"],
     "excludes": [],
-    "include_files": ["user_config.json", "DenoiZer_icon.png", "ExrMerge.py", "Integrator_Denoizer.py"],
+    "include_files": ["user_config.json", "DenoiZer_icon.png", "ExrMerge.py", "Integrator_Denoizer.py", "ExrIO.py", "FramePool.py", "Pipeline.py", "FarmQueue.py", "RunManifest.py", "DenoiseCache.py", "PerfReport.py", "Scheduler.py", "JobQueue.py", "ExrBenchmark.py", "FakeDenoiser.py"],
 }
 
 # Base for Windows
@@ -24,6 +24,18 @@ setup(
             base=base,
             icon="DenoiZer_icon.png",
             target_name="DenoiZer.exe"
+        ),
+        # Ligne de commande sans interface (pipeline complet, sans Qt)
+        Executable(
+            "Pipeline.py",
+            base=None,
+            target_name="denoizer.exe"
+        ),
+        # Coordinateur et workers de la ferme de rendu
+        Executable(
+            "FarmQueue.py",
+            base=None,
+            target_name="denoizer_farm.exe"
         )
     ],
 ) 
\ No newline at end of file